@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+JSON 解码微基准
+以 doc/caiyun_weather.md 中的 /daily 示例响应为样本（扩展为 15 天），
+比较各解码器从响应字节到 DailyForecast 记录的耗时：
+
+    python benchmarks/bench_json_decode.py [-n 2000]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from mcp_server.fast_json import available_decoders, select_decoder
+from mcp_server.forecast_records import DailyForecast
+
+SAMPLE_DOC = os.path.join(project_root, "doc", "caiyun_weather.md")
+
+
+def load_sample(days: int = 15) -> dict:
+    """读取文档中的示例响应：去掉 // 注释，每个逐天序列复制为 days 天"""
+    with open(SAMPLE_DOC, encoding="utf-8") as f:
+        text = f.read()
+    block = re.search(r"```json\n(.*?)```", text, re.S).group(1)
+    # 注释前总有空白，避免误伤 URL 中的 //
+    block = re.sub(r"\s//[^\n]*", "", block)
+    data = json.loads(block)
+
+    daily = data["result"]["daily"]
+    for key, value in daily.items():
+        if isinstance(value, list) and len(value) == 1:
+            daily[key] = value * days
+    return data
+
+
+def sample_bytes(days: int = 15) -> bytes:
+    """与上游响应一样的紧凑 UTF-8 字节"""
+    return json.dumps(load_sample(days), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def run(number: int) -> dict:
+    content = sample_bytes()
+    print(f"样本：{len(content)} 字节，{number} 次")
+    results = {}
+    for name in available_decoders():
+        _, loads = select_decoder(name)
+        decode = min(timeit.repeat(lambda: loads(content), number=number, repeat=3)) / number
+        record = min(timeit.repeat(lambda: DailyForecast(loads(content)), number=number, repeat=3)) / number
+        results[name] = (decode, record)
+
+    baseline = results["json"][1]
+    print(f"{'解码器':<10}{'解码(μs)':>12}{'解码+记录(μs)':>18}{'加速':>8}")
+    for name, (decode, record) in results.items():
+        print(f"{name:<10}{decode * 1e6:>12.1f}{record * 1e6:>18.1f}{baseline / record:>8.2f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 解码微基准")
+    parser.add_argument("-n", "--number", type=int, default=2000, help="每轮解码次数")
+    args = parser.parse_args()
+    run(args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+多 worker 吞吐基准
+启动一个本地模拟的彩云上游（返回 doc/caiyun_weather.md 的示例响应并统计请求数），
+分别以不同的 worker 数运行 HTTP 模式的 MCP 服务器，用多个并发会话查询内置城市的多日预报，
+比较吞吐量和上游请求数（共享预报缓存下上游请求数应与 worker 数无关）：
+
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--clients 32] [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from autogen_ext.tools.mcp import StreamableHttpServerParams
+from benchmarks.bench_json_decode import sample_bytes
+from mcp_session import McpSessionPool
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "南京", "武汉", "成都", "西安", "重庆"]
+
+
+class FakeCaiyun:
+    """模拟彩云 /daily 接口，统计请求数"""
+
+    def __init__(self, latency: float):
+        body = sample_bytes()
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v2.6"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        pool = McpSessionPool(StreamableHttpServerParams(url=url, timeout=5))
+        try:
+            await pool.list_tools()
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+        finally:
+            await pool.close()
+
+
+async def drive(url: str, clients: int, requests: int) -> float:
+    """clients 个会话并发发出共 requests 次查询，返回每秒完成数"""
+    pools = [McpSessionPool(StreamableHttpServerParams(url=url, timeout=30)) for _ in range(clients)]
+    await asyncio.gather(*(pool.start() for pool in pools))
+    counter = iter(range(requests))
+
+    async def client(pool: McpSessionPool):
+        for i in counter:
+            city = CITIES[i % len(CITIES)]
+            result = await pool.call_tool("query_weather_future_days", {"city": city, "days": 7})
+            assert not result.isError and city in result.content[0].text, result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(pool) for pool in pools))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(pool.close() for pool in pools))
+    return requests / elapsed
+
+
+def run_once(workers: int, clients: int, requests: int, latency: float) -> tuple:
+    upstream = FakeCaiyun(latency)
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            CAIYUN_API_KEY=os.getenv("CAIYUN_API_KEY", "bench"),
+            AMAP_API_KEY=os.getenv("AMAP_API_KEY", "bench"),
+            CAIYUN_BASE_URL=upstream.url,
+            CAIYUN_QPS="0",
+            PREFETCH_ENABLED="false",
+            CACHE_SNAPSHOT_PATH="",
+            GEOCODE_STORE_PATH=os.path.join(tmp, "geocode.sqlite3"),
+            FORECAST_SHARED_CACHE_PATH=os.path.join(tmp, "forecast.sqlite3"),
+        )
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(project_root, "mcp_server", "weather_mcp_server.py"),
+             "--transport", "http", "--port", str(port), "--workers", str(workers)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            url = f"http://127.0.0.1:{port}/mcp"
+            asyncio.run(wait_ready(url))
+            throughput = asyncio.run(drive(url, clients, requests))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            upstream.httpd.shutdown()
+    return throughput, upstream.requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 吞吐基准")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="依次测试的 worker 数")
+    parser.add_argument("--clients", type=int, default=32, help="并发会话数")
+    parser.add_argument("--requests", type=int, default=2000, help="每轮查询总数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟上游延迟（秒）")
+    args = parser.parse_args()
+
+    print(f"{'worker':>8}{'查询/秒':>12}{'上游请求':>10}")
+    for workers in args.workers:
+        throughput, upstream_requests = run_once(workers, args.clients, args.requests, args.latency)
+        print(f"{workers:>8}{throughput:>12.1f}{upstream_requests:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+规则意图解析
+大部分天气查询句式固定（"上海明天天气"、"北京今天冷不冷"），用预编译的时间模式和城市索引
+在本地直接得到与意图解析代理相同的 城市/时间/查询 结构；置信度不足时才交给 LLM 意图解析代理
+"""
+
+import re
+import unicodedata
+from typing import AsyncGenerator, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+
+from mcp_server.city_resolver import normalize_name
+from mcp_server.gazetteer import PREFECTURE, Gazetteer, short_name
+
+DEFAULT_CITY = "北京"
+
+_NUM = r"(?:\d+|[一二两三四五六七八九十]+)"
+
+# 时间表达，按 future → tomorrow → today 的顺序匹配（"今明两天"、"明后天" 属于 future）
+TIME_PATTERN = re.compile(
+    r"(?P<future>今明两?天|明后两?天|大后天|后天"
+    rf"|(?:未来|接下来|最近|近|这|往后)的?(?:{_NUM}|几)(?:天|日)"
+    r"|未来|接下来|最近|这几天"
+    r"|(?:这个?|本|下个?)(?:周末|周[一二三四五六日]?|星期[一二三四五六日天]?|礼拜[一二三四五六日天]?)|周末"
+    rf"|一个?(?:周|星期|礼拜)|{_NUM}(?:天|日)(?:内|之内|以内)?)"
+    r"|(?P<tomorrow>明(?:天|日|儿个?)(?:白天|早上|上午|中午|下午|傍晚|晚上|夜里)?|明[早晚]|tomorrow)"
+    r"|(?P<today>今(?:天|日|儿个?)(?:白天|早上|上午|中午|下午|傍晚|晚上|夜里)?|今[早晚夜]"
+    r"|现在|目前|当前|此刻|这会儿?|当天|today|tonight|now)"
+)
+
+# 天气相关词
+WEATHER_WORDS = (
+    "天气", "天儿", "气温", "温度", "多少度", "几度", "冷不冷", "热不热", "冷", "热", "下雨", "下雪", "降雨",
+    "降雪", "有雨", "有雪", "带伞", "晴", "阴", "雨", "雪", "刮风", "风大", "风大不大", "下不下雨", "大风", "风力", "湿度", "雾霾",
+    "空气质量", "紫外线", "穿什么", "穿衣", "预报", "气象", "weather", "forecast",
+)
+
+# 句式中常见、不影响意图的词
+FILLER_WORDS = (
+    "的", "吗", "呢", "啊", "呀", "吧", "嘛", "了", "么", "怎么样", "怎样", "咋样", "如何", "好不好", "好吗",
+    "会不会", "会", "是不是", "是", "什么", "啥", "查询", "查一下", "查查", "查", "帮我", "帮忙", "请问", "请",
+    "麻烦", "看看", "看一下", "看", "告诉我", "想知道", "知道", "一下", "我", "要", "需要", "在", "去", "到",
+    "那边", "这边", "那里", "情况", "状况", "的话", "能", "可以", "出门", "还", "有没有", "有", "没有", "不",
+    "and", "in", "the", "what", "is", "how", "s",
+)
+
+# 计算置信度时忽略的标点
+_PUNCTUATION = re.compile(r"[\s,.!?;:，。！？；：、~～…\"'“”‘’()（）]+")
+
+# 可跟在城市简称之后的行政级别后缀
+_CITY_SUFFIXES = "省市区县州旗盟"
+
+_CITY, _WEATHER, _FILLER = "city", "weather", "filler"
+
+
+class ParsedIntent(NamedTuple):
+    """解析结果：time 为 today / tomorrow / future，confidence 为可解释字符的比例"""
+    city: str
+    time: str
+    query: str
+    confidence: float
+
+    def format(self) -> str:
+        """与意图解析代理相同的输出格式"""
+        return f"城市：{self.city}\n时间：{self.time}\n查询：{self.query}"
+
+
+class RuleIntentParser:
+    """规则意图解析器
+
+    - 时间：预编译的时间表达模式，同一句中出现不同类别（如"今天和后天"）时视为无法解析
+    - 城市：内置城市名、别称、拼音和离线地名库（全称及地级行政区简称）组成的索引，按最长匹配扫描；
+      未提及时默认北京，提及多个城市或地名有歧义时视为无法解析
+    - 置信度：句中能被城市、时间、天气词和常见虚词解释的字符比例；低于 min_confidence 时交给 LLM
+    """
+
+    def __init__(self, city_names: Iterable[str], aliases: Optional[Mapping[str, str]] = None,
+                 gazetteer: Optional[Gazetteer] = None, default_city: str = DEFAULT_CITY,
+                 min_confidence: float = 0.9):
+        self.city_names = set(city_names)
+        self.aliases = dict(aliases or {})
+        self.gazetteer = gazetteer
+        self.default_city = default_city
+        self.min_confidence = min_confidence
+        self._index: Optional[Dict[str, Tuple[str, Optional[str]]]] = None
+        self._max_length = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _build_index(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        """首次解析时才建立索引：名称 -> (类别, 规范城市名)；地名库名称的规范名在匹配时才确定
+
+        地名库只收录带行政级别后缀的全称和地级行政区的简称：省和区县的简称（"海南"、"江南"、"东方"）
+        常是普通词语的一部分或并非用户所指的城市，按城市匹配容易误判
+        """
+        if self._index is None:
+            index: Dict[str, Tuple[str, Optional[str]]] = {}
+            if self.gazetteer is not None:
+                for division in self.gazetteer.divisions():
+                    index[division.name] = (_CITY, None)
+                    # 简称同时是省名时（"海南"、"吉林"）按省解析，不收录
+                    short = short_name(division.name)
+                    if division.level == PREFECTURE and self.gazetteer.lookup(short) == division:
+                        index[short] = (_CITY, None)
+            for name in self.city_names:
+                index[name] = index[name + "市"] = (_CITY, name)
+            for alias, name in self.aliases.items():
+                alias = normalize_name(alias)
+                # 单字简称（"京"、"云"、"晴"……）太容易误匹配
+                if len(alias) > 1:
+                    index[alias] = (_CITY, name)
+            for word in WEATHER_WORDS:
+                index[word] = (_WEATHER, None)
+            for word in FILLER_WORDS:
+                index.setdefault(word, (_FILLER, None))
+            self._max_length = max(len(name) for name in index)
+            self._index = index
+        return self._index
+
+    def _canonical_city(self, name: str, canonical: Optional[str]) -> Optional[str]:
+        """规范城市名；地名库中有歧义的名称（如多个"朝阳区"）返回 None"""
+        if canonical is not None:
+            return canonical
+        if self.gazetteer is None or self.gazetteer.lookup(name) is None:
+            return None
+        stripped = short_name(name)
+        return stripped if stripped in self.city_names else name
+
+    def _scan(self, text: str) -> Tuple[List[Tuple[str, Optional[str]]], int]:
+        """最长匹配扫描，返回匹配到的 (类别, 规范城市名) 和无法解释的字符数"""
+        index = self._build_index()
+        tokens = []
+        unknown = 0
+        i = 0
+        while i < len(text):
+            for length in range(min(self._max_length, len(text) - i), 0, -1):
+                word = text[i:i + length]
+                entry = index.get(word)
+                if entry is not None:
+                    kind, canonical = entry
+                    tokens.append((kind, self._canonical_city(word, canonical) if kind == _CITY else None))
+                    i += length
+                    # 简称后的行政级别后缀（"恩施州"、"苏州市"）
+                    if kind == _CITY and i < len(text) and text[i] in _CITY_SUFFIXES:
+                        i += 1
+                    break
+            else:
+                unknown += 1
+                i += 1
+        return tokens, unknown
+
+    def parse(self, text: str) -> ParsedIntent:
+        """解析查询；无法解析时 confidence 为 0"""
+        text = _PUNCTUATION.sub("", unicodedata.normalize("NFKC", text).lower())
+        rejected = ParsedIntent(self.default_city, "today", "", 0.0)
+        if not text:
+            return rejected
+
+        # 1. 时间表达
+        times = []
+        phrase = None
+        segments = []
+        position = 0
+        for match in TIME_PATTERN.finditer(text):
+            times.append(match.lastgroup)
+            phrase = phrase or match.group()
+            segments.append(text[position:match.start()])
+            position = match.end()
+        segments.append(text[position:])
+        if len(set(times)) > 1:
+            return rejected
+
+        # 2. 其余部分中的城市、天气词和虚词（按时间表达切开，避免跨越时间表达匹配）
+        cities = []
+        recognized = bool(times)
+        unknown = 0
+        for segment in segments:
+            tokens, segment_unknown = self._scan(segment)
+            unknown += segment_unknown
+            for kind, city in tokens:
+                if kind == _CITY:
+                    if city is None:
+                        return rejected
+                    cities.append(city)
+                recognized = recognized or kind != _FILLER
+        cities = list(dict.fromkeys(cities))
+        if not recognized or len(cities) > 1:
+            return rejected
+
+        city = cities[0] if cities else self.default_city
+        time_class = times[0] if times else "today"
+        if phrase is None or phrase in ("today", "tomorrow", "tonight", "now"):
+            phrase = {"today": "今天", "tomorrow": "明天"}[time_class]
+        confidence = 1 - unknown / len(text)
+        return ParsedIntent(city, time_class, f"查询{city}{phrase}的天气", round(confidence, 3))
+
+    def try_parse(self, text: str) -> Optional[ParsedIntent]:
+        """置信度足够时返回解析结果，否则返回 None（由 LLM 解析），同时统计命中率"""
+        intent = self.parse(text)
+        if intent.confidence >= self.min_confidence and intent.confidence > 0:
+            self.hits += 1
+            return intent
+        self.fallbacks += 1
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """规则解析命中次数、交给 LLM 的次数和命中率"""
+        total = self.hits + self.fallbacks
+        return {
+            "rule_hits": self.hits,
+            "rule_fallbacks": self.fallbacks,
+            "rule_hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class RuleFirstIntentAgent(BaseChatAgent):
+    """意图解析代理：先用规则解析用户查询，置信度不足时交给 LLM 意图解析代理
+
+    与被包装的代理同名，可直接替换群组中的 intent_parser
+    """
+
+    def __init__(self, parser: RuleIntentParser, fallback: BaseChatAgent):
+        super().__init__(fallback.name, fallback.description)
+        self.parser = parser
+        self.fallback = fallback
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    def _parse(self, messages: Sequence[BaseChatMessage]) -> Optional[ParsedIntent]:
+        """只解析本轮收到的最新一条用户消息"""
+        for message in reversed(messages):
+            if isinstance(message, TextMessage) and message.source == "user":
+                return self.parser.try_parse(message.content)
+        return None
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage],
+                          cancellation_token: CancellationToken) -> Response:
+        intent = self._parse(messages)
+        if intent is None:
+            return await self.fallback.on_messages(messages, cancellation_token)
+        return Response(chat_message=TextMessage(content=intent.format(), source=self.name))
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[BaseAgentEvent | BaseChatMessage | Response, None]:
+        intent = self._parse(messages)
+        if intent is None:
+            async for item in self.fallback.on_messages_stream(messages, cancellation_token):
+                yield item
+        else:
+            yield Response(chat_message=TextMessage(content=intent.format(), source=self.name))
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        await self.fallback.on_reset(cancellation_token)
+
+    async def save_state(self) -> Mapping[str, object]:
+        return await self.fallback.save_state()
+
+    async def load_state(self, state: Mapping[str, object]) -> None:
+        await self.fallback.load_state(state)
+
+    async def close(self) -> None:
+        await self.fallback.close()
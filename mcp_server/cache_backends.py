@@ -0,0 +1,433 @@
+"""
+缓存后端
+地理编码和预报的二级缓存（进程内字典缓存之下）统一通过 CacheBackend 读写，按部署选择：
+memory（进程内 LRU）、sqlite（本机文件，多进程共享）、redis（Redis 协议，多主机共享）
+"""
+
+import logging
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from mcp_server.record_codec import dump_records, load_records
+
+logger = logging.getLogger("weather-mcp-server")
+
+
+class CacheBackend:
+    """缓存后端接口
+
+    - get_many 返回命中的键值（未命中、已过期的键不出现在结果中），set_many 批量写入
+    - ttl 为条目保留的秒数，None 时使用后端的默认 ttl（也为 None 则永不过期）
+    - add 仅在键不存在（或已过期）时写入，返回是否写入，可用作跨进程租约
+    - 值可以是预报记录、坐标元组、字典等，sqlite / redis 后端以受限的 pickle 存储
+    - 读写失败时记录日志并视为未命中，不影响查询本身
+    """
+
+    name = "base"
+
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def set_many(self, items: Mapping[str, Any], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def delete_many(self, keys: Iterable[str]):
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set_many({key: value}, ttl)
+
+    def delete(self, key: str):
+        self.delete_many([key])
+
+    def close(self):
+        """释放连接，之后再次使用会重新打开"""
+
+    def stats(self) -> Dict[str, int]:
+        """命中与未命中次数"""
+        return {"store_hits": self.hits, "store_misses": self.misses}
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.ttl if ttl is None else ttl
+        return None if ttl is None else self.clock() + ttl
+
+    def _count(self, requested: int, found: int):
+        self.hits += found
+        self.misses += requested - found
+
+
+class MemoryBackend(CacheBackend):
+    """进程内 LRU 缓存，条目数超过上限时淘汰最久未使用的条目"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 100_000, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(ttl, clock)
+        self.max_entries = max_entries
+        # key -> (过期时间或 None, 值)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Optional[float], Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and now >= entry[0]:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        now = self.clock()
+        found = {}
+        for key in keys:
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Mapping[str, Any], ttl: Optional[float] = None):
+        expires_at = self._expires_at(ttl)
+        for key, value in items.items():
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._live(key, self.clock()) is not None:
+            return False
+        self.set_many({key: value}, ttl)
+        return True
+
+    def delete_many(self, keys: Iterable[str]):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class SqliteBackend(CacheBackend):
+    """SQLite 缓存（WAL 模式），同一台主机上的多个进程可共享同一个文件
+
+    - 首次使用时才打开数据库；不同用途的缓存使用不同的表
+    - 已过期的条目读取时视为未命中，写入时顺带清理
+    - 条目数超过上限时，按写入时间淘汰最旧的条目
+    """
+
+    name = "sqlite"
+
+    # 单条 SQL 中 IN 列表的最大长度
+    _BATCH = 500
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 100_000,
+                 ttl: Optional[float] = None, clock: Callable[[], float] = time.time):
+        super().__init__(ttl, clock)
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"无效的表名：{table}")
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_updated_at ON {self.table}(updated_at)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        now = self.clock()
+        found = {}
+        try:
+            with self._lock:
+                conn = self._connect()
+                for i in range(0, len(keys), self._BATCH):
+                    chunk = keys[i:i + self._BATCH]
+                    rows = conn.execute(
+                        f"SELECT key, value FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))}) "
+                        "AND (expires_at IS NULL OR expires_at > ?)",
+                        (*chunk, now)
+                    ).fetchall()
+                    for key, data in rows:
+                        found[key] = load_records(data)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取缓存失败（{self.path}:{self.table}）：{e}")
+            found = {}
+        self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Mapping[str, Any], ttl: Optional[float] = None):
+        if not items:
+            return
+        now = self.clock()
+        expires_at = self._expires_at(ttl)
+        try:
+            rows = [(key, dump_records(value), expires_at, now) for key, value in items.items()]
+            with self._lock:
+                conn = self._connect()
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._evict(conn, now)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存失败（{self.path}:{self.table}）：{e}")
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = self.clock()
+        try:
+            data = dump_records(value)
+            with self._lock:
+                cursor = self._connect().execute(
+                    f"INSERT INTO {self.table} (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, "
+                    f"updated_at = excluded.updated_at WHERE {self.table}.expires_at <= ?",
+                    (key, data, self._expires_at(ttl), now, now)
+                )
+                return cursor.rowcount > 0
+        except Exception as e:
+            # 缓存不可用时按写入成功处理，调用方各自继续
+            logger.warning(f"⚠️ 写入缓存失败（{self.path}:{self.table}）：{e}")
+            return True
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        try:
+            with self._lock:
+                self._connect().executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys])
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 删除缓存失败（{self.path}:{self.table}）：{e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count <= self.max_entries:
+            return
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY updated_at LIMIT ?)",
+                (overflow,)
+            )
+
+    def __len__(self) -> int:
+        try:
+            with self._lock:
+                return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisError(Exception):
+    """Redis 返回的错误回复"""
+
+
+class RedisBackend(CacheBackend):
+    """Redis 协议（RESP2）缓存，兼容 Redis、Valkey、KeyDB 等
+
+    - 键加上 namespace 前缀，过期由服务端按 PX 处理，容量由服务端的淘汰策略控制
+    - 批量读写通过 MGET 和流水线（pipeline）一次往返完成
+    - 连接失败后 retry_interval 秒内直接视为未命中，避免每次查询都等待连接超时
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", namespace: str = "weather",
+                 ttl: Optional[float] = None, timeout: float = 0.5, retry_interval: float = 5.0,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(ttl, clock)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = f"{namespace}:"
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+        self.errors = 0
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._sock, self._reader = sock, sock.makefile("rb")
+            setup = []
+            if self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", str(self.db)))
+            if setup:
+                for reply in self._pipeline(setup):
+                    if isinstance(reply, RedisError):
+                        raise reply
+
+    def _pipeline(self, commands: List[Tuple]) -> List[Any]:
+        """一次发送多条命令，按顺序读取回复（错误回复作为 RedisError 对象返回）"""
+        payload = bytearray()
+        for command in commands:
+            payload += b"*%d\r\n" % len(command)
+            for arg in command:
+                if isinstance(arg, str):
+                    arg = arg.encode("utf-8")
+                payload += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        self._sock.sendall(payload)
+        return [self._read_reply() for _ in commands]
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis 连接已关闭")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(body)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"无法解析的 Redis 回复：{line!r}")
+
+    def _execute(self, commands: List[Tuple]) -> Optional[List[Any]]:
+        """执行命令，连接出错时断开并在 retry_interval 内不再重试，返回 None"""
+        with self._lock:
+            if self._sock is None and time.monotonic() < self._retry_at:
+                return None
+            try:
+                self._connect()
+                return self._pipeline(commands)
+            except (OSError, ConnectionError, RedisError, ValueError) as e:
+                self.errors += 1
+                self._disconnect()
+                self._retry_at = time.monotonic() + self.retry_interval
+                logger.warning(f"⚠️ Redis 缓存不可用（{self.host}:{self.port}）：{e}")
+                return None
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = self._reader = None
+
+    def _set_command(self, key: str, value: Any, ttl: Optional[float], *flags: str) -> Tuple:
+        ttl = self.ttl if ttl is None else ttl
+        command = ("SET", self.prefix + key, dump_records(value), *flags)
+        if ttl is not None:
+            command += ("PX", str(max(1, int(ttl * 1000))))
+        return command
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        replies = self._execute([("MGET", *(self.prefix + key for key in keys))])
+        found = {}
+        if replies is not None and isinstance(replies[0], list):
+            for key, data in zip(keys, replies[0]):
+                if data is None:
+                    continue
+                try:
+                    found[key] = load_records(data)
+                except Exception as e:
+                    logger.warning(f"⚠️ Redis 缓存条目无法解码，忽略：{key}, 错误：{e}")
+        self._count(len(keys), len(found))
+        return found
+
+    def set_many(self, items: Mapping[str, Any], ttl: Optional[float] = None):
+        if items:
+            self._execute([self._set_command(key, value, ttl) for key, value in items.items()])
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        replies = self._execute([self._set_command(key, value, ttl, "NX")])
+        # Redis 不可用时按写入成功处理，调用方各自继续
+        return replies is None or replies[0] == "OK"
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self._execute([("DEL", *keys)])
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def stats(self) -> Dict[str, int]:
+        return {**super().stats(), "store_errors": self.errors}
+
+
+def create_backend(spec: str, path: str, table: str, max_entries: int = 100_000,
+                   ttl: Optional[float] = None) -> Optional[CacheBackend]:
+    """按配置创建缓存后端
+
+    spec 为 none（或空）、memory、sqlite、sqlite:///文件路径 或 redis://[:密码@]主机:端口/库；
+    sqlite 未指定路径时使用 path（为空则不启用），redis 以 table 作为键前缀
+    """
+    spec = (spec or "none").strip()
+    if spec == "none":
+        return None
+    if spec == "memory":
+        return MemoryBackend(max_entries, ttl)
+    if spec == "sqlite" or spec.startswith("sqlite://"):
+        path = spec[len("sqlite:///"):] if spec.startswith("sqlite:///") else path
+        return SqliteBackend(path, table, max_entries, ttl) if path else None
+    if spec.startswith(("redis://", "rediss://")):
+        if spec.startswith("rediss://"):
+            raise ValueError("暂不支持 TLS 连接（rediss://）")
+        return RedisBackend(spec, namespace=f"weather:{table}", ttl=ttl)
+    raise ValueError(f"未知的缓存后端：{spec}")
@@ -0,0 +1,160 @@
+"""
+缓存快照
+定期及退出时把预报缓存和地理编码内存缓存写入一个压缩快照文件，重启后在后台载入，
+避免每次重启都从空缓存开始、集中请求上游
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.record_codec import dump_records, load_records
+
+logger = logging.getLogger("weather-mcp-server")
+
+SNAPSHOT_VERSION = 1
+
+
+def encode_snapshot(payload: Dict[str, Any]) -> bytes:
+    return zlib.compress(dump_records(payload), 6)
+
+
+def decode_snapshot(data: bytes) -> Dict[str, Any]:
+    payload = load_records(zlib.decompress(data))
+    if not isinstance(payload, dict) or payload.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("快照版本不匹配")
+    return payload
+
+
+class CacheSnapshot:
+    """预报缓存与地理编码缓存的快照
+
+    - 快照包含预报缓存的全部条目（保留原过期时间）、地名坐标和逆地理编码结果
+    - 写入先落到临时文件再原子替换，进程中途退出不会留下损坏的快照
+    - 载入时跳过已失效（超出降级保留期）的预报条目，以及超过 geocode_ttl 的地理编码；
+      文件读取和解码在线程中执行，不阻塞服务器启动
+    - geocoder 为 AmapGeocoder（可选）
+    """
+
+    def __init__(self, path: str, forecast_cache: ForecastCache, geocoder=None,
+                 geocode_ttl: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.forecast_cache = forecast_cache
+        self.geocoder = geocoder
+        self.geocode_ttl = geocode_ttl
+        self.clock = clock
+        self.loading: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loaded = 0
+        self.saved = 0
+        self.saved_bytes = 0
+
+    def capture(self) -> Dict[str, Any]:
+        """在事件循环线程中取出当前缓存内容（记录本身不可变，可以在其他线程序列化）"""
+        payload: Dict[str, Any] = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": self.clock(),
+            "forecasts": self.forecast_cache.items(),
+        }
+        if self.geocoder is not None:
+            payload["geocodes"] = list(self.geocoder.coord_cache.items())
+            payload["regeocodes"] = list(self.geocoder.regeo_cache.items())
+        return payload
+
+    def write(self, payload: Dict[str, Any]) -> int:
+        """序列化并原子写入快照文件，返回写入的字节数"""
+        data = encode_snapshot(payload)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return len(data)
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        """读取并解码快照文件，文件不存在或损坏时返回 None"""
+        try:
+            with open(self.path, "rb") as f:
+                return decode_snapshot(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ 缓存快照无法读取，忽略：{e}")
+            return None
+
+    def restore(self, payload: Dict[str, Any]) -> int:
+        """把快照内容并入当前缓存（已有的条目优先），返回载入的预报条目数"""
+        loaded = self.forecast_cache.restore(payload.get("forecasts", ()))
+        geocode_fresh = self.geocode_ttl is None or self.clock() - payload.get("saved_at", 0) <= self.geocode_ttl
+        if self.geocoder is not None and geocode_fresh:
+            for name, coordinates in payload.get("geocodes", ()):
+                if name not in self.geocoder.coord_cache:
+                    self.geocoder._remember(name, tuple(coordinates))
+            for cell, place in payload.get("regeocodes", ()):
+                self.geocoder.regeo_cache.setdefault(cell, place)
+        self.loaded += loaded
+        return loaded
+
+    def save(self) -> int:
+        """同步写入快照（退出时使用），返回写入的字节数"""
+        size = self.write(self.capture())
+        self.saved += 1
+        self.saved_bytes = size
+        return size
+
+    async def save_async(self) -> int:
+        """在线程中序列化和写入快照"""
+        size = await asyncio.to_thread(self.write, self.capture())
+        self.saved += 1
+        self.saved_bytes = size
+        return size
+
+    async def load(self) -> int:
+        """在线程中读取快照，再在事件循环中并入缓存"""
+        start = time.monotonic()
+        payload = await asyncio.to_thread(self.read)
+        if payload is None:
+            return 0
+        loaded = self.restore(payload)
+        logger.info(f"♻️ 已载入缓存快照：{loaded} 条预报，耗时 {(time.monotonic() - start) * 1000:.0f}ms")
+        return loaded
+
+    def start(self, interval: float = 0) -> asyncio.Task:
+        """后台载入快照，之后每 interval 秒写入一次（0 表示只在退出时写入）；返回载入任务"""
+        self.loading = asyncio.create_task(self.load())
+        if interval > 0:
+            self._task = asyncio.create_task(self._run(interval))
+        return self.loading
+
+    async def _run(self, interval: float):
+        await asyncio.gather(self.loading, return_exceptions=True)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save_async()
+            except Exception as e:
+                logger.warning(f"⚠️ 写入缓存快照失败：{e}")
+
+    async def stop(self):
+        """停止定期写入，等待载入完成后写入最终快照"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.loading is not None:
+            # 未载入完成就写入会用不完整的缓存覆盖旧快照
+            await asyncio.gather(self.loading, return_exceptions=True)
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning(f"⚠️ 写入缓存快照失败：{e}")
+
+    def stats(self) -> Dict[str, int]:
+        """快照统计：载入的预报条目数、写入次数、最近一次快照字节数"""
+        return {"loaded": self.loaded, "saved": self.saved, "bytes": self.saved_bytes}
@@ -0,0 +1,100 @@
+"""
+熔断器
+上游连续失败或响应过慢时快速失败，避免每次工具调用都等到超时
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger("weather-mcp-server")
+
+
+class CircuitBreaker:
+    """按上游划分的熔断器
+
+    - closed：正常放行；连续 failure_threshold 次失败（慢调用也计为失败）后打开
+    - open：直接拒绝，recovery_timeout 秒后进入 half_open
+    - half_open：只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_threshold: float = 5.0,
+                 recovery_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+        self.slow_calls = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否允许向上游发起请求"""
+        if self._state == self.CLOSED:
+            return True
+
+        if self._state == self.OPEN:
+            if self.clock() - self._opened_at < self.recovery_timeout:
+                self.rejected += 1
+                return False
+            self._state = self.HALF_OPEN
+            self._probing = False
+
+        # half_open：同一时间只放行一个探测请求
+        if self._probing:
+            self.rejected += 1
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self, duration: float = 0.0):
+        """记录一次成功调用，耗时超过慢调用阈值时按失败计"""
+        if self.slow_call_threshold and duration >= self.slow_call_threshold:
+            self.slow_calls += 1
+            self._on_failure()
+            return
+
+        self._failures = 0
+        self._probing = False
+        if self._state != self.CLOSED:
+            logger.info(f"✅ {self.name} 熔断器已恢复")
+            self._state = self.CLOSED
+
+    def release_probe(self):
+        """探测名额未用于上游请求（共享缓存命中、被取消、本地排队拒绝）时归还，让后续请求继续探测"""
+        if self._state == self.HALF_OPEN:
+            self._probing = False
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        self._on_failure()
+
+    def _on_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+            self._state = self.OPEN
+            self._opened_at = self.clock()
+            self.opened += 1
+            logger.warning(f"⚠️ {self.name} 熔断器打开，{self.recovery_timeout:.0f}s 内直接降级")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "slow_calls": self.slow_calls,
+        }
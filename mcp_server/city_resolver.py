@@ -0,0 +1,218 @@
+"""
+城市名称规范化
+在查询缓存和调用地理编码API之前，把各种写法（"北京市"、"beijing"、"沪"、"魔都"、全角字符、
+多余空格、错别字）统一为规范名称，使更多查询命中本地数据
+"""
+
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mcp_server.gazetteer import AUTONOMY_SUFFIXES, REGION_SUFFIXES, Gazetteer, short_name
+
+# 别称与简称
+CITY_ALIASES = {
+    "京": "北京", "帝都": "北京", "首都": "北京", "北平": "北京",
+    "沪": "上海", "申": "上海", "魔都": "上海", "申城": "上海",
+    "津": "天津", "渝": "重庆", "山城": "重庆", "雾都": "重庆",
+    "穗": "广州", "羊城": "广州", "花城": "广州",
+    "鹏城": "深圳", "蓉": "成都", "蓉城": "成都", "金陵": "南京",
+    "江城": "武汉", "泉城": "济南", "春城": "昆明", "冰城": "哈尔滨",
+    "星城": "长沙", "榕城": "福州", "鹭岛": "厦门", "筑城": "贵阳",
+    "日光城": "拉萨", "鹿城": "温州", "甬": "宁波",
+    # 省级行政区简称
+    "冀": "河北", "晋": "山西", "辽": "辽宁", "吉": "吉林", "黑": "黑龙江", "苏": "江苏", "浙": "浙江",
+    "皖": "安徽", "闽": "福建", "赣": "江西", "鲁": "山东", "豫": "河南", "鄂": "湖北", "湘": "湖南",
+    "粤": "广东", "琼": "海南", "川": "四川", "蜀": "四川", "黔": "贵州", "贵": "贵州", "滇": "云南",
+    "云": "云南", "陕": "陕西", "秦": "陕西", "甘": "甘肃", "陇": "甘肃", "青": "青海", "宁": "宁夏",
+    "桂": "广西", "藏": "西藏", "新": "新疆", "蒙": "内蒙古", "港": "香港", "澳": "澳门", "台": "台湾",
+}
+
+# 拼音与英文名称（小写、无空格和撇号）
+CITY_LATIN_NAMES = {
+    "beijing": "北京", "peking": "北京", "shanghai": "上海", "guangzhou": "广州", "canton": "广州",
+    "shenzhen": "深圳", "hangzhou": "杭州", "nanjing": "南京", "nanking": "南京", "wuhan": "武汉",
+    "chengdu": "成都", "xian": "西安", "chongqing": "重庆", "chungking": "重庆", "tianjin": "天津",
+    "suzhou": "苏州", "qingdao": "青岛", "tsingtao": "青岛", "ningbo": "宁波", "wuxi": "无锡",
+    "jinan": "济南", "dalian": "大连", "shenyang": "沈阳", "changchun": "长春", "haerbin": "哈尔滨",
+    "harbin": "哈尔滨", "fuzhou": "福州", "xiamen": "厦门", "amoy": "厦门", "kunming": "昆明",
+    "nanchang": "南昌", "hefei": "合肥", "shijiazhuang": "石家庄", "taiyuan": "太原",
+    "zhengzhou": "郑州", "changsha": "长沙", "nanning": "南宁", "haikou": "海口", "guiyang": "贵阳",
+    "lanzhou": "兰州", "yinchuan": "银川", "xining": "西宁", "wulumuqi": "乌鲁木齐",
+    "urumqi": "乌鲁木齐", "lasa": "拉萨", "lhasa": "拉萨", "hongkong": "香港", "xianggang": "香港",
+    "macau": "澳门", "macao": "澳门", "aomen": "澳门", "taipei": "台北", "sanya": "三亚",
+    "guilin": "桂林", "lijiang": "丽江", "dali": "大理", "huhehaote": "呼和浩特", "hohhot": "呼和浩特",
+    "wenzhou": "温州", "zhuhai": "珠海", "dongguan": "东莞", "foshan": "佛山", "yantai": "烟台",
+}
+
+
+# 景点、建筑、道路等地点的常见结尾；这类名称交给在线地理编码，不做错别字纠正
+POI_SUFFIXES = (
+    "门", "宫", "园", "寺", "庙", "观", "祠", "塔", "楼", "阁", "桥", "湖", "池", "泉", "峰", "岛", "湾", "滩",
+    "广场", "公园", "景区", "古城", "古镇", "大学", "学院", "医院", "机场", "站", "路", "街", "巷", "胡同",
+    "大厦", "中心", "馆", "陵", "港", "码头",
+)
+
+
+def looks_like_poi(name: str) -> bool:
+    """名称像景点、建筑或道路（如"天安门"、"丽江古城"），而不是行政区划"""
+    if name.endswith(AUTONOMY_SUFFIXES + REGION_SUFFIXES):
+        return False
+    return name.endswith(POI_SUFFIXES)
+
+
+def normalize_name(name: str) -> str:
+    """全角转半角、去掉空白和撇号，拉丁字母转小写"""
+    name = unicodedata.normalize("NFKC", name)
+    name = "".join(ch for ch in name if not ch.isspace() and ch not in "'’·.-_")
+    return name.lower()
+
+
+def max_typo_distance(name: str) -> int:
+    """允许的编辑距离：汉字名称较短，3个字的名称改一个字常常就是另一个真实地点（"武当山"/"武夷山"），
+    只在4个字及以上时容忍1个错字"""
+    if name.isascii():
+        if len(name) < 5:
+            return 0
+        return 1 if len(name) < 8 else 2
+    return 1 if len(name) >= 4 else 0
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein 编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(current[j - 1] + 1, previous[j] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _deletes(word: str, distance: int) -> set:
+    """删除至多 distance 个字符得到的所有变体（含原词）"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+class TypoIndex:
+    """对称删除索引（SymSpell），用于按编辑距离模糊查找名称
+
+    建索引时记录每个名称删除至多 d 个字符后的变体，查询时只需对查询词同样做删除并查表，
+    再用编辑距离校验候选，避免逐个比较全部名称。d 按名称长度取 max_typo_distance。
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._variants: Dict[str, set] = {}
+        self._count = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, name: str):
+        self._count += 1
+        for variant in _deletes(name, max_typo_distance(name)):
+            self._variants.setdefault(variant, set()).add(name)
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """返回编辑距离不超过 max_distance 的名称，按距离排序"""
+        candidates = set()
+        for variant in _deletes(word, max_distance):
+            candidates |= self._variants.get(variant, set())
+
+        results = []
+        for name in candidates:
+            distance = edit_distance(word, name)
+            if distance <= max_distance:
+                results.append((name, distance))
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+
+class CityNameResolver:
+    """城市名称解析器
+
+    依次尝试：规范化 → 别称/拼音/英文名 → 已知名称（含去后缀）→ 离线地名库 → 模糊匹配，
+    返回规范名称作为后续缓存和地理编码的键；都未命中时返回规范化后的原名称。
+    模糊匹配只接受唯一的最佳候选。
+    """
+
+    def __init__(self, known_names: Iterable[str], aliases: Optional[Dict[str, str]] = None,
+                 gazetteer: Optional[Gazetteer] = None):
+        self.known_names = set(known_names)
+        self.aliases = {normalize_name(alias): name for alias, name in (aliases or {}).items()}
+        self.gazetteer = gazetteer
+        self._index: Optional[TypoIndex] = None
+        self._lock = threading.Lock()
+        self.aliased = 0
+        self.suffix_stripped = 0
+        self.corrected = 0
+
+    def _build_index(self) -> TypoIndex:
+        """首次模糊匹配时才建立索引（包含地名库名称）"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    names = set(self.known_names)
+                    names.update(alias for alias in self.aliases if len(alias) > 1)
+                    if self.gazetteer is not None:
+                        names.update(self.gazetteer.names())
+                    self._index = TypoIndex(names)
+        return self._index
+
+    def resolve(self, name: str) -> str:
+        """返回规范名称"""
+        normalized = normalize_name(name)
+        if not normalized:
+            return name.strip()
+
+        # 1. 别称、拼音和英文名
+        if normalized in self.aliases:
+            self.aliased += 1
+            return self.aliases[normalized]
+
+        # 2. 已知名称，"北京市"统一为"北京"
+        if normalized in self.known_names:
+            return normalized
+        stripped = short_name(normalized)
+        if stripped in self.known_names:
+            self.suffix_stripped += 1
+            return stripped
+
+        # 3. 离线地名库能直接解析的名称保持原样
+        if self.gazetteer is not None and normalized in self.gazetteer:
+            return normalized
+
+        # 4. 错别字：只接受去掉行政级别后缀后等长的候选（替换错字），不按删字纠正，
+        #    避免"天安门"变成"天门"、"徐家汇"变成"徐汇"；像景点、建筑的名称不纠正
+        max_distance = max_typo_distance(normalized)
+        if max_distance and not looks_like_poi(normalized):
+            length = len(short_name(normalized))
+            matches = [
+                (match, distance) for match, distance in self._build_index().search(normalized, max_distance)
+                if len(short_name(match)) == length
+            ]
+            if matches:
+                best_distance = matches[0][1]
+                canonical = {self.aliases.get(match, match) for match, distance in matches if distance == best_distance}
+                if len(canonical) == 1:
+                    self.corrected += 1
+                    return canonical.pop()
+
+        return normalized
+
+    def stats(self) -> Dict[str, int]:
+        """名称解析统计"""
+        return {
+            "aliased": self.aliased,
+            "suffix_stripped": self.suffix_stripped,
+            "corrected": self.corrected,
+        }
@@ -0,0 +1,74 @@
+"""
+紧凑结构化输出
+工具结果可以按短字段名的 JSON 或 key=value 文本返回，省去图标、标签和生活建议，
+由下游 LLM 自行组织语言，减少其输入 token。JSON 中字段相同的多条记录（如多天预报）输出为表格：
+首行为字段名，其余每行为一条记录的值
+
+字段：c 地点，d 日期（月-日），tm 时刻，w 天气，lo/hi 最低/最高气温，t 气温，at 体感温度，h 湿度%，
+wl 风力等级，p 降水概率%，pi 降水强度mm/h，aqi 空气质量指数，kp 降水提示，stale 缓存数据的分钟数，err 错误
+"""
+
+import json
+from typing import Any, Dict, List
+
+OUTPUT_FORMATS = ("text", "json", "kv")
+
+FIELD_LEGEND = (
+    "c=地点 d=日期(月-日) tm=时刻 w=天气 lo/hi=最低/最高气温°C t=气温°C at=体感°C h=湿度% wl=风力等级 "
+    "p=降水概率% pi=降水强度mm/h aqi=空气质量指数 kp=降水提示 stale=缓存数据的分钟数 err=错误"
+)
+
+# 工具参数 format 的 JSON Schema
+OUTPUT_FORMAT_SCHEMA = {
+    "type": "string",
+    "enum": list(OUTPUT_FORMATS),
+    "description": f"输出格式：text 为带图标的中文文本；json、kv 为字段简写的紧凑结构（{FIELD_LEGEND}；"
+                   "JSON 中多条记录为表格，首行为字段名）",
+}
+
+
+def resolve_format(requested: Any, default: str = "text") -> str:
+    """本次调用的输出格式：优先使用调用参数，其次是服务器配置，无效值视为 text"""
+    fmt = requested if isinstance(requested, str) and requested else default
+    fmt = fmt.lower()
+    return fmt if fmt in OUTPUT_FORMATS else "text"
+
+
+def _kv_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:g}"
+    text = str(value)
+    # 含空白或等号的值加引号，保证按空格切分后仍能还原
+    if not text or any(ch.isspace() or ch == "=" for ch in text):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+def render_kv(payload: Dict[str, Any]) -> str:
+    """标量字段合为一行，列表中的每个条目各占一行（嵌套条目递归展开）"""
+    scalars = [f"{key}={_kv_value(value)}" for key, value in payload.items()
+               if value is not None and not isinstance(value, list)]
+    lines: List[str] = [" ".join(scalars)] if scalars else []
+    for value in payload.values():
+        if isinstance(value, list):
+            lines.extend(render_kv(item) for item in value)
+    return "\n".join(lines)
+
+
+def _tabulate(value: Any) -> Any:
+    """去掉空字段；字段相同的多条记录转为 [[字段名...], [值...], ...]"""
+    if isinstance(value, dict):
+        return {key: _tabulate(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        rows = [_tabulate(item) for item in value]
+        if len(rows) > 1 and all(isinstance(row, dict) and row.keys() == rows[0].keys() for row in rows):
+            return [list(rows[0])] + [list(row.values()) for row in rows]
+        return rows
+    return value
+
+
+def render(payload: Dict[str, Any], fmt: str) -> str:
+    """按 json 或 kv 格式输出"""
+    if fmt == "json":
+        return json.dumps(_tabulate(payload), ensure_ascii=False, separators=(",", ":"))
+    return render_kv(payload)
@@ -0,0 +1,44 @@
+"""
+上游响应 JSON 解码
+彩云和高德的响应直接从字节解码：优先使用可选的 orjson 或 msgspec（C 实现），都未安装时回退到标准库 json。
+解码结果随即转换为紧凑预报记录或坐标，原始的字典树不会进入缓存
+"""
+
+import importlib.util
+import json
+import logging
+from typing import Any, Callable, Tuple
+
+logger = logging.getLogger("weather-mcp-server")
+
+# auto 模式下按顺序选择第一个已安装的解码器
+DECODERS = ("orjson", "msgspec", "json")
+
+
+def _load(name: str) -> Callable[[bytes], Any]:
+    if name == "orjson":
+        import orjson
+        return orjson.loads
+    if name == "msgspec":
+        import msgspec
+        return msgspec.json.decode
+    return json.loads
+
+
+def available_decoders() -> Tuple[str, ...]:
+    """已安装的解码器"""
+    return tuple(name for name in DECODERS if name == "json" or importlib.util.find_spec(name) is not None)
+
+
+def select_decoder(preferred: str = "auto") -> Tuple[str, Callable[[bytes], Any]]:
+    """返回 (解码器名称, loads 函数)；指定的解码器未安装或名称无效时回退到 auto"""
+    preferred = (preferred or "auto").lower()
+    available = available_decoders()
+    if preferred != "auto":
+        if preferred in available:
+            return preferred, _load(preferred)
+        if preferred in DECODERS:
+            logger.warning(f"⚠️ 未安装 {preferred}，JSON 解码回退到 {available[0]}（pip install {preferred}）")
+        else:
+            logger.warning(f"⚠️ 未知的 JSON 解码器：{preferred}，可选值：auto、{'、'.join(DECODERS)}")
+    return available[0], _load(available[0])
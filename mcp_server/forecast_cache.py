@@ -0,0 +1,170 @@
+"""
+天气预报缓存
+按位置缓存完整的 15 天预报，支持 TTL 过期、LRU 淘汰、内存上限以及当地零点失效；
+过期条目在 stale_ttl 内仍保留，供上游故障时降级使用
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SECONDS_PER_DAY = 86400
+
+
+def next_local_midnight(now: float, tzshift: int) -> float:
+    """计算当地下一个零点对应的时间戳，tzshift 为时区偏移秒数（彩云返回的 tzshift 字段）"""
+    local_now = now + tzshift
+    return (local_now // SECONDS_PER_DAY + 1) * SECONDS_PER_DAY - tzshift
+
+
+class ForecastCache:
+    """有界内存预报缓存
+
+    - 每个条目在 TTL 到期或当地零点（以先到者为准）后失效，避免跨天后"今天"错位
+    - 条目数或估算字节数超过上限时，按最近最少使用顺序淘汰
+    - 过期后的条目在写入后 stale_ttl 秒内仍可通过 get_stale 读取
+    """
+
+    def __init__(self, ttl: float = 1800, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 stale_ttl: float = 0, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        # key -> (过期时间, 写入时间, 估算字节数, 数据)
+        self._entries: "OrderedDict[str, Tuple[float, float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, touch=False) is not None
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str, touch: bool = True) -> Optional[Any]:
+        """读取未过期的缓存，超出降级保留期的条目会被顺带删除"""
+        entry = self._entries.get(key)
+        if entry is None:
+            if touch:
+                self.misses += 1
+            return None
+
+        expires_at, stored_at, _, value = entry
+        now = self.clock()
+        if now >= expires_at:
+            # 超出降级保留期才真正删除
+            if now >= stored_at + self.stale_ttl:
+                self._remove(key)
+            if touch:
+                self.misses += 1
+            return None
+
+        if touch:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, float]]:
+        """读取条目（无论是否过期），返回 (数据, 写入时间)；超出降级保留期返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored_at, _, value = entry
+        if self.clock() >= max(expires_at, stored_at + self.stale_ttl):
+            self._remove(key)
+            return None
+        return value, stored_at
+
+    def expires_at(self, key: str) -> Optional[float]:
+        """条目的失效时间（不影响 LRU 顺序和命中统计），没有该条目时返回 None"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def entry(self, key: str) -> Optional[Tuple[float, float, int, Any]]:
+        """原始条目 (过期时间, 写入时间, 估算字节数, 数据)，不影响 LRU 顺序和命中统计"""
+        return self._entries.get(key)
+
+    def put(self, key: str, expires_at: float, stored_at: float, size: int, value: Any):
+        """写入其他来源（如跨进程共享缓存）的条目，保留原过期时间和写入时间"""
+        if key in self._entries:
+            self._remove(key)
+
+        # 单个条目超过内存上限时不缓存
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        self._entries[key] = (expires_at, stored_at, size, value)
+        self._bytes += size
+        self._evict()
+
+    def set(self, key: str, value: Any, size: int = 0, tzshift: Optional[int] = None,
+            ttl: Optional[float] = None):
+        """写入缓存；提供 tzshift 时条目最晚在当地零点失效"""
+        now = self.clock()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        if tzshift is not None:
+            expires_at = min(expires_at, next_local_midnight(now, tzshift))
+        self.put(key, expires_at, now, size, value)
+
+    def items(self) -> List[Tuple[str, float, float, int, Any]]:
+        """所有条目 (key, 过期时间, 写入时间, 估算字节数, 数据)，最久未使用的在前"""
+        return [(key, *entry) for key, entry in self._entries.items()]
+
+    def restore(self, entries: Iterable[Tuple[str, float, float, int, Any]]) -> int:
+        """载入 items() 导出的条目，保留原过期时间；已存在的键和超出降级保留期的条目跳过，返回载入数"""
+        now = self.clock()
+        loaded = 0
+        # 逆序插入到前端，载入后保持原来的 LRU 顺序
+        for key, expires_at, stored_at, size, value in reversed(list(entries)):
+            if key in self._entries or now >= max(expires_at, stored_at + self.stale_ttl):
+                continue
+            if self.max_bytes and size > self.max_bytes:
+                continue
+            self._entries[key] = (expires_at, stored_at, size, value)
+            # 载入的条目比启动后写入的更旧，排在 LRU 前端优先淘汰
+            self._entries.move_to_end(key, last=False)
+            self._bytes += size
+            loaded += 1
+        self._evict()
+        return loaded
+
+    def invalidate(self, key: str):
+        """删除指定条目"""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: str):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
@@ -0,0 +1,137 @@
+"""
+紧凑预报记录
+彩云响应在写入缓存前只解码一次，仅保留各工具实际使用的字段（温度、天气现象、降水、湿度、风速），
+逐天/逐小时序列存放在 array 中；缓存、降级和格式化都直接使用这些记录，不再保留原始 JSON
+"""
+
+import sys
+from array import array
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+
+@lru_cache(maxsize=256)
+def iso_date(ordinal: int) -> str:
+    """日期序数转 YYYY-MM-DD；各地点的预报日期相同，转换结果可以共用"""
+    return date.fromordinal(ordinal).isoformat()
+
+
+class ForecastRecord:
+    """预报记录基类
+
+    - tzshift：时区偏移秒数，用于当地零点失效和本地时间显示
+    - server_time：彩云服务器时间戳（/daily 接口可能没有）
+    - stale_seconds：降级返回旧数据时距写入的秒数，最新数据为 None
+    """
+
+    __slots__ = ("tzshift", "server_time", "stale_seconds")
+
+    def __init__(self, envelope: Dict[str, Any]):
+        self.tzshift = int(envelope.get("tzshift") or 0)
+        self.server_time = envelope.get("server_time")
+        self.stale_seconds: Optional[int] = None
+
+    @classmethod
+    def _slots(cls):
+        for klass in cls.__mro__:
+            yield from getattr(klass, "__slots__", ())
+
+    def copy(self) -> "ForecastRecord":
+        """浅拷贝，序列本身不会被修改，可以共用"""
+        clone = object.__new__(type(self))
+        for name in self._slots():
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def nbytes(self) -> int:
+        """估算常驻内存字节数（驻留的天气现象字符串为各记录共用，不计入）"""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(value) for value in (getattr(self, name) for name in self._slots())
+            if isinstance(value, (array, tuple, str))
+        )
+
+
+class DailyForecast(ForecastRecord):
+    """逐天预报，第 i 天的各字段位于各序列的第 i 位"""
+
+    __slots__ = ("days", "temp_max", "temp_min", "skycon", "rain_prob", "humidity", "wind_speed")
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        daily = data["result"]["daily"]
+        temperature = daily["temperature"]
+        # 日期存为序数，格式化时再转换为字符串
+        self.days = array("i", (date.fromisoformat(t["date"][:10]).toordinal() for t in temperature))
+        self.temp_max = array("f", (t["max"] for t in temperature))
+        self.temp_min = array("f", (t["min"] for t in temperature))
+        self.skycon = tuple(sys.intern(s["value"]) for s in daily["skycon"])
+        self.rain_prob = array("H", (int(p["probability"] * 100) for p in daily["precipitation"]))
+        self.humidity = array("B", (int(h["avg"] * 100) for h in daily["humidity"]))
+        self.wind_speed = array("f", (w["avg"]["speed"] for w in daily["wind"]))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def date(self, i: int) -> str:
+        """第 i 天的日期（YYYY-MM-DD）"""
+        return iso_date(self.days[i])
+
+    def dates(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """第 start 到 end 天的日期"""
+        return list(map(iso_date, self.days[start:end]))
+
+    def shifted(self, offset: int) -> "DailyForecast":
+        """跳过前 offset 天的副本，原记录不变"""
+        clone = self.copy()
+        for name in DailyForecast.__slots__:
+            setattr(clone, name, getattr(self, name)[offset:])
+        return clone
+
+
+class HourlyForecast(ForecastRecord):
+    """逐小时预报及未来两小时降水提示"""
+
+    __slots__ = ("keypoint", "times", "temperature", "skycon", "rain_prob")
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        result = data["result"]
+        hourly = result["hourly"]
+        temperature = hourly["temperature"]
+        self.keypoint = result.get("forecast_keypoint") or ""
+        self.times = array("q", (int(datetime.fromisoformat(t["datetime"]).timestamp()) for t in temperature))
+        self.temperature = array("f", (t["value"] for t in temperature))
+        self.skycon = tuple(sys.intern(s["value"]) for s in hourly["skycon"])
+        self.rain_prob = array("H", (int(p.get("probability", 0)) for p in hourly["precipitation"]))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+class RealtimeWeather(ForecastRecord):
+    """实况天气"""
+
+    __slots__ = ("skycon", "temperature", "apparent_temperature", "humidity", "wind_speed",
+                 "precipitation_intensity", "aqi", "aqi_description")
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        realtime = data["result"]["realtime"]
+        air_quality = realtime.get("air_quality", {})
+        self.skycon = sys.intern(realtime["skycon"])
+        self.temperature = realtime["temperature"]
+        self.apparent_temperature = realtime.get("apparent_temperature")
+        self.humidity = realtime["humidity"]
+        self.wind_speed = realtime["wind"]["speed"]
+        self.precipitation_intensity = realtime.get("precipitation", {}).get("local", {}).get("intensity") or 0
+        self.aqi = air_quality.get("aqi", {}).get("chn")
+        self.aqi_description = air_quality.get("description", {}).get("chn", "")
+
+
+# /weather 合并接口各部分对应的记录类型
+PART_RECORDS = {
+    "realtime": RealtimeWeather,
+    "hourly": HourlyForecast,
+    "daily": DailyForecast,
+}
@@ -0,0 +1,328 @@
+"""
+离线行政区划地名库
+收录省、地级、县级行政区划的行政区划代码与中心点坐标，打包为紧凑的二进制文件，
+首次查询时通过 mmap 加载并建立索引，支持全称、去后缀简称、上级限定（如"北京市朝阳区"）及前缀查询
+
+数据文件由本模块从 CSV（adcode,name,longitude,latitude）生成：
+    python mcp_server/gazetteer.py adcodes.csv -o mcp_server/data/gazetteer.bin
+
+内置的 data/gazetteer.bin 来自 cpca 0.5.5（https://github.com/DQinYuan/chinese_province_city_area_mapper）
+的 adcodes.csv，以 MIT 许可证发布，许可证全文和署名见 data/LICENSE-cpca
+"""
+
+import argparse
+import bisect
+import csv
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("weather-mcp-server")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.bin")
+
+# 文件头：魔数、版本、记录数；记录：adcode、纬度×1e6、经度×1e6、名称偏移、名称字节数
+MAGIC = b"GAZT"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+RECORD = struct.Struct("<IiiIB3x")
+COORD_SCALE = 1_000_000
+
+PROVINCE, PREFECTURE, COUNTY = 0, 1, 2
+
+# 行政区划名称中不代表具体地点的占位条目
+PLACEHOLDER_NAMES = {"市辖区", "县", "省直辖县级行政区划", "自治区直辖县级行政区划"}
+
+# 去后缀：先去掉行政级别后缀，自治地方再去掉民族名称（如"恩施土家族苗族自治州" -> "恩施"）
+AUTONOMY_SUFFIXES = ("特别行政区", "自治区", "自治州", "自治县", "自治旗")
+REGION_SUFFIXES = ("地区", "盟", "省", "市", "区", "县", "旗", "州")
+MINORITY_NATIONALITIES = (
+    "蒙古 回 藏 维吾尔 苗 彝 壮 布依 朝鲜 满 侗 瑶 白 土家 哈尼 哈萨克 傣 黎 傈僳 佤 畲 拉祜 水 东乡 "
+    "纳西 景颇 柯尔克孜 土 达斡尔 仫佬 羌 布朗 撒拉 毛南 仡佬 锡伯 阿昌 普米 塔吉克 怒 乌孜别克 俄罗斯 "
+    "鄂温克 德昂 保安 裕固 京 塔塔尔 独龙 鄂伦春 赫哲 门巴 珞巴 基诺 高山"
+).split()
+# 自治地方名称中民族名常省略"族"字（如"巴音郭楞蒙古自治州"），单字民族名不省略
+_NATIONALITY_TOKENS = sorted(
+    [name + "族" for name in MINORITY_NATIONALITIES] + [name for name in MINORITY_NATIONALITIES if len(name) > 1],
+    key=len, reverse=True
+)
+
+
+class Division(NamedTuple):
+    """行政区划"""
+    adcode: int
+    name: str
+    level: int
+    lat: float
+    lon: float
+
+
+def division_level(adcode: int) -> int:
+    """根据6位行政区划代码判断级别"""
+    if adcode % 10000 == 0:
+        return PROVINCE
+    if adcode % 100 == 0:
+        return PREFECTURE
+    return COUNTY
+
+
+def is_within(adcode: int, parent: int) -> bool:
+    """adcode 是否属于上级行政区划 parent"""
+    level = division_level(parent)
+    if level == PROVINCE:
+        return adcode // 10000 == parent // 10000 and adcode != parent
+    if level == PREFECTURE:
+        return adcode // 100 == parent // 100 and adcode != parent
+    return False
+
+
+def short_name(name: str) -> str:
+    """去掉行政级别后缀和自治地方的民族名称，简称至少保留2个字"""
+    for suffix in AUTONOMY_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            name = name[:-len(suffix)]
+            stripped = True
+            while stripped:
+                stripped = False
+                for token in _NATIONALITY_TOKENS:
+                    if name.endswith(token) and len(name) - len(token) >= 2:
+                        name = name[:-len(token)]
+                        stripped = True
+                        break
+            # 如"东乡族自治县"
+            if name.endswith("族") and len(name) >= 3:
+                name = name[:-1]
+            return name
+
+    for suffix in REGION_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            return name[:-len(suffix)]
+    return name
+
+
+class Gazetteer:
+    """离线行政区划地名库
+
+    - 数据文件在首次查询时才映射到内存，未使用时不占用内存
+    - 全称与简称各建一个字典索引；同名时全称优先，其次级别高者优先（省 > 地级 > 县级）
+    - 同一优先级下仍有多个同名地点（如多个"朝阳区"）时视为歧义，返回 None 交给在线地理编码
+    - 名称无法直接匹配时，尝试拆分为"上级 + 下级"逐级限定
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._count = 0
+        self._names_offset = 0
+        self._exact: Dict[str, List[int]] = {}
+        self._short: Dict[str, List[int]] = {}
+        self._prefix: List[Tuple[str, int]] = []
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return self._count
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                self._load()
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"⚠️ 行政区划地名库加载失败：{self.path}, 错误：{e}")
+            self._loaded = True
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError("文件格式不匹配")
+
+        self._mm = mm
+        self._count = count
+        self._names_offset = HEADER.size + count * RECORD.size
+        names = set()
+        for i in range(count):
+            name = self._name(i)
+            self._exact.setdefault(name, []).append(i)
+            self._short.setdefault(short_name(name), []).append(i)
+            names.add((name, i))
+            names.add((short_name(name), i))
+        self._prefix = sorted(names)
+        logger.info(f"📚 已加载行政区划地名库：{count} 条")
+
+    def _name(self, i: int) -> str:
+        _, _, _, offset, length = RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+        start = self._names_offset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _division(self, i: int) -> Division:
+        adcode, lat, lon, offset, length = RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+        start = self._names_offset + offset
+        name = self._mm[start:start + length].decode("utf-8")
+        return Division(adcode, name, division_level(adcode), lat / COORD_SCALE, lon / COORD_SCALE)
+
+    def _candidates(self, name: str, parent: Optional[int] = None) -> List[Tuple[Tuple[int, int], Division]]:
+        """按 (是否简称匹配, 级别) 排序的候选"""
+        found: Dict[int, int] = {}
+        for i in self._short.get(short_name(name), ()):
+            found[i] = 1
+        for i in self._exact.get(name, ()):
+            found[i] = 0
+
+        candidates = []
+        for i, matched_short in found.items():
+            division = self._division(i)
+            if parent is None or is_within(division.adcode, parent):
+                candidates.append(((matched_short, division.level), division))
+        candidates.sort(key=lambda item: item[0])
+        return candidates
+
+    def _resolve(self, name: str, parent: Optional[int] = None, depth: int = 0) -> Optional[Division]:
+        candidates = self._candidates(name, parent)
+        if candidates:
+            best_rank = candidates[0][0]
+            best = [division for rank, division in candidates if rank == best_rank]
+            # 歧义时不再尝试拆分，避免"朝阳区"被拆成"朝阳 + 区"
+            return best[0] if len(best) == 1 else None
+
+        # 按"上级 + 下级"拆分，如"浙江杭州西湖区"
+        if depth < 2:
+            for split in range(len(name) - 2, 1, -1):
+                head, tail = name[:split], name[split:]
+                for _, division in self._candidates(head, parent):
+                    if division.level == COUNTY:
+                        continue
+                    resolved = self._resolve(tail, division.adcode, depth + 1)
+                    if resolved is not None:
+                        return resolved
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) is not None
+
+    def _find(self, name: str) -> Optional[Division]:
+        name = name.strip().replace(" ", "")
+        if len(name) < 2:
+            return None
+        self._ensure_loaded()
+        if not self._count:
+            return None
+        return self._resolve(name)
+
+    def lookup(self, name: str) -> Optional[Division]:
+        """按名称查找行政区划，未找到或有歧义时返回 None"""
+        division = self._find(name)
+        if division is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return division
+
+    def names(self) -> List[str]:
+        """所有全称和简称"""
+        self._ensure_loaded()
+        return list(self._exact.keys() | self._short.keys())
+
+    def divisions(self) -> List[Division]:
+        """所有行政区划"""
+        self._ensure_loaded()
+        return [self._division(i) for i in range(self._count)]
+
+    def search(self, prefix: str, limit: int = 10) -> List[Division]:
+        """前缀查询，按级别和行政区划代码排序"""
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        self._ensure_loaded()
+
+        matched = set()
+        start = bisect.bisect_left(self._prefix, (prefix, -1))
+        for name, i in self._prefix[start:]:
+            if not name.startswith(prefix):
+                break
+            matched.add(i)
+
+        divisions = sorted((self._division(i) for i in matched), key=lambda d: (d.level, d.adcode))
+        return divisions[:limit]
+
+    def close(self):
+        """释放内存映射"""
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            self._exact.clear()
+            self._short.clear()
+            self._prefix = []
+            self._count = 0
+            self._loaded = False
+
+    def stats(self) -> Dict[str, int]:
+        """地名库统计信息"""
+        return {
+            "gazetteer_entries": self._count,
+            "gazetteer_hits": self.hits,
+            "gazetteer_misses": self.misses,
+        }
+
+
+def build_gazetteer(rows: Iterable[Tuple[int, str, float, float]], path: str) -> int:
+    """将 (adcode, 名称, 纬度, 经度) 写入二进制地名库文件，返回记录数"""
+    rows = sorted(set(rows))
+    names = bytearray()
+    records = bytearray()
+    for adcode, name, lat, lon in rows:
+        encoded = name.encode("utf-8")
+        records += RECORD.pack(adcode, round(lat * COORD_SCALE), round(lon * COORD_SCALE), len(names), len(encoded))
+        names += encoded
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(rows)))
+        f.write(records)
+        f.write(names)
+    return len(rows)
+
+
+def read_adcode_csv(path: str) -> List[Tuple[int, str, float, float]]:
+    """读取 adcode,name,longitude,latitude 格式的 CSV，跳过占位条目和缺少坐标的条目
+
+    adcode 可以是6位或12位（统计用区划代码），统一转换为6位
+    """
+    rows = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            name = row["name"].strip()
+            if name in PLACEHOLDER_NAMES or not row["longitude"] or not row["latitude"]:
+                continue
+            adcode = int(row["adcode"][:6])
+            rows.append((adcode, name, float(row["latitude"]), float(row["longitude"])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成离线行政区划地名库")
+    parser.add_argument("csv", help="adcode,name,longitude,latitude 格式的 CSV 文件")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="输出文件路径")
+    args = parser.parse_args()
+
+    count = build_gazetteer(read_adcode_csv(args.csv), args.output)
+    print(f"✅ 已写入 {count} 条行政区划：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+坐标量化
+将坐标归并到已知地点（最近锚点）或固定网格/geohash 单元，使相邻地点共享同一份预报缓存
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """两点间球面距离（公里）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """geohash 编码"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """geohash 单元中心点 (纬度, 经度)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return ((lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2)
+
+
+class NearestPointIndex:
+    """已知地点的最近点索引
+
+    按经纬度分桶存放锚点，查询时只检查附近的桶。新地点若在半径内已有锚点则归并到该锚点，
+    否则自身成为新锚点。
+    """
+
+    def __init__(self, radius_km: float):
+        self.radius_km = radius_km
+        self._bucket_deg = max(radius_km / KM_PER_DEGREE, 1e-6)
+        self._buckets: Dict[Tuple[int, int], List[Tuple[float, float]]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _bucket(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self._bucket_deg), math.floor(lon / self._bucket_deg))
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[float, float]]:
+        """半径内最近的锚点，没有则返回 None"""
+        if self.radius_km <= 0 or not self._count:
+            return None
+
+        # 高纬度地区每度经度更短，需要检查更多经度方向的桶
+        lon_span = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        row, col = self._bucket(lat, lon)
+        best, best_distance = None, self.radius_km
+        for r in range(row - 1, row + 2):
+            for c in range(col - lon_span, col + lon_span + 1):
+                for point in self._buckets.get((r, c), ()):
+                    distance = haversine_km(lat, lon, point[0], point[1])
+                    if distance <= best_distance:
+                        best, best_distance = point, distance
+        return best
+
+    def add(self, lat: float, lon: float) -> Tuple[float, float]:
+        """加入地点，返回其归属的锚点"""
+        anchor = self.nearest(lat, lon)
+        if anchor is not None:
+            return anchor
+        self._buckets.setdefault(self._bucket(lat, lon), []).append((lat, lon))
+        self._count += 1
+        return (lat, lon)
+
+
+class LocationQuantizer:
+    """把坐标转换为预报缓存键和实际请求的坐标
+
+    - 半径内有已知地点（index 中的锚点）时使用该地点；锚点须在所有进程中相同（如预定义城市），
+      否则同一坐标的缓存键会随进程的查询历史变化，各 worker 之间、重启前后无法共享缓存
+    - 否则按固定经纬度网格（mode="grid"）或 geohash（mode="geohash"）取单元中心
+    - mode="off" 时保持原始坐标
+    """
+
+    def __init__(self, mode: str = "grid", step: float = 0.05, precision: int = 5,
+                 index: Optional[NearestPointIndex] = None):
+        if mode not in ("grid", "geohash", "off"):
+            raise ValueError(f"不支持的坐标量化模式：{mode}")
+        self.mode = mode
+        self.step = step
+        self.precision = precision
+        self.index = index
+        self.snapped = 0
+
+    def quantize(self, lat: float, lon: float) -> Tuple[str, Tuple[float, float]]:
+        """返回 (缓存键, (纬度, 经度))"""
+        if self.index is not None:
+            anchor = self.index.nearest(lat, lon)
+            if anchor is not None:
+                self.snapped += 1
+                return f"{anchor[1]:.4f},{anchor[0]:.4f}", anchor
+
+        if self.mode == "geohash":
+            cell = geohash_encode(lat, lon, self.precision)
+            center = geohash_center(cell)
+            return f"gh:{cell}", (round(center[0], 4), round(center[1], 4))
+
+        if self.mode == "grid" and self.step > 0:
+            row, col = math.floor(lat / self.step), math.floor(lon / self.step)
+            center = (round((row + 0.5) * self.step, 4), round((col + 0.5) * self.step, 4))
+            return f"grid:{self.step}:{row},{col}", center
+
+        return f"{lon:.4f},{lat:.4f}", (lat, lon)
@@ -0,0 +1,88 @@
+"""
+持久化地理编码缓存
+基于 SQLite（WAL 模式），服务器进程重启后仍可复用，并支持多个进程同时读写
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from mcp_server.cache_backends import CacheBackend, SqliteBackend, create_backend
+from mcp_server.record_codec import dump_records
+
+logger = logging.getLogger("weather-mcp-server")
+
+TABLE = "geocode_cache"
+
+# 旧版本使用的表：geocodes(name, lat, lon, updated_at)
+_LEGACY_TABLE = "geocodes"
+
+
+class GeocodeStore(SqliteBackend):
+    """SQLite 地理编码缓存（地名 -> (纬度, 经度)，以及 "regeo:" 开头的逆地理编码结果）
+
+    - 首次使用时才打开数据库
+    - WAL 模式 + busy_timeout，允许多个服务器进程并发读写
+    - 可选 TTL：按写入时间计算，修改 TTL 后对已有条目同样生效
+    - 条目数超过上限时，按写入时间淘汰最旧的条目
+    - 打开时把旧版 geocodes 表中的坐标导入新表（保留原写入时间），随后删除旧表
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: int = 100_000,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(path, TABLE, max_entries, ttl, clock)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = super()._connect()
+            try:
+                self._migrate(conn)
+                self._apply_ttl(conn)
+            except sqlite3.Error:
+                # 下次使用时重新打开并重试
+                conn.close()
+                self._conn = None
+                raise
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """导入旧版 geocodes 表；多个进程同时打开时只有一个进程执行导入"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (_LEGACY_TABLE,)
+            ).fetchone()
+            if exists:
+                rows = conn.execute(f"SELECT name, lat, lon, updated_at FROM {_LEGACY_TABLE}").fetchall()
+                # 新表中已有的条目比旧表新，保留新表中的值
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {self.table} (key, value, expires_at, updated_at) VALUES (?, ?, NULL, ?)",
+                    [(name, dump_records((lat, lon)), updated_at) for name, lat, lon, updated_at in rows]
+                )
+                conn.execute(f"DROP TABLE {_LEGACY_TABLE}")
+                logger.info(f"♻️ 已从旧版 {_LEGACY_TABLE} 表导入 {len(rows)} 条地理编码并删除旧表")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _apply_ttl(self, conn: sqlite3.Connection):
+        """按当前 TTL 重新计算所有条目的过期时间（与旧版按写入时间判断过期的语义一致）"""
+        if self.ttl is None:
+            conn.execute(f"UPDATE {self.table} SET expires_at = NULL WHERE expires_at IS NOT NULL")
+        else:
+            conn.execute(
+                f"UPDATE {self.table} SET expires_at = updated_at + ? WHERE expires_at IS NOT updated_at + ?",
+                (self.ttl, self.ttl)
+            )
+
+
+def create_geocode_backend(spec: str, path: str, max_entries: int = 100_000,
+                           ttl: Optional[float] = None) -> Optional[CacheBackend]:
+    """按 GEOCODE_CACHE_BACKEND 创建地理编码缓存：sqlite 使用 GeocodeStore，其余同 create_backend"""
+    spec = (spec or "none").strip()
+    if spec == "sqlite" or spec.startswith("sqlite://"):
+        path = spec[len("sqlite:///"):] if spec.startswith("sqlite:///") else path
+        return GeocodeStore(path, ttl, max_entries) if path else None
+    return create_backend(spec, path, TABLE, max_entries, ttl)
@@ -0,0 +1,139 @@
+"""
+Streamable HTTP 传输
+同一个 MCP 服务器实例通过 HTTP 对外提供服务：每台主机运行一个常驻服务器，
+多个代理进程按 URL 连接，共享同一份预报缓存、地理编码缓存和上游连接池；
+可选 pre-fork 多 worker 模式，多个进程共享同一个监听端口
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Optional
+
+import uvicorn
+from mcp.server import Server
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger("weather-mcp-server")
+
+
+class _StreamableHTTPEndpoint:
+    """把请求交给会话管理器，由它按 mcp-session-id 分发到各自的会话"""
+
+    def __init__(self, session_manager: StreamableHTTPSessionManager):
+        self.session_manager = session_manager
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await self.session_manager.handle_request(scope, receive, send)
+
+
+def create_http_app(server: Server, path: str = "/mcp", max_sessions: Optional[int] = 1000,
+                    session_idle_timeout: Optional[float] = 1800, stateless: bool = False) -> Starlette:
+    """创建 Streamable HTTP 应用
+
+    - 每个客户端连接是一个独立的 MCP 会话，并发会话数上限为 max_sessions，超出时新连接返回 503
+    - 空闲超过 session_idle_timeout 秒的会话被回收（客户端需重新初始化）
+    - stateless 为 True 时不保存会话，每个请求独立处理，适合放在负载均衡之后
+    - GET /healthz 用于存活探测
+    """
+    session_manager = StreamableHTTPSessionManager(
+        app=server,
+        stateless=stateless,
+        max_sessions=max_sessions,
+        session_idle_timeout=None if stateless else session_idle_timeout,
+    )
+
+    async def healthz(request: Request) -> PlainTextResponse:
+        return PlainTextResponse("ok")
+
+    return Starlette(
+        routes=[
+            Route(path, endpoint=_StreamableHTTPEndpoint(session_manager)),
+            Route("/healthz", endpoint=healthz, methods=["GET"]),
+        ],
+        lifespan=lambda app: session_manager.run(),
+    )
+
+
+async def serve_http(server: Server, host: str = "127.0.0.1", port: int = 8765,
+                     sock: Optional[socket.socket] = None, **kwargs):
+    """以 Streamable HTTP 方式运行服务器，直到收到退出信号；sock 为父进程预先绑定的监听套接字，kwargs 传给 create_http_app"""
+    app = create_http_app(server, **kwargs)
+    config = uvicorn.Config(app, host=host, port=port, log_level="info", lifespan="on")
+    logger.info(f"🌐 Streamable HTTP 服务地址：http://{host}:{port}{kwargs.get('path', '/mcp')}（进程 {os.getpid()}）")
+    await uvicorn.Server(config).serve(sockets=[sock] if sock is not None else None)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """在父进程中绑定监听套接字，fork 出的 worker 共用它接受连接"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve_workers(workers: int, run_worker: Callable[[int], None], restart_delay: float = 1.0):
+    """pre-fork：fork 出 workers 个子进程各自运行 run_worker(编号)，父进程只负责监管
+
+    - 子进程意外退出时按原编号重新 fork（间隔 restart_delay 秒，避免启动即崩溃时空转）
+    - 父进程收到 SIGTERM / SIGINT 后转发给所有子进程，等待它们退出后返回
+    - 必须在创建事件循环和线程之前调用（仅支持 POSIX）
+    """
+    children = {}
+    stopping = False
+
+    def spawn(worker: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(worker)
+            except BaseException:
+                logger.exception(f"❌ worker {worker} 异常退出")
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        children[pid] = worker
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        for worker in range(workers):
+            spawn(worker)
+        logger.info(f"👷 已启动 {workers} 个 worker 进程：{sorted(children)}")
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker = children.pop(pid, None)
+            if worker is None or stopping:
+                continue
+            logger.warning(f"⚠️ worker {worker}（进程 {pid}）退出，状态 {status}，{restart_delay:g} 秒后重启")
+            time.sleep(restart_delay)
+            if not stopping:
+                spawn(worker)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
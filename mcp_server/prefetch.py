@@ -0,0 +1,226 @@
+"""
+热门位置预取
+按位置统计查询频率（指数衰减的 LFU 计数），后台定期在缓存到期前刷新最热门的 N 个位置和所有内置城市；
+提前量按位置加抖动错开，每轮刷新数不超过彩云 QPS 的一定比例，避免与用户请求争抢配额
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import next_local_midnight
+from mcp_server.scheduler import BACKGROUND, upstream_priority
+
+logger = logging.getLogger("weather-mcp-server")
+
+
+class DecayingCounter:
+    """指数衰减的访问计数
+
+    - 每次访问计 1，计数每经过 half_life 秒减半，近期的热点排在前面
+    - 增量按 2^(t/half_life) 放大后累加，衰减不需要遍历所有键；放大倍数过大时整体缩小一次
+    - 新键加入时若已达 max_keys，先淘汰计数最低的十分之一
+    - 每个键可附带一个值（如坐标），随键一起淘汰
+    """
+
+    # 放大倍数的指数上限，超过后整体缩小，避免浮点溢出
+    MAX_EXPONENT = 512
+
+    def __init__(self, half_life: float = 3600, max_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self.clock = clock
+        self._epoch = clock()
+        # key -> [放大后的计数, 附带值]
+        self._counts: Dict[Hashable, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._counts
+
+    def _exponent(self) -> float:
+        return (self.clock() - self._epoch) / self.half_life
+
+    def touch(self, key: Hashable, value: Any = None, weight: float = 1.0):
+        """记录一次访问；value 不为 None 时更新附带值"""
+        exponent = self._exponent()
+        if exponent > self.MAX_EXPONENT:
+            self._rescale(exponent)
+            exponent = 0.0
+
+        entry = self._counts.get(key)
+        if entry is None:
+            if len(self._counts) >= self.max_keys:
+                self._trim()
+            self._counts[key] = entry = [0.0, value]
+        entry[0] += weight * 2.0 ** exponent
+        if value is not None:
+            entry[1] = value
+
+    def get(self, key: Hashable) -> Any:
+        """键附带的值"""
+        entry = self._counts.get(key)
+        return entry[1] if entry is not None else None
+
+    def score(self, key: Hashable) -> float:
+        """当前（衰减后）的计数"""
+        entry = self._counts.get(key)
+        return entry[0] * 2.0 ** -self._exponent() if entry is not None else 0.0
+
+    def top(self, n: int) -> List[Tuple[Hashable, Any]]:
+        """计数最高的 n 个键及其附带值，按计数从高到低排列"""
+        if n <= 0:
+            return []
+        items = heapq.nlargest(n, self._counts.items(), key=lambda item: item[1][0])
+        return [(key, entry[1]) for key, entry in items]
+
+    def _rescale(self, exponent: float):
+        factor = 2.0 ** -exponent
+        for entry in self._counts.values():
+            entry[0] *= factor
+        self._epoch = self.clock()
+
+    def _trim(self):
+        drop = max(1, len(self._counts) // 10)
+        for key, _ in heapq.nsmallest(drop, self._counts.items(), key=lambda item: item[1][0]):
+            del self._counts[key]
+
+
+class ForecastPrefetcher:
+    """后台预取热门位置的预报
+
+    - 候选位置为 popularity 中最热门的 top_n 个加上 pinned（内置城市），每 interval 秒检查一次
+    - 缓存缺失或距失效不足提前量时刷新；提前量为 lead_time 乘以按键固定的抖动系数 (1 - jitter, 1]，
+      同时写入的条目不会在同一轮集中刷新
+    - 逐天预报最晚在当地零点失效，零点前刷新不会延长有效期，因此等到零点后再刷新
+    - 曾查询过实况或逐小时数据的位置通过合并接口刷新全部三部分，否则只刷新逐天预报
+    - 每轮最多刷新 budget 个位置（按热度排序，其余留到下一轮），熔断未闭合时暂停预取
+    - 以 background 优先级请求上游，与用户请求同时排队时让出令牌
+    """
+
+    def __init__(self, api, pinned: Iterable[Tuple[float, float]] = (), top_n: int = 50,
+                 lead_time: float = 120, interval: float = 15, rate: float = 0, jitter: float = 0.5,
+                 bundle_parts: Tuple[str, ...] = ("realtime", "hourly", "daily")):
+        self.api = api
+        self.bundle_parts = bundle_parts
+        self.top_n = top_n
+        self.lead_time = lead_time
+        self.interval = interval
+        self.jitter = jitter
+        # 每轮刷新上限：预取可用的 QPS 乘以检查间隔，rate <= 0 表示不限
+        self.budget: Optional[int] = max(1, int(rate * interval)) if rate > 0 else None
+        # 内置城市按缓存键去重
+        self.pinned: Dict[str, Tuple[float, float]] = {}
+        for lat, lon in pinned:
+            cache_key, coordinates = api.quantizer.quantize(lat, lon)
+            self.pinned.setdefault(cache_key, coordinates)
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    def lead(self, cache_key: str) -> float:
+        """该位置的刷新提前量，按缓存键固定抖动"""
+        fraction = zlib.crc32(cache_key.encode("utf-8")) / 0xFFFFFFFF
+        return self.lead_time * (1 - self.jitter * fraction)
+
+    def candidates(self) -> List[Tuple[str, Tuple[float, float], bool]]:
+        """候选位置 (缓存键, 请求坐标, 是否刷新合并接口)，热门位置在前"""
+        result = []
+        seen = set()
+        for cache_key, (coordinates, bundle) in self.api.popularity.top(self.top_n):
+            seen.add(cache_key)
+            result.append((cache_key, coordinates, bundle))
+        for cache_key, coordinates in self.pinned.items():
+            if cache_key not in seen:
+                result.append((cache_key, coordinates, False))
+        return result
+
+    def is_due(self, cache_key: str, bundle: bool) -> bool:
+        """该位置是否需要在本轮刷新"""
+        cache = self.api.forecast_cache
+        now = cache.clock()
+        parts = self.bundle_parts if bundle else ("daily",)
+        for part in parts:
+            key = self.api._part_key(cache_key, part)
+            expires_at = cache.expires_at(key)
+            if expires_at is None or now >= expires_at:
+                return True
+            if now < expires_at - self.lead(cache_key):
+                continue
+            if part == "daily":
+                # 零点失效的条目，现在刷新仍在同一时刻失效
+                cached = cache.get(key, touch=False)
+                if cached is not None and next_local_midnight(now, cached.tzshift) <= expires_at:
+                    continue
+            return True
+        return False
+
+    async def run_once(self) -> int:
+        """检查一轮并刷新到期的位置，返回刷新成功的位置数"""
+        self.rounds += 1
+        if self.api.breaker.state != CircuitBreaker.CLOSED:
+            return 0
+
+        due = [candidate for candidate in self.candidates() if self.is_due(candidate[0], candidate[2])]
+        if self.budget is not None and len(due) > self.budget:
+            self.deferred += len(due) - self.budget
+            due = due[:self.budget]
+
+        refreshed = 0
+        for cache_key, (lat, lon), bundle in due:
+            try:
+                with upstream_priority(BACKGROUND):
+                    await self.api.refresh(cache_key, lat, lon, bundle)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"⚠️ 预取预报失败：{cache_key}, 错误：{e}")
+                if self.api.breaker.state != CircuitBreaker.CLOSED:
+                    break
+            else:
+                refreshed += 1
+        self.refreshed += refreshed
+        return refreshed
+
+    async def run(self):
+        """按 interval 循环预取，直到任务被取消；缓存快照载入完成后才开始"""
+        await self.api.wait_warmup()
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"⚠️ 预取检查失败：{e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """在当前事件循环中启动后台预取"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """停止后台预取"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """预取统计：跟踪的位置数、检查轮数、刷新成功/失败数、超出每轮上限顺延的次数"""
+        return {
+            "tracked": len(self.api.popularity),
+            "pinned": len(self.pinned),
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+        }
@@ -0,0 +1,108 @@
+"""
+上游限流与重试
+限流器按套餐 QPS 控制请求速率，429/5xx 响应按带抖动的指数退避重试并遵循 Retry-After
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Dict, Optional, Protocol
+
+import httpx
+
+from mcp_server.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger("weather-mcp-server")
+
+
+class Limiter(Protocol):
+    """上游限流器接口（如 scheduler.PriorityScheduler）：acquire 返回排队等待的秒数"""
+
+    async def acquire(self) -> float: ...
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+class RetryPolicy:
+    """429/5xx 重试策略：带完全抖动的指数退避，存在 Retry-After 时以其为准"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.gave_up = 0
+
+    @staticmethod
+    def is_retryable(status_code: int) -> bool:
+        return status_code == 429 or 500 <= status_code < 600
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待秒数"""
+        if retry_after is not None:
+            # 在服务端要求的时间之后再加少量抖动，避免多个调用者同时重试
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"retries": self.retries, "gave_up": self.gave_up}
+
+
+async def get_with_retry(client: httpx.AsyncClient, limiter: Limiter, policy: RetryPolicy,
+                         url: str, breaker: Optional[CircuitBreaker] = None, **kwargs) -> httpx.Response:
+    """经过限流器发送 GET 请求，429/5xx 按策略重试，最终失败时抛出 httpx.HTTPStatusError
+
+    指定 breaker 时把结果计入熔断器：耗时只计最后一次 HTTP 请求本身，不含限流排队和重试退避；
+    限流器在本地拒绝（如排队已满）时不计为上游失败
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.HTTPError:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        duration = time.monotonic() - start
+        if not policy.is_retryable(response.status_code):
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            if breaker is not None:
+                breaker.record_success(duration)
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        # 服务端要求的等待时间超过退避上限时不再重试，直接返回错误，避免工具调用长时间挂起
+        if attempt >= policy.max_retries or (retry_after is not None and retry_after > policy.max_delay):
+            policy.gave_up += 1
+            if breaker is not None:
+                breaker.record_failure()
+            response.raise_for_status()
+
+        delay = policy.delay(attempt, retry_after)
+        attempt += 1
+        policy.retries += 1
+        logger.warning(f"⚠️ 上游返回 {response.status_code}，{delay:.2f}s 后第{attempt}次重试：{response.url.host}")
+        await asyncio.sleep(delay)
@@ -0,0 +1,34 @@
+"""
+缓存记录编解码
+缓存快照和 sqlite / redis 缓存后端共用的序列化格式：pickle，反序列化时只允许还原预报记录等白名单类型
+"""
+
+import io
+import pickle
+from typing import Any
+
+# 只允许还原这些类型，缓存文件或 Redis 中的数据被篡改也无法借反序列化执行任意代码
+_ALLOWED_GLOBALS = {
+    ("mcp_server.forecast_records", "DailyForecast"),
+    ("mcp_server.forecast_records", "HourlyForecast"),
+    ("mcp_server.forecast_records", "RealtimeWeather"),
+    ("array", "array"),
+    ("array", "_array_reconstructor"),
+}
+
+
+class _RecordUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str):
+        if (module, name) not in _ALLOWED_GLOBALS:
+            raise pickle.UnpicklingError(f"缓存数据中包含不允许的类型：{module}.{name}")
+        return super().find_class(module, name)
+
+
+def dump_records(value: Any) -> bytes:
+    """序列化预报记录（不压缩）"""
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_records(data: bytes) -> Any:
+    """反序列化预报记录，只允许还原记录类型"""
+    return _RecordUnpickler(io.BytesIO(data)).load()
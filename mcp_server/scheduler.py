@@ -0,0 +1,299 @@
+"""
+上游请求优先级调度
+交互式工具调用、批量查询和后台预取共用同一份上游 QPS；令牌按加权公平队列在各优先级之间分配，
+并为交互式请求预留一部分速率，保证批量和后台请求不会让等待结果的用户排在后面
+"""
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH, BACKGROUND)
+
+DEFAULT_WEIGHTS = {INTERACTIVE: 8.0, BATCH: 2.0, BACKGROUND: 1.0}
+
+# 当前请求的优先级；asyncio 任务创建时复制上下文，并发子任务继承发起者的优先级
+current_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class SharedPriority:
+    """合并请求的优先级：取所有等待同一结果的调用者中最高的一个
+
+    更高优先级的调用者加入时调用 raise_to，请求中正在排队的令牌随之移到更高的优先级队列；
+    嵌套的合并请求跟随外层一起提升
+    """
+
+    def __init__(self, priority: str, parent: Optional["SharedPriority"] = None):
+        self.priority = priority
+        self._listeners: List[Callable[[str], None]] = []
+        if parent is not None:
+            parent.add_listener(self.raise_to)
+
+    def add_listener(self, listener: Callable[[str], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def raise_to(self, priority: str):
+        if PRIORITY_CLASSES.index(priority) >= PRIORITY_CLASSES.index(self.priority):
+            return
+        self.priority = priority
+        for listener in list(self._listeners):
+            listener(priority)
+
+
+# 当前所在的合并请求；由 SingleFlight 为每个实际发起的请求设置
+shared_priority: ContextVar[Optional[SharedPriority]] = ContextVar("shared_priority", default=None)
+
+
+def effective_priority() -> str:
+    """当前上游请求的优先级：在合并请求中取其共享优先级，否则取 current_priority"""
+    shared = shared_priority.get()
+    return shared.priority if shared is not None else current_priority.get()
+
+
+@contextlib.contextmanager
+def upstream_priority(priority: str) -> Iterator[None]:
+    """在代码块内以指定优先级发起上游请求"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"未知的请求优先级：{priority}")
+    token = current_priority.set(priority)
+    # 显式指定的优先级优先于外层合并请求的共享优先级
+    shared_token = shared_priority.set(None)
+    try:
+        yield
+    finally:
+        shared_priority.reset(shared_token)
+        current_priority.reset(token)
+
+
+def parse_class_values(text: Optional[str], default: Mapping[str, float]) -> Dict[str, float]:
+    """解析 "interactive=8,batch=2" 形式的配置，未列出的优先级使用默认值"""
+    values = dict(default)
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in PRIORITY_CLASSES:
+            raise ValueError(f"未知的请求优先级：{name}")
+        values[name] = float(value)
+    return values
+
+
+class QueueFullError(Exception):
+    """该优先级的排队请求数已达上限"""
+
+
+class _Bucket:
+    """不等待的令牌桶，只负责记账"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _ClassStats:
+    __slots__ = ("queue", "last_finish", "acquired", "rejected", "wait_total", "wait_max")
+
+    def __init__(self):
+        # (虚拟完成时间, 等待者)
+        self.queue: Deque[Tuple[float, asyncio.Future]] = deque()
+        self.last_finish = 0.0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class PriorityScheduler:
+    """按优先级分配上游令牌的限流器，实现 rate_limit.Limiter 接口
+
+    - rate 为总 QPS，burst 为桶容量；rate <= 0 表示不限流
+    - 有请求排队时，按加权公平队列（虚拟完成时间 = max(虚拟时间, 该类上次完成时间) + 1/权重）依次放行，
+      同一优先级内先到先得
+    - 批量和后台请求另受 rate × (1 - interactive_reserve) 的速率上限约束，其余速率只留给交互式请求；
+      它们被该上限挡住时令牌直接给交互式请求，不会空等
+    - max_queue 限制各优先级的排队数，0 表示不限；超出时抛出 QueueFullError
+    - 优先级取自 acquire 的参数，未指定时取当前上下文（effective_priority）；
+      在合并请求中排队时，若有更高优先级的调用者加入，令牌请求会移到更高的优先级队列
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 weights: Optional[Mapping[str, float]] = None, interactive_reserve: float = 0.3,
+                 max_queue: Optional[Mapping[str, float]] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.clock = clock
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.max_queue = {name: int(limit) for name, limit in (max_queue or {}).items()}
+        self.interactive_reserve = interactive_reserve
+        now = clock()
+        capacity = burst if burst else max(1.0, rate)
+        self._bucket = _Bucket(rate, capacity, now)
+        shared_rate = rate * (1 - interactive_reserve)
+        self._shared = _Bucket(shared_rate, max(1.0, capacity * (1 - interactive_reserve)), now) \
+            if rate > 0 and interactive_reserve > 0 and shared_rate > 0 else None
+        self._classes = {name: _ClassStats() for name in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(stats.queue) for stats in self._classes.values())
+
+    def _check_loop(self):
+        # 定时器和等待者绑定事件循环，循环变化时丢弃旧的
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._timer = None
+            for stats in self._classes.values():
+                stats.queue.clear()
+
+    def _refill(self):
+        now = self.clock()
+        self._bucket.refill(now)
+        if self._shared is not None:
+            self._shared.refill(now)
+
+    def _can_take(self, priority: str) -> bool:
+        if self._bucket.tokens < 1:
+            return False
+        return priority == INTERACTIVE or self._shared is None or self._shared.tokens >= 1
+
+    def _take(self, priority: str):
+        self._bucket.tokens -= 1
+        if priority != INTERACTIVE and self._shared is not None:
+            self._shared.tokens -= 1
+
+    def _wait_time(self, priority: str) -> float:
+        wait = self._bucket.wait_time()
+        if priority != INTERACTIVE and self._shared is not None:
+            wait = max(wait, self._shared.wait_time())
+        return wait
+
+    async def acquire(self, priority: Optional[str] = None) -> float:
+        """获取一个令牌，返回排队等待的秒数"""
+        shared = shared_priority.get() if priority is None else None
+        priority = priority or effective_priority()
+        stats = self._classes[priority]
+        if self.rate <= 0:
+            stats.acquired += 1
+            return 0.0
+
+        self._check_loop()
+        self._refill()
+        if self.waiting == 0 and self._can_take(priority):
+            self._take(priority)
+            stats.acquired += 1
+            return 0.0
+
+        limit = self.max_queue.get(priority, 0)
+        if limit and len(stats.queue) >= limit:
+            stats.rejected += 1
+            raise QueueFullError(f"上游请求排队已满（{priority}），请稍后再试")
+
+        future = self._loop.create_future()
+        # [当前优先级, 队列条目]；提升优先级时一起更新
+        ticket = [priority, self._enqueue(priority, future)]
+
+        def promote(new_priority: str):
+            old_queue = self._classes[ticket[0]].queue
+            if future.done() or ticket[1] not in old_queue:
+                return
+            # 已经排队的请求不受新队列的 max_queue 限制
+            old_queue.remove(ticket[1])
+            ticket[:] = [new_priority, self._enqueue(new_priority, future)]
+            self._dispatch()
+
+        if shared is not None:
+            shared.add_listener(promote)
+        start = self.clock()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            queue = self._classes[ticket[0]].queue
+            if ticket[1] in queue:
+                queue.remove(ticket[1])
+            raise
+        finally:
+            if shared is not None:
+                shared.remove_listener(promote)
+
+        waited = self.clock() - start
+        stats = self._classes[ticket[0]]
+        stats.acquired += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        return waited
+
+    def _enqueue(self, priority: str, future: asyncio.Future) -> Tuple[float, asyncio.Future]:
+        stats = self._classes[priority]
+        finish = max(self._virtual_time, stats.last_finish) + 1 / self.weights[priority]
+        stats.last_finish = finish
+        entry = (finish, future)
+        stats.queue.append(entry)
+        return entry
+
+    def _dispatch(self):
+        """按虚拟完成时间放行排队的请求，令牌不足时设置定时器"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        while True:
+            heads = []
+            for priority, stats in self._classes.items():
+                while stats.queue and stats.queue[0][1].done():
+                    stats.queue.popleft()
+                if stats.queue:
+                    heads.append((stats.queue[0][0], priority))
+            if not heads:
+                return
+
+            eligible = [head for head in heads if self._can_take(head[1])]
+            if not eligible:
+                delay = min(self._wait_time(priority) for _, priority in heads)
+                self._timer = self._loop.call_later(delay, self._dispatch)
+                return
+
+            finish, priority = min(eligible)
+            self._take(priority)
+            self._virtual_time = finish
+            self._classes[priority].queue.popleft()[1].set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """限流统计：总排队数、已放行数、排队等待时间（毫秒），以及各优先级的排队数、最长等待和拒绝数"""
+        acquired = sum(stats.acquired for stats in self._classes.values())
+        wait_total = sum(stats.wait_total for stats in self._classes.values())
+        result: Dict[str, Any] = {
+            "queued": self.waiting,
+            "acquired": acquired,
+            "wait_avg_ms": round(wait_total / acquired * 1000, 1) if acquired else 0.0,
+            "wait_max_ms": round(max(stats.wait_max for stats in self._classes.values()) * 1000, 1),
+        }
+        for priority, stats in self._classes.items():
+            result[f"{priority}_queued"] = len(stats.queue)
+            result[f"{priority}_acquired"] = stats.acquired
+            result[f"{priority}_wait_max_ms"] = round(stats.wait_max * 1000, 1)
+            result[f"{priority}_rejected"] = stats.rejected
+        return result
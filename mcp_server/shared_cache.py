@@ -0,0 +1,82 @@
+"""
+跨进程共享预报缓存
+多 worker（或多主机）部署时，各进程的内存预报缓存之下再加一层共享的缓存后端（SQLite、Redis 等）：
+一个进程拉取的预报其他进程直接读取；同一位置同时只有持有租约的进程请求上游
+"""
+
+import os
+import socket
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from mcp_server.cache_backends import CacheBackend
+
+
+class SharedForecastStore:
+    """共享预报缓存
+
+    - 条目与 ForecastCache 相同：(过期时间, 写入时间, 估算字节数, 数据)，在后端中保留到降级保留期（stale_ttl）结束
+    - 较旧的写入不覆盖较新的条目
+    - 租约：acquire() 成功的进程负责请求上游，租约在指定的秒数后自动失效（进程崩溃也不会卡住其他进程）；
+      同一进程可重复获取自己的租约，进程内的并发请求仍由 SingleFlight 合并
+    """
+
+    def __init__(self, backend: CacheBackend, stale_ttl: float = 0, owner: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        # 共享后端可能跨主机，租约持有者由主机名和进程号区分
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.leases = 0
+        self.lease_waits = 0
+
+    def get(self, key: str) -> Optional[Tuple[float, float, int, Any]]:
+        """读取条目，不存在或超出降级保留期时返回 None"""
+        entry = self.backend.get(key)
+        if entry is None or self.clock() >= max(entry[0], entry[1] + self.stale_ttl):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, expires_at: float, stored_at: float, size: int, value: Any):
+        """写入条目，在后端中保留到降级保留期结束"""
+        retention = max(expires_at, stored_at + self.stale_ttl) - self.clock()
+        if retention <= 0:
+            return
+        current = self.backend.get(key)
+        if current is not None and current[1] > stored_at:
+            return
+        self.backend.set(key, (expires_at, stored_at, size, value), ttl=retention)
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        """尝试获取 key 的上游请求租约；已被其他进程持有且未过期时返回 False"""
+        lease = f"lease:{key}"
+        acquired = self.backend.add(lease, self.owner, ttl) or self.backend.get(lease) == self.owner
+        if acquired:
+            self.leases += 1
+        else:
+            self.lease_waits += 1
+        return acquired
+
+    def release(self, key: str):
+        """释放自己持有的租约"""
+        lease = f"lease:{key}"
+        if self.backend.get(lease) == self.owner:
+            self.backend.delete(lease)
+
+    def close(self):
+        """关闭缓存后端的连接"""
+        self.backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        """共享缓存统计：命中、未命中、获得租约次数、等待其他进程拉取的次数"""
+        return {
+            "shared_hits": self.hits,
+            "shared_misses": self.misses,
+            "shared_leases": self.leases,
+            "shared_lease_waits": self.lease_waits,
+        }
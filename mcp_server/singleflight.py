@@ -0,0 +1,74 @@
+"""
+请求合并（single-flight）
+相同键的并发调用只执行一次上游请求，其余调用者等待同一个结果
+"""
+
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from mcp_server.scheduler import SharedPriority, effective_priority, shared_priority
+
+
+class SingleFlight:
+    """按键合并并发的异步调用
+
+    - 第一个调用者负责发起请求，后续相同键的调用者直接等待其结果
+    - 上游抛出的异常会传递给所有等待者
+    - 请求在独立任务中执行，单个调用者被取消不会影响其他等待者
+    - 请求按等待者中最高的上游优先级排队：交互式调用加入后台预取发起的请求时，请求随之提升为交互式
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._priorities: Dict[Hashable, SharedPriority] = {}
+        # 实际发起的上游请求数
+        self.executed = 0
+        # 被合并到已有请求上的调用数
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        task = self._inflight.get(key)
+        return task is not None and task.get_loop() is asyncio.get_running_loop()
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """返回相同键的在途请求，没有时立即发起 fn；不等待结果，调用方可一次登记多个键"""
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+
+        if task is not None and task.get_loop() is loop:
+            self.coalesced += 1
+            self._priorities[key].raise_to(effective_priority())
+        else:
+            shared = SharedPriority(effective_priority(), shared_priority.get())
+            context = contextvars.copy_context()
+            context.run(shared_priority.set, shared)
+            task = context.run(loop.create_task, fn())
+            self._inflight[key] = task
+            self._priorities[key] = shared
+            self.executed += 1
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 fn，若相同键已有请求在途则等待其结果"""
+        return await asyncio.shield(self.start(key, fn))
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._priorities[key]
+        # 所有等待者都被取消时，避免出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """合并统计"""
+        return {
+            "inflight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
@@ -4,23 +4,49 @@
 基于 Anthropic MCP Python SDK 实现真实天气查询
 """
 
+import argparse
 import asyncio
+import bisect
 import httpx
+import importlib.util
 import logging
 import os
+import sys
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 from dotenv import load_dotenv
 
 # 加载环境变量 - 按优先级加载，从上级目录查找
-import os
 parent_dir = os.path.dirname(os.path.dirname(__file__))
 load_dotenv(os.path.join(parent_dir, ".env.local"))  # 优先加载本地配置
 load_dotenv(os.path.join(parent_dir, ".env"))  # 兜底加载默认配置
 
+# 以脚本方式启动时，将项目根目录加入路径，以便导入 mcp_server 下的其他模块
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.cache_snapshot import CacheSnapshot
+from mcp_server.shared_cache import SharedForecastStore
+from mcp_server.fast_json import select_decoder
+from mcp_server.compact_output import OUTPUT_FORMAT_SCHEMA, resolve_format, render
+from mcp_server.forecast_records import ForecastRecord, DailyForecast, HourlyForecast, RealtimeWeather, PART_RECORDS
+from mcp_server.singleflight import SingleFlight
+from mcp_server.prefetch import DecayingCounter, ForecastPrefetcher
+from mcp_server.cache_backends import CacheBackend, MemoryBackend, create_backend
+from mcp_server.geocode_store import create_geocode_backend
+from mcp_server.rate_limit import RetryPolicy, get_with_retry
+from mcp_server.scheduler import PriorityScheduler, upstream_priority, parse_class_values, DEFAULT_WEIGHTS, BATCH
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.geo_grid import NearestPointIndex, LocationQuantizer
+from mcp_server.gazetteer import Gazetteer, short_name, DEFAULT_PATH as DEFAULT_GAZETTEER_PATH
+from mcp_server.city_resolver import CityNameResolver, CITY_ALIASES, CITY_LATIN_NAMES, looks_like_poi
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("weather-mcp-server")
@@ -43,6 +69,126 @@ if not AMAP_API_KEY:
     raise ValueError("AMAP_API_KEY 环境变量未设置")
 
 AMAP_BASE_URL = os.getenv("AMAP_BASE_URL", "https://restapi.amap.com/v3/geocode/geo")
+AMAP_REGEO_URL = os.getenv("AMAP_REGEO_URL", "https://restapi.amap.com/v3/geocode/regeo")
+
+# 二级缓存后端（进程内缓存之下）：none、memory、sqlite、sqlite:///文件路径、redis://[:密码@]主机:端口/库
+# 地理编码默认 sqlite（文件为 GEOCODE_STORE_PATH）；预报为空时仅在多 worker 模式下使用 sqlite（FORECAST_SHARED_CACHE_PATH）
+GEOCODE_CACHE_BACKEND = os.getenv("GEOCODE_CACHE_BACKEND", "sqlite")
+FORECAST_CACHE_BACKEND = os.getenv("FORECAST_CACHE_BACKEND", "")
+
+# HTTP 连接池配置（彩云天气与高德地图共享同一个连接池）
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+CAIYUN_TIMEOUT = float(os.getenv("CAIYUN_TIMEOUT", "30"))
+AMAP_TIMEOUT = float(os.getenv("AMAP_TIMEOUT", "10"))
+
+# 上游限流与重试配置：按套餐 QPS 设置，0 表示不限流
+CAIYUN_QPS = float(os.getenv("CAIYUN_QPS", "10"))
+AMAP_QPS = float(os.getenv("AMAP_QPS", "10"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+
+# 上游请求优先级调度：interactive（单次工具调用）、batch（多城市查询）、background（预取）按权重分配 QPS，
+# 并为 interactive 预留一部分速率；排队上限为 0 表示不限
+UPSTREAM_PRIORITY_WEIGHTS = parse_class_values(os.getenv("UPSTREAM_PRIORITY_WEIGHTS"), DEFAULT_WEIGHTS)
+UPSTREAM_INTERACTIVE_RESERVE = float(os.getenv("UPSTREAM_INTERACTIVE_RESERVE", "0.3"))
+UPSTREAM_QUEUE_LIMITS = parse_class_values(
+    os.getenv("UPSTREAM_QUEUE_LIMITS"), {"interactive": 0, "batch": 500, "background": 100}
+)
+
+# 熔断配置：连续失败（或慢调用）达到阈值后打开，恢复期内直接返回旧数据
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "5"))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+
+# 预报缓存配置：每个位置只拉取一次完整的 15 天预报，今天/明天/未来几天都从中切片
+CAIYUN_MAX_DAILY_STEPS = 15
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "1800"))
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "1000"))
+FORECAST_CACHE_MAX_BYTES = int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 过期预报保留时长（秒），上游故障时作为降级数据返回
+FORECAST_STALE_TTL = float(os.getenv("FORECAST_STALE_TTL", "86400"))
+
+# /weather 合并接口：实况、逐小时、逐天三部分分别缓存，各自的 TTL（秒）
+CAIYUN_HOURLY_STEPS = int(os.getenv("CAIYUN_HOURLY_STEPS", "48"))
+REALTIME_CACHE_TTL = float(os.getenv("REALTIME_CACHE_TTL", "600"))
+HOURLY_CACHE_TTL = float(os.getenv("HOURLY_CACHE_TTL", "1800"))
+BUNDLE_PARTS = ("realtime", "hourly", "daily")
+BUNDLE_PART_TTLS = {"realtime": REALTIME_CACHE_TTL, "hourly": HOURLY_CACHE_TTL, "daily": FORECAST_CACHE_TTL}
+
+# 坐标量化：半径内有预定义城市时共用其预报，否则按网格（grid）或 geohash 单元归并，off 表示不量化；
+# 归并半径不超过网格步长（0.05° 约 5.5 公里），避免把相邻网格单元整体并入城市
+FORECAST_GRID_MODE = os.getenv("FORECAST_GRID_MODE", "grid")
+FORECAST_GRID_STEP = float(os.getenv("FORECAST_GRID_STEP", "0.05"))
+FORECAST_GEOHASH_PRECISION = int(os.getenv("FORECAST_GEOHASH_PRECISION", "5"))
+FORECAST_SNAP_RADIUS_KM = float(os.getenv("FORECAST_SNAP_RADIUS_KM", "5"))
+
+# 地理编码持久化缓存配置：GEOCODE_STORE_PATH 置空可关闭，GEOCODE_STORE_TTL 为空表示永不过期
+GEOCODE_STORE_PATH = os.getenv("GEOCODE_STORE_PATH", os.path.join(project_root, ".cache", "geocode.sqlite3"))
+GEOCODE_STORE_TTL = float(os.getenv("GEOCODE_STORE_TTL")) if os.getenv("GEOCODE_STORE_TTL") else None
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "100000"))
+# 高德明确返回无结果的名称在该时间（秒）内不再请求，0 表示不缓存
+GEOCODE_NOT_FOUND_TTL = float(os.getenv("GEOCODE_NOT_FOUND_TTL", "600"))
+
+# 缓存快照：定期及退出时写入预报和地理编码缓存，重启后在后台载入；路径置空关闭
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", os.path.join(project_root, ".cache", "snapshot.bin"))
+CACHE_SNAPSHOT_INTERVAL = float(os.getenv("CACHE_SNAPSHOT_INTERVAL", "300"))
+
+# 逆地理编码：结果按网格单元（默认约 1 公里）缓存；按坐标查天气时最多等待地名 REVERSE_GEOCODE_WAIT 秒
+REVERSE_GEOCODE_GRID_STEP = float(os.getenv("REVERSE_GEOCODE_GRID_STEP", "0.01"))
+REVERSE_GEOCODE_WAIT = float(os.getenv("REVERSE_GEOCODE_WAIT", "1"))
+
+# 离线行政区划地名库：地理编码优先本地解析，GAZETTEER_PATH 置空可关闭
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+
+# 高德批量地理编码：每批最多 10 个地址，AMAP_BATCH_CONCURRENCY 控制并发批数
+AMAP_BATCH_SIZE = 10
+AMAP_BATCH_CONCURRENCY = int(os.getenv("AMAP_BATCH_CONCURRENCY", "8"))
+
+# 多城市查询的并发上限
+MULTI_CITY_CONCURRENCY = int(os.getenv("MULTI_CITY_CONCURRENCY", "5"))
+
+# 上游响应的 JSON 解码器：auto 优先使用已安装的 orjson / msgspec，否则使用标准库 json
+JSON_DECODER = os.getenv("JSON_DECODER", "auto")
+JSON_DECODER_NAME, json_loads = select_decoder(JSON_DECODER)
+
+# 天气工具的默认输出格式：text（带图标的中文文本）、json 或 kv（紧凑结构，节省下游 LLM 的 token）
+TOOL_OUTPUT_FORMAT = os.getenv("TOOL_OUTPUT_FORMAT", "text")
+
+# 热门位置预取：按衰减计数跟踪查询热度，在缓存到期前刷新最热门的位置和内置城市
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "50"))
+PREFETCH_LEAD_TIME = float(os.getenv("PREFETCH_LEAD_TIME", "120"))
+PREFETCH_JITTER = float(os.getenv("PREFETCH_JITTER", "0.5"))
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "15"))
+# 预取最多占用的彩云 QPS 比例
+PREFETCH_BUDGET_SHARE = float(os.getenv("PREFETCH_BUDGET_SHARE", "0.2"))
+PREFETCH_HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE", "3600"))
+PREFETCH_MAX_TRACKED = int(os.getenv("PREFETCH_MAX_TRACKED", "10000"))
+
+# 传输方式：stdio（由代理进程启动的子进程）或 http（每台主机一个常驻服务器，代理按 URL 连接），可被命令行参数覆盖
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HTTP_HOST = os.getenv("MCP_HTTP_HOST", "127.0.0.1")
+MCP_HTTP_PORT = int(os.getenv("MCP_HTTP_PORT", "8765"))
+MCP_HTTP_PATH = os.getenv("MCP_HTTP_PATH", "/mcp")
+# 并发会话上限（0 表示不限）和空闲会话回收时间（秒）；无状态模式不保存会话
+MCP_HTTP_MAX_SESSIONS = int(os.getenv("MCP_HTTP_MAX_SESSIONS", "1000"))
+MCP_HTTP_SESSION_IDLE_TIMEOUT = float(os.getenv("MCP_HTTP_SESSION_IDLE_TIMEOUT", "1800"))
+MCP_HTTP_STATELESS = os.getenv("MCP_HTTP_STATELESS", "false").lower() in ("1", "true", "yes")
+# HTTP 模式的 worker 进程数（pre-fork，共享监听端口）；多于 1 个时各 worker 以无状态模式运行并共享预报缓存
+MCP_HTTP_WORKERS = int(os.getenv("MCP_HTTP_WORKERS", "1"))
+
+# 共享预报缓存的 SQLite 文件（FORECAST_CACHE_BACKEND 为 sqlite 时），置空时仅在多 worker 模式下使用默认路径
+FORECAST_SHARED_CACHE_PATH = os.getenv("FORECAST_SHARED_CACHE_PATH", "")
+DEFAULT_SHARED_CACHE_PATH = os.path.join(project_root, ".cache", "forecast.sqlite3")
+# 其他进程正在拉取同一位置时最多等待的秒数（同时也是租约有效期），超时后自行请求上游
+FORECAST_SHARED_LEASE_SECONDS = float(os.getenv("FORECAST_SHARED_LEASE_SECONDS", "10"))
+# 等待期间检查共享缓存的间隔（秒）
+SHARED_CACHE_POLL_INTERVAL = 0.05
 
 # 城市坐标映射
 CITY_COORDINATES = {
@@ -109,55 +255,311 @@ SKYCON_MAP = {
     "WIND": "大风"
 }
 
+# 蒲福风级下限（km/h），风力等级为风速在其中的插入位置
+BEAUFORT_THRESHOLDS_KMH = (1, 6, 12, 20, 29, 39, 50, 62, 75, 89, 103, 118)
+
+# 生活建议：温度、降水、天气现象各分几类，所有组合的建议文本预先拼好
+TEMP_TIPS = ("", "天气炎热，注意防暑降温", "天气寒冷，注意保暖添衣", "昼夜温差大，适时增减衣物")
+RAIN_TIPS = ("", "降雨概率高，建议携带雨具", "可能有降雨，备好雨伞")
+SKY_TIPS = ("", "能见度较低，出行注意安全", "天气晴朗，适合户外活动", "有降雪，注意路面湿滑")
+WEATHER_TIPS = tuple(
+    tuple(
+        tuple("，".join(tip for tip in (temp, rain, sky) if tip) or "天气适宜，祝您生活愉快" for sky in SKY_TIPS)
+        for rain in RAIN_TIPS
+    )
+    for temp in TEMP_TIPS
+)
+
+def sky_tip_category(weather: str) -> int:
+    """天气现象对应的建议类别（SKY_TIPS 下标）"""
+    if "雾" in weather or "霾" in weather:
+        return 1
+    if "晴" in weather:
+        return 2
+    if "雪" in weather:
+        return 3
+    return 0
+
+SKY_TIP_CATEGORIES = {desc: sky_tip_category(desc) for desc in SKYCON_MAP.values()}
+
+class SharedHTTPClient:
+    """进程级共享的 HTTP 连接池，保持长连接，避免每次调用重复 DNS/TCP/TLS 握手"""
+    
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def get(self) -> httpx.AsyncClient:
+        """获取共享客户端，首次使用（或事件循环变化）时创建"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # 连接绑定在事件循环上，循环变化时旧连接不可复用，直接重建
+            self._client = self._create_client()
+            self._loop = loop
+        return self._client
+    
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = HTTP2_ENABLED
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("⚠️ 未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1（pip install httpx[http2]）")
+            http2 = False
+        
+        limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+        logger.info(f"🔌 创建共享HTTP连接池：max={HTTP_MAX_CONNECTIONS}, keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={http2}")
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(CAIYUN_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            http2=http2,
+            transport=self._transport
+        )
+    
+    async def close(self):
+        """关闭连接池，可重复调用"""
+        client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+# 全局共享连接池
+shared_http = SharedHTTPClient()
+
 class AmapGeocoder:
     """高德地图地理编码客户端"""
     
-    def __init__(self):
+    def __init__(self, http: Optional[SharedHTTPClient] = None, store: Optional[CacheBackend] = None,
+                 gazetteer: Optional[Gazetteer] = None,
+                 resolver: Optional[CityNameResolver] = None):
         self.api_key = AMAP_API_KEY
         self.base_url = AMAP_BASE_URL
+        self.http = http or shared_http
         # 坐标缓存，避免重复API调用
         self.coord_cache = {}
+        # 二级缓存（可选，sqlite / redis 时进程重启后仍可复用，并在多个进程间共享），同时存放逆地理编码结果
+        self.store = store
+        # 离线行政区划地名库（可选），命中时无需调用高德API
+        self.gazetteer = gazetteer
+        # 城市名称规范化（可选），别称、拼音、错别字统一为规范名称后再查缓存
+        self.resolver = resolver
+        # 逆地理编码缓存，按网格单元存放地名
+        self.regeo_url = AMAP_REGEO_URL
+        self.regeo_quantizer = LocationQuantizer("grid", REVERSE_GEOCODE_GRID_STEP)
+        self.regeo_cache: Dict[str, Dict[str, str]] = {}
+        self.regeo_hits = 0
+        self.regeo_misses = 0
+        # 合并同一城市的并发地理编码请求（单个查询与批量查询共用）
+        self.singleflight = SingleFlight()
+        # 高德明确返回无结果的名称 -> 到期时间（time.monotonic）
+        self.not_found: Dict[str, float] = {}
+        # 按高德套餐 QPS 限流，429/5xx 退避重试
+        self.limiter = PriorityScheduler(
+            AMAP_QPS, weights=UPSTREAM_PRIORITY_WEIGHTS,
+            interactive_reserve=UPSTREAM_INTERACTIVE_RESERVE, max_queue=UPSTREAM_QUEUE_LIMITS
+        )
+        self.retry_policy = RetryPolicy(UPSTREAM_MAX_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX)
+        self.breaker = CircuitBreaker("高德地图", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_SLOW_CALL_SECONDS, CIRCUIT_RECOVERY_SECONDS)
+        self.hits = 0
+        self.misses = 0
     
     async def close(self):
-        """兼容性方法 - 高德API使用上下文管理器，无需手动关闭"""
-        pass
+        """关闭共享连接池、持久化缓存和地名库"""
+        await self.http.close()
+        if self.store is not None:
+            self.store.close()
+        if self.gazetteer is not None:
+            self.gazetteer.close()
     
-    async def get_coordinates(self, city_name: str) -> Optional[tuple[float, float]]:
-        """获取城市坐标，优先使用缓存和预定义坐标"""
+    def _remember(self, city_name: str, coordinates: tuple[float, float]):
+        """写入内存缓存，超过上限时丢弃最早写入的条目"""
+        if len(self.coord_cache) >= GEOCODE_CACHE_MAX_ENTRIES:
+            self.coord_cache.pop(next(iter(self.coord_cache)))
+        self.coord_cache[city_name] = coordinates
+    
+    def _save(self, city_name: str, coordinates: tuple[float, float]):
+        """写入内存缓存和二级缓存"""
+        self._save_many({city_name: coordinates})
+    
+    def _save_many(self, found: Dict[str, tuple[float, float]]):
+        """批量写入内存缓存和二级缓存"""
+        for city_name, coordinates in found.items():
+            self._remember(city_name, coordinates)
+        if self.store is not None and found:
+            self.store.set_many(found)
+    
+    def _mark_not_found(self, names: List[str]):
+        """记录高德明确返回无结果的名称，GEOCODE_NOT_FOUND_TTL 秒内不再请求"""
+        if GEOCODE_NOT_FOUND_TTL <= 0:
+            return
+        expires_at = time.monotonic() + GEOCODE_NOT_FOUND_TTL
+        for name in names:
+            if len(self.not_found) >= GEOCODE_CACHE_MAX_ENTRIES:
+                self.not_found.pop(next(iter(self.not_found)))
+            self.not_found[name] = expires_at
+    
+    def _known_not_found(self, city_name: str) -> bool:
+        expires_at = self.not_found.get(city_name)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del self.not_found[city_name]
+            return False
+        return True
+    
+    def _lookup_local(self, city_name: str, check_store: bool = True) -> Optional[tuple[float, float]]:
+        """依次查询预定义坐标、离线地名库、内存缓存和二级缓存，不访问网络"""
         # 1. 优先使用预定义的精确坐标
         if city_name in CITY_COORDINATES:
+            self.hits += 1
             return CITY_COORDINATES[city_name]
         
-        # 2. 检查缓存
+        # 2. 查询离线行政区划地名库；按"上级 + 下级"拆分才匹配上的景点类名称（"丽江古城"）交给在线地理编码
+        if self.gazetteer is not None:
+            division = self.gazetteer.lookup(city_name)
+            if division is not None and looks_like_poi(city_name) \
+                    and city_name not in (division.name, short_name(division.name)):
+                division = None
+            if division is not None:
+                self.hits += 1
+                return (division.lat, division.lon)
+        
+        # 3. 检查缓存
         if city_name in self.coord_cache:
+            self.hits += 1
             return self.coord_cache[city_name]
         
-        # 3. 调用高德地理编码API - 使用上下文管理器，每次创建新客户端
+        # 4. 检查二级缓存
+        if check_store and self.store is not None:
+            return self._lookup_store([city_name]).get(city_name)
+        
+        return None
+    
+    def _lookup_store(self, names: List[str]) -> Dict[str, tuple[float, float]]:
+        """批量查询二级缓存（一次往返），命中的写入内存缓存"""
+        found = {name: tuple(coordinates) for name, coordinates in self.store.get_many(names).items()}
+        for name, coordinates in found.items():
+            self.hits += 1
+            self._remember(name, coordinates)
+        return found
+    
+    async def get_coordinates(self, city_name: str) -> Optional[tuple[float, float]]:
+        """获取城市坐标，优先使用缓存和预定义坐标"""
+        if self.resolver is not None:
+            city_name = self.resolver.resolve(city_name)
+        coordinates = self._lookup_local(city_name)
+        if coordinates is not None or self._known_not_found(city_name):
+            return coordinates
+        
+        # 5. 调用高德地理编码API，同一城市的并发请求（包括批量查询中的）只发起一次
+        self.misses += 1
+        return await self.singleflight.do(city_name, lambda: self._geocode(city_name))
+    
+    async def get_coordinates_many(self, names: List[str]) -> Dict[str, Optional[tuple[float, float]]]:
+        """批量获取城市坐标
+        
+        先从本地数据解析，剩余的按每批 10 个使用高德批量模式查询，各批并发执行；
+        高德刚报告过无结果的名称不再请求。结果以传入的名称为键。
+        """
+        canonical = {name: self.resolver.resolve(name) if self.resolver is not None else name for name in names}
+        results: Dict[str, Optional[tuple[float, float]]] = {}
+        pending = []
+        for name in dict.fromkeys(canonical.values()):
+            coordinates = self._lookup_local(name, check_store=False)
+            results[name] = coordinates
+            if coordinates is None:
+                pending.append(name)
+        if pending and self.store is not None:
+            stored = self._lookup_store(pending)
+            results.update(stored)
+            pending = [name for name in pending if name not in stored]
+        pending = [name for name in pending if not self._known_not_found(name)]
+        
+        if pending:
+            self.misses += len(pending)
+            results.update(await self._geocode_pending(pending))
+        
+        return {name: results.get(canonical[name]) for name in dict.fromkeys(names)}
+    
+    async def _geocode_pending(self, names: List[str]) -> Dict[str, Optional[tuple[float, float]]]:
+        """批量地理编码本地未命中的名称
+        
+        与单个查询使用相同的 singleflight 键：已在查询中的名称直接等待其结果，其余分批查询，
+        批量进行期间到达的同名单个查询也等待所在批次的结果
+        """
+        semaphore = asyncio.Semaphore(AMAP_BATCH_CONCURRENCY)
+        
+        async def run(chunk: List[str]):
+            async with semaphore:
+                return await self._geocode_batch(chunk)
+        
+        async def pick(batch: asyncio.Task, name: str):
+            return (await batch)[name]
+        
+        # 分批和登记之间没有 await，不会与其他请求交错
+        fresh = [name for name in names if name not in self.singleflight]
+        batch_of: Dict[str, asyncio.Task] = {}
+        for i in range(0, len(fresh), AMAP_BATCH_SIZE):
+            chunk = fresh[i:i + AMAP_BATCH_SIZE]
+            batch = asyncio.create_task(run(chunk))
+            batch_of.update(dict.fromkeys(chunk, batch))
+        tasks = [
+            self.singleflight.start(name, lambda name=name: pick(batch_of[name], name))
+            for name in names
+        ]
+        return dict(zip(names, await asyncio.gather(*(asyncio.shield(task) for task in tasks))))
+    
+    async def _request_geocode(self, address: str, batch: bool = False) -> Dict[str, Any]:
+        """调用高德地理编码API"""
+        params = {
+            "key": self.api_key,
+            "address": address,
+            "output": "json"
+        }
+        if batch:
+            params["batch"] = "true"
+        return await self._request(self.base_url, params)
+    
+    async def _request(self, url: str, params: Dict[str, str]) -> Dict[str, Any]:
+        """调用高德Web服务API - 复用共享连接池，熔断期间直接失败"""
+        if not self.breaker.allow_request():
+            raise Exception("高德地图服务暂时不可用（熔断中）")
+        
+        client = self.http.get()
+        try:
+            response = await get_with_retry(
+                client, self.limiter, self.retry_policy, url, breaker=self.breaker, params=params,
+                timeout=httpx.Timeout(AMAP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            )
+        finally:
+            # 在本地被拒绝（排队已满、取消）时归还半开探测名额
+            self.breaker.release_probe()
+        return json_loads(response.content)
+    
+    @staticmethod
+    def _parse_location(geocode: Dict[str, Any]) -> Optional[tuple[float, float]]:
+        """解析高德返回的坐标 "116.480881,39.989410"，返回(纬度,经度)"""
+        location = geocode.get("location")
+        # 高德在字段缺失时返回空数组而不是字符串
+        if not location or not isinstance(location, str):
+            return None
+        lon, lat = map(float, location.split(","))
+        return (lat, lon)  # 注意：我们存储为(纬度,经度)
+    
+    async def _geocode(self, city_name: str) -> Optional[tuple[float, float]]:
+        """调用高德地理编码API查询单个城市"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                params = {
-                    "key": self.api_key,
-                    "address": city_name,
-                    "output": "json"
-                }
-                
-                response = await client.get(self.base_url, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
-                if data.get("status") == "1" and data.get("count", "0") != "0":
-                    geocodes = data.get("geocodes", [])
-                    if geocodes:
-                        location = geocodes[0].get("location", "")
-                        if location:
-                            # 解析经纬度 "116.480881,39.989410"
-                            lon, lat = map(float, location.split(","))
-                            coordinates = (lat, lon)  # 注意：我们存储为(纬度,经度)
-                            
-                            # 缓存结果
-                            self.coord_cache[city_name] = coordinates
-                            logger.info(f"✅ 获取城市坐标成功：{city_name} -> {coordinates}")
-                            return coordinates
+            data = await self._request_geocode(city_name)
+            if data.get("status") == "1":
+                geocodes = data.get("geocodes", []) if data.get("count", "0") != "0" else []
+                coordinates = self._parse_location(geocodes[0]) if geocodes else None
+                if coordinates:
+                    # 缓存结果
+                    self._save(city_name, coordinates)
+                    logger.info(f"✅ 获取城市坐标成功：{city_name} -> {coordinates}")
+                    return coordinates
+                self._mark_not_found([city_name])
             
             logger.warning(f"⚠️ 未找到城市坐标：{city_name}")
             return None
@@ -165,81 +567,421 @@ class AmapGeocoder:
         except Exception as e:
             logger.error(f"❌ 地理编码API调用失败：{city_name}, 错误：{e}")
             return None
+    
+    async def _geocode_batch(self, names: List[str]) -> Dict[str, Optional[tuple[float, float]]]:
+        """使用高德批量模式查询最多 10 个城市，结果与地址顺序一一对应"""
+        results: Dict[str, Optional[tuple[float, float]]] = {name: None for name in names}
+        try:
+            data = await self._request_geocode("|".join(names), batch=True)
+            if data.get("status") != "1":
+                logger.warning(f"⚠️ 批量地理编码失败：{data.get('info')}")
+                return results
+            
+            found = {}
+            geocodes = data.get("geocodes", [])
+            for name, geocode in zip(names, geocodes):
+                coordinates = self._parse_location(geocode)
+                if coordinates:
+                    found[name] = results[name] = coordinates
+            self._save_many(found)
+            # 高德按地址顺序逐个返回，无结果的地址对应空条目
+            self._mark_not_found([name for name in names[:len(geocodes)] if name not in found])
+            
+            logger.info(f"✅ 批量获取城市坐标：{sum(1 for c in results.values() if c)}/{len(names)}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"❌ 批量地理编码API调用失败：{names}, 错误：{e}")
+            return results
+    
+    async def reverse_geocode(self, lat: float, lon: float) -> Optional[Dict[str, str]]:
+        """逆地理编码，返回 {"name": 地名, "adcode": 行政区划代码}；结果按网格单元缓存"""
+        cell, _ = self.regeo_quantizer.quantize(lat, lon)
+        if cell in self.regeo_cache:
+            self.regeo_hits += 1
+            return self.regeo_cache[cell]
+        if self.store is not None:
+            place = self.store.get(f"regeo:{cell}")
+            if place is not None:
+                self.regeo_hits += 1
+                self._remember_place(cell, place)
+                return place
+        
+        self.regeo_misses += 1
+        return await self.singleflight.do(f"regeo:{cell}", lambda: self._reverse_geocode(lat, lon, cell))
+    
+    async def _reverse_geocode(self, lat: float, lon: float, cell: str) -> Optional[Dict[str, str]]:
+        """调用高德逆地理编码API"""
+        try:
+            data = await self._request(self.regeo_url, {
+                "key": self.api_key,
+                "location": f"{lon:.6f},{lat:.6f}",
+                "output": "json"
+            })
+            place = self._parse_place(data.get("regeocode") or {}) if data.get("status") == "1" else None
+            if place is None:
+                logger.warning(f"⚠️ 未找到坐标对应的地名：{lat},{lon}")
+                return None
+            
+            self._remember_place(cell, place)
+            if self.store is not None:
+                self.store.set(f"regeo:{cell}", place)
+            logger.info(f"✅ 逆地理编码成功：{lat},{lon} -> {place['name']}")
+            return place
+            
+        except Exception as e:
+            logger.error(f"❌ 逆地理编码API调用失败：{lat},{lon}, 错误：{e}")
+            return None
+    
+    def _remember_place(self, cell: str, place: Dict[str, str]):
+        """写入逆地理编码内存缓存，超过上限时丢弃最早写入的条目"""
+        if len(self.regeo_cache) >= GEOCODE_CACHE_MAX_ENTRIES:
+            self.regeo_cache.pop(next(iter(self.regeo_cache)))
+        self.regeo_cache[cell] = place
+    
+    @staticmethod
+    def _parse_place(regeocode: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """由 addressComponent 拼出到乡镇/街道一级的地名（同一网格内的坐标共用，不含门牌）"""
+        component = regeocode.get("addressComponent") or {}
+        # 高德在字段缺失时返回空数组而不是字符串
+        parts = []
+        for key in ("province", "city", "district", "township"):
+            value = component.get(key)
+            if isinstance(value, str) and value and value not in parts:
+                parts.append(value)
+        if not parts:
+            return None
+        adcode = component.get("adcode")
+        return {"name": "".join(parts), "adcode": adcode if isinstance(adcode, str) else ""}
+    
+    def stats(self) -> Dict[str, int]:
+        """地理编码缓存与请求合并统计"""
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached": len(self.coord_cache),
+            "regeo_hits": self.regeo_hits,
+            "regeo_misses": self.regeo_misses,
+            "regeo_cached": len(self.regeo_cache),
+            "not_found": len(self.not_found),
+            **self.singleflight.stats()
+        }
+        if self.store is not None:
+            stats.update(self.store.stats())
+        if self.gazetteer is not None:
+            stats.update(self.gazetteer.stats())
+        if self.resolver is not None:
+            stats.update(self.resolver.stats())
+        return stats
 
 class WeatherAPI:
     """彩云天气API客户端"""
     
-    def __init__(self):
+    def __init__(self, http: Optional[SharedHTTPClient] = None, forecast_cache: Optional[ForecastCache] = None,
+                 quantizer: Optional[LocationQuantizer] = None):
         self.api_key = CAIYUN_API_KEY
         self.base_url = CAIYUN_BASE_URL
+        self.http = http or shared_http
+        # 坐标量化，决定预报缓存键和实际请求的坐标
+        self.quantizer = quantizer or LocationQuantizer(
+            FORECAST_GRID_MODE, FORECAST_GRID_STEP, FORECAST_GEOHASH_PRECISION
+        )
+        # 预报缓存，按位置存放完整的 15 天预报（解码后的紧凑记录）
+        self.forecast_cache = forecast_cache if forecast_cache is not None else ForecastCache(
+            ttl=FORECAST_CACHE_TTL,
+            max_entries=FORECAST_CACHE_MAX_ENTRIES,
+            max_bytes=FORECAST_CACHE_MAX_BYTES,
+            stale_ttl=FORECAST_STALE_TTL
+        )
+        # 合并同一位置的并发预报请求
+        self.singleflight = SingleFlight()
+        # 按彩云套餐 QPS 限流，429/5xx 退避重试
+        self.limiter = PriorityScheduler(
+            CAIYUN_QPS, weights=UPSTREAM_PRIORITY_WEIGHTS,
+            interactive_reserve=UPSTREAM_INTERACTIVE_RESERVE, max_queue=UPSTREAM_QUEUE_LIMITS
+        )
+        self.retry_policy = RetryPolicy(UPSTREAM_MAX_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX)
+        self.breaker = CircuitBreaker("彩云天气", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_SLOW_CALL_SECONDS, CIRCUIT_RECOVERY_SECONDS)
+        # 后台刷新任务，保留引用避免被回收
+        self._background: set = set()
+        # 缓存快照的载入任务，载入完成前的查询先等待，避免重启后集中请求上游
+        self.warmup: Optional[asyncio.Task] = None
+        # 各位置的查询热度，附带 (请求坐标, 是否查询过实况/逐小时)，供预取使用
+        self.popularity = DecayingCounter(PREFETCH_HALF_LIFE, PREFETCH_MAX_TRACKED)
+        # 跨进程共享预报缓存（多 worker 模式），位于内存缓存与上游之间
+        self.shared_cache: Optional[SharedForecastStore] = None
     
     async def close(self):
-        """兼容性方法 - 彩云天气API使用上下文管理器，无需手动关闭"""
-        pass
+        """关闭共享连接池和共享预报缓存"""
+        await self.http.close()
+        if self.shared_cache is not None:
+            self.shared_cache.close()
     
     async def get_coordinates(self, city: str) -> Optional[tuple[float, float]]:
         """获取城市坐标，动态调用高德地理编码"""
         return await amap_geocoder.get_coordinates(city)
     
-    async def get_daily_weather(self, city: str, days: int = 1) -> Dict[str, Any]:
-        """获取天气预报"""
+    async def get_daily_weather(self, city: str, days: int = 1) -> DailyForecast:
+        """获取天气预报
+        
+        无论 days 为多少，都拉取完整的 15 天预报并缓存，调用方按需切片。
+        """
         coordinates = await self.get_coordinates(city)
         if not coordinates:
             raise ValueError(f"不支持的城市：{city}")
+        return await self.get_daily_weather_at(*coordinates, label=city)
+    
+    async def get_daily_weather_at(self, lat: float, lon: float, label: Optional[str] = None) -> DailyForecast:
+        """按坐标获取完整的 15 天预报，不经过地理编码"""
+        # 相邻地点归并到同一个锚点或网格单元，共享一份预报
+        cache_key, (lat, lon) = self.quantizer.quantize(lat, lon)
+        self._record_access(cache_key, (lat, lon), bundle=False)
+        fetch = lambda: self.singleflight.do(cache_key, lambda: self._fetch_daily(lat, lon, cache_key))
+        return await self._get_cached(cache_key, fetch, label or f"{lat},{lon}", lease=cache_key)
+    
+    async def get_realtime_weather(self, city: str) -> RealtimeWeather:
+        """获取实况天气（来自 /weather 合并接口的缓存）"""
+        return (await self.get_weather_bundle(city, parts=("realtime",)))["realtime"]
+    
+    async def get_hourly_weather(self, city: str) -> HourlyForecast:
+        """获取逐小时预报（来自 /weather 合并接口的缓存）"""
+        return (await self.get_weather_bundle(city, parts=("hourly",)))["hourly"]
+    
+    async def get_weather_bundle(self, city: str, parts: tuple = BUNDLE_PARTS) -> Dict[str, ForecastRecord]:
+        """获取实况、逐小时和逐天数据
         
-        lat, lon = coordinates
-        url = f"{self.base_url}/{self.api_key}/{lon},{lat}/daily"
-        params = {"dailysteps": min(days, 15)}
+        三部分分别缓存、各自过期；任一部分缺失时通过 /weather 合并接口一次拉取全部三部分。
+        daily 部分与 /daily 接口解码得到的记录相同，两者共用缓存。
+        """
+        coordinates = await self.get_coordinates(city)
+        if not coordinates:
+            raise ValueError(f"不支持的城市：{city}")
+        
+        cache_key, (lat, lon) = self.quantizer.quantize(*coordinates)
+        self._record_access(cache_key, (lat, lon), bundle=parts != ("daily",))
+        
+        async def fetch_part(part: str) -> ForecastRecord:
+            bundle = await self.singleflight.do(f"bundle:{cache_key}", lambda: self._fetch_bundle(lat, lon, cache_key))
+            return bundle[part]
+        
+        bundle = {}
+        for part in parts:
+            bundle[part] = await self._get_cached(
+                self._part_key(cache_key, part), lambda: fetch_part(part), city, lease=f"bundle:{cache_key}"
+            )
+        return bundle
+    
+    def _record_access(self, cache_key: str, coordinates: tuple[float, float], bundle: bool):
+        """记录一次查询；查询过实况或逐小时数据的位置之后按合并接口预取"""
+        previous = self.popularity.get(cache_key)
+        self.popularity.touch(cache_key, (coordinates, bundle or bool(previous and previous[1])))
+    
+    async def refresh(self, cache_key: str, lat: float, lon: float, bundle: bool = False):
+        """预取：重新拉取并写入缓存，与用户请求共用请求合并"""
+        if bundle:
+            await self.singleflight.do(f"bundle:{cache_key}", lambda: self._fetch_bundle(lat, lon, cache_key))
+        else:
+            await self.singleflight.do(cache_key, lambda: self._fetch_daily(lat, lon, cache_key))
+    
+    @staticmethod
+    def _part_key(cache_key: str, part: str) -> str:
+        """daily 部分与 /daily 接口共用缓存键"""
+        return cache_key if part == "daily" else f"{part}:{cache_key}"
+    
+    async def _get_cached(self, key: str, fetch: Callable, label: str, lease: Optional[str] = None) -> ForecastRecord:
+        """读取缓存；未命中时调用 fetch 拉取，熔断或失败时降级为旧数据
+        
+        启用共享缓存时先读取其他 worker 写入的条目，拉取上游前按 lease 获取跨进程租约。
+        """
+        await self.wait_warmup()
+        cached = self.forecast_cache.get(key)
+        if cached is not None:
+            return cached
+        if self.shared_cache is not None:
+            cached = self._load_shared(key)
+            if cached is not None:
+                return cached
+        
+        stale = self.forecast_cache.get_stale(key)
+        
+        # 熔断打开：有旧数据立即返回，没有则快速失败
+        if not self.breaker.allow_request():
+            if stale is not None:
+                return self._as_stale(*stale)
+            raise Exception("彩云天气服务暂时不可用，请稍后再试")
+        
+        # 熔断恢复探测：先返回旧数据，在后台刷新
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if stale is not None and probe:
+            task = asyncio.create_task(self._probe(fetch()))
+            self._background.add(task)
+            task.add_done_callback(self._background_done)
+            return self._as_stale(*stale)
+        
+        try:
+            return await self._fetch_leased(key, lease or key, fetch)
+        except Exception as e:
+            if stale is None:
+                raise
+            logger.warning(f"⚠️ 天气API调用失败，返回缓存的旧数据：{label}, 错误：{e}")
+            return self._as_stale(*stale)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+    
+    async def _probe(self, refresh: Awaitable[ForecastRecord]) -> ForecastRecord:
+        """后台探测刷新；结果来自其他 worker 的共享缓存或被取消、未请求上游时归还探测名额"""
+        try:
+            return await refresh
+        finally:
+            self.breaker.release_probe()
+    
+    def _load_shared(self, key: str) -> Optional[ForecastRecord]:
+        """把共享缓存中更新的条目写入本进程缓存（含过期但可降级的），未过期时返回数据"""
+        entry = self.shared_cache.get(key)
+        if entry is None:
+            return None
+        current = self.forecast_cache.entry(key)
+        if current is None or entry[1] > current[1]:
+            self.forecast_cache.put(key, *entry)
+        return entry[3] if self.forecast_cache.clock() < entry[0] else None
+    
+    async def _fetch_leased(self, key: str, lease: str, fetch: Callable) -> ForecastRecord:
+        """持有租约时请求上游；其他 worker 正在拉取时等待其写入共享缓存，超时或对方失败后自行请求"""
+        shared = self.shared_cache
+        if shared is None:
+            return await fetch()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + FORECAST_SHARED_LEASE_SECONDS
+        while not shared.acquire(lease, FORECAST_SHARED_LEASE_SECONDS):
+            if loop.time() >= deadline:
+                return await fetch()
+            await asyncio.sleep(SHARED_CACHE_POLL_INTERVAL)
+            cached = self._load_shared(key)
+            if cached is not None:
+                return cached
+        try:
+            return await fetch()
+        finally:
+            shared.release(lease)
+    
+    async def wait_warmup(self):
+        """等待缓存快照载入完成（载入失败也继续）"""
+        if self.warmup is not None and not self.warmup.done():
+            await asyncio.wait({self.warmup})
+    
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ 后台刷新预报失败：{task.exception()}")
+    
+    def _as_stale(self, data: ForecastRecord, stored_at: float) -> ForecastRecord:
+        """将旧数据标记为过期数据；跨天时按当地日期前移，保证第 0 天仍是今天"""
+        now = self.forecast_cache.clock()
+        tzshift = data.tzshift
+        offset = int((now + tzshift) // 86400 - (stored_at + tzshift) // 86400)
         
+        if offset > 0 and isinstance(data, DailyForecast):
+            stale = data.shifted(offset)
+        else:
+            stale = data.copy()
+        stale.stale_seconds = int(now - stored_at)
+        return stale
+    
+    async def _request(self, url: str, params: Dict[str, Any]) -> httpx.Response:
+        """调用彩云天气API，经过限流、重试和熔断统计，并转换为用户可读的错误"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                return response.json()
+            client = self.http.get()
+            return await get_with_retry(
+                client, self.limiter, self.retry_policy, url, breaker=self.breaker, params=params,
+                timeout=httpx.Timeout(CAIYUN_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            )
         except httpx.HTTPError as e:
-            if e.response.status_code == 429:
+            # 超时、连接错误等没有 response，只有状态码错误才区分频率限制
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
                 raise Exception(f"API调用频率过高，请稍后再试。彩云天气API有频率限制。")
             else:
                 raise Exception(f"天气API请求失败: {e}")
         except Exception as e:
             raise Exception(f"天气API调用错误: {e}")
     
-    
-    def format_weather_data(self, data: Dict[str, Any], city: str, target_day: int = 0) -> str:
-        """格式化天气数据"""
+    @staticmethod
+    def _decode(response: httpx.Response) -> Dict[str, Any]:
+        """解析响应 JSON，非 ok 状态视为失败，不写入缓存"""
+        data = json_loads(response.content)
         if data.get("status") != "ok":
-            return f"❌ 获取{city}天气失败"
-        
-        daily = data["result"]["daily"]
+            raise Exception(f"天气API返回错误: {data.get('error') or data.get('status')}")
+        return data
+    
+    async def _fetch_daily(self, lat: float, lon: float, cache_key: str) -> DailyForecast:
+        """向彩云拉取完整的 15 天预报，解码为紧凑记录后写入缓存"""
+        url = f"{self.base_url}/{self.api_key}/{lon},{lat}/daily"
+        response = await self._request(url, {"dailysteps": CAIYUN_MAX_DAILY_STEPS})
+        record = DailyForecast(self._decode(response))
+        self._store(cache_key, record, tzshift=record.tzshift)
+        return record
+    
+    async def _fetch_bundle(self, lat: float, lon: float, cache_key: str) -> Dict[str, ForecastRecord]:
+        """通过 /weather 合并接口一次拉取实况、逐小时和逐天数据，解码后按各自的 TTL 写入缓存"""
+        url = f"{self.base_url}/{self.api_key}/{lon},{lat}/weather"
+        response = await self._request(url, {
+            "dailysteps": CAIYUN_MAX_DAILY_STEPS,
+            "hourlysteps": CAIYUN_HOURLY_STEPS
+        })
+        data = self._decode(response)
         
-        if target_day >= len(daily["temperature"]):
+        bundle = {}
+        for part in BUNDLE_PARTS:
+            record = bundle[part] = PART_RECORDS[part](data)
+            self._store(
+                self._part_key(cache_key, part), record,
+                tzshift=record.tzshift if part == "daily" else None,
+                ttl=BUNDLE_PART_TTLS[part]
+            )
+        return bundle
+    
+    def _store(self, key: str, record: ForecastRecord, tzshift: Optional[int] = None, ttl: Optional[float] = None):
+        """写入内存缓存，启用共享缓存时以相同的过期时间同步写入"""
+        self.forecast_cache.set(key, record, size=record.nbytes(), tzshift=tzshift, ttl=ttl)
+        entry = self.forecast_cache.entry(key)
+        if self.shared_cache is not None and entry is not None:
+            self.shared_cache.set(key, *entry)
+    
+    def stats(self) -> Dict[str, int]:
+        """预报缓存与请求合并统计"""
+        cache_stats = self.forecast_cache.stats()
+        return {
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "cached": cache_stats["entries"],
+            "cached_bytes": cache_stats["bytes"],
+            "snapped": self.quantizer.snapped,
+            **self.singleflight.stats(),
+            **(self.shared_cache.stats() if self.shared_cache is not None else {})
+        }
+    
+    def format_weather_data(self, data: DailyForecast, city: str, target_day: int = 0) -> str:
+        """格式化天气数据"""
+        if target_day >= len(data):
             return f"❌ 没有{city}第{target_day+1}天的天气数据"
         
         # 获取指定天的数据
-        date_info = daily["temperature"][target_day]
-        date = date_info["date"][:10]  # 取日期部分
+        date = data.date(target_day)
         
         # 温度信息
-        temp = daily["temperature"][target_day]
-        temp_max = int(temp["max"])
-        temp_min = int(temp["min"])
+        temp_max = int(data.temp_max[target_day])
+        temp_min = int(data.temp_min[target_day])
         
         # 天气现象
-        skycon = daily["skycon"][target_day]["value"]
+        skycon = data.skycon[target_day]
         weather_desc = SKYCON_MAP.get(skycon, skycon)
         
-        # 降水概率
-        precipitation = daily["precipitation"][target_day]
-        rain_prob = int(precipitation["probability"] * 100)
-        
-        # 湿度
-        humidity = daily["humidity"][target_day]
-        humidity_avg = int(humidity["avg"] * 100)
+        # 降水概率、湿度（解码时已转换为百分比）
+        rain_prob = data.rain_prob[target_day]
+        humidity_avg = data.humidity[target_day]
         
         # 风速
-        wind = daily["wind"][target_day]
-        wind_speed = wind["avg"]["speed"]
-        wind_level = self.wind_speed_to_level(wind_speed)
+        wind_level = self.wind_speed_to_level(data.wind_speed[target_day])
         
         # 生活建议
         tips = self._get_weather_tips(weather_desc, temp_max, temp_min, rain_prob)
@@ -252,77 +994,208 @@ class WeatherAPI:
 🌧️ 降水概率：{rain_prob}%
 💡 生活建议：{tips}"""
     
+    def stale_notice(self, data: ForecastRecord) -> str:
+        """旧数据提示，数据为最新时返回空字符串"""
+        seconds = data.stale_seconds
+        if seconds is None:
+            return ""
+        return f"\n⚠️ 天气服务暂时不可用，以上为{max(1, seconds // 60)}分钟前的缓存数据"
+    
+    def format_daily_lines(self, data: DailyForecast, start_day: int, days: int) -> List[str]:
+        """格式化从 start_day 开始的 days 天预报，每天一行"""
+        end = min(start_day + days, len(data))
+        # 按列切片后一次遍历所有天
+        columns = zip(
+            data.dates(start_day, end),
+            data.skycon[start_day:end],
+            data.temp_min[start_day:end],
+            data.temp_max[start_day:end]
+        )
+        return [
+            f"📅 {date}：{SKYCON_MAP.get(skycon, skycon)}，{int(temp_min)}°C ~ {int(temp_max)}°C"
+            for date, skycon, temp_min, temp_max in columns
+        ]
+    
+    def format_realtime(self, data: RealtimeWeather, city: str) -> str:
+        """格式化实况天气"""
+        skycon = data.skycon
+        lines = [f"📍 {city} 实况"]
+        if data.server_time:
+            updated = time.strftime("%H:%M", time.gmtime(data.server_time + data.tzshift))
+            lines[0] += f"（{updated}更新）"
+        
+        temperature = f"🌡️ 温度：{round(data.temperature)}°C"
+        if data.apparent_temperature is not None:
+            temperature += f"（体感{round(data.apparent_temperature)}°C）"
+        lines.extend([
+            f"🌤️ 天气：{SKYCON_MAP.get(skycon, skycon)}",
+            temperature,
+            f"💧 湿度：{int(data.humidity * 100)}%",
+            f"💨 风力：{self.wind_speed_to_level(data.wind_speed)}级",
+        ])
+        
+        if data.precipitation_intensity:
+            lines.append(f"🌧️ 降水强度：{data.precipitation_intensity:.1f}mm/h")
+        if data.aqi is not None:
+            lines.append(f"🌫️ 空气质量：{data.aqi_description}（AQI {data.aqi}）")
+        return "\n".join(lines)
+    
+    def _upcoming_hours(self, data: HourlyForecast, hours: int) -> range:
+        """从当前小时开始的 hours 个下标；旧数据中已过去的小时会被跳过"""
+        current_hour = self.forecast_cache.clock() - 3600
+        start = bisect.bisect_right(data.times, current_hour)
+        return range(start, min(start + hours, len(data)))
+    
+    @staticmethod
+    def _local_hour(data: HourlyForecast, i: int) -> str:
+        return time.strftime("%m-%d %H:%M", time.gmtime(data.times[i] + data.tzshift))
+    
+    def format_hourly_lines(self, data: HourlyForecast, hours: int) -> List[str]:
+        """格式化从当前小时开始的 hours 小时预报，每小时一行；旧数据中已过去的小时会被跳过"""
+        lines = [f"💬 {data.keypoint}"] if data.keypoint else []
+        
+        for i in self._upcoming_hours(data, hours):
+            skycon = data.skycon[i]
+            lines.append(
+                f"🕐 {self._local_hour(data, i)}：{SKYCON_MAP.get(skycon, skycon)}，"
+                f"{round(data.temperature[i])}°C，降水概率{data.rain_prob[i]}%"
+            )
+        
+        return lines
+    
+    # ---- 紧凑结构化输出（字段含义见 compact_output）----
+    
+    def compact_header(self, data: ForecastRecord, label: str) -> Dict[str, Any]:
+        """地点与旧数据标记"""
+        header: Dict[str, Any] = {"c": label}
+        if data.stale_seconds is not None:
+            header["stale"] = max(1, data.stale_seconds // 60)
+        return header
+    
+    def compact_daily(self, data: DailyForecast, start_day: int, days: int) -> List[Dict[str, Any]]:
+        """从 start_day 开始的 days 天预报，按列一次生成
+        
+        与文本输出的信息量一致：单天包含降水概率、湿度和风力，多天只有天气和气温
+        """
+        end = min(start_day + days, len(data))
+        rows = [
+            {"d": date[5:], "w": SKYCON_MAP.get(skycon, skycon), "lo": int(temp_min), "hi": int(temp_max)}
+            for date, skycon, temp_min, temp_max in zip(
+                data.dates(start_day, end),
+                data.skycon[start_day:end],
+                data.temp_min[start_day:end],
+                data.temp_max[start_day:end]
+            )
+        ]
+        if days == 1:
+            for row, i in zip(rows, range(start_day, end)):
+                row.update(p=data.rain_prob[i], h=data.humidity[i], wl=self.wind_speed_to_level(data.wind_speed[i]))
+        return rows
+    
+    def compact_realtime(self, data: RealtimeWeather) -> Dict[str, Any]:
+        """实况天气"""
+        return {
+            "w": SKYCON_MAP.get(data.skycon, data.skycon),
+            "t": round(data.temperature),
+            "at": round(data.apparent_temperature) if data.apparent_temperature is not None else None,
+            "h": int(data.humidity * 100),
+            "wl": self.wind_speed_to_level(data.wind_speed),
+            "pi": round(data.precipitation_intensity, 1) or None,
+            "aqi": data.aqi,
+        }
+    
+    def compact_hourly(self, data: HourlyForecast, hours: int) -> Dict[str, Any]:
+        """逐小时预报及降水提示"""
+        return {
+            "kp": data.keypoint or None,
+            "hours": [
+                {"tm": self._local_hour(data, i), "w": SKYCON_MAP.get(data.skycon[i], data.skycon[i]),
+                 "t": round(data.temperature[i]), "p": data.rain_prob[i]}
+                for i in self._upcoming_hours(data, hours)
+            ],
+        }
+    
     def wind_speed_to_level(self, speed_ms: float) -> int:
         """风速转风力等级"""
-        speed_kmh = speed_ms * 3.6
-        if speed_kmh < 1:
-            return 0
-        elif speed_kmh < 6:
-            return 1
-        elif speed_kmh < 12:
-            return 2
-        elif speed_kmh < 20:
-            return 3
-        elif speed_kmh < 29:
-            return 4
-        elif speed_kmh < 39:
-            return 5
-        elif speed_kmh < 50:
-            return 6
-        elif speed_kmh < 62:
-            return 7
-        elif speed_kmh < 75:
-            return 8
-        elif speed_kmh < 89:
-            return 9
-        elif speed_kmh < 103:
-            return 10
-        elif speed_kmh < 118:
-            return 11
-        else:
-            return 12
+        return bisect.bisect_right(BEAUFORT_THRESHOLDS_KMH, speed_ms * 3.6)
     
     def _get_weather_tips(self, weather: str, temp_max: int, temp_min: int, rain_prob: int) -> str:
         """根据天气生成生活建议"""
-        tips = []
-        
         # 温度建议
         if temp_max >= 30:
-            tips.append("天气炎热，注意防暑降温")
+            temp = 1
         elif temp_min <= 5:
-            tips.append("天气寒冷，注意保暖添衣")
+            temp = 2
         elif temp_max - temp_min > 15:
-            tips.append("昼夜温差大，适时增减衣物")
+            temp = 3
+        else:
+            temp = 0
         
         # 降水建议
-        if rain_prob > 70:
-            tips.append("降雨概率高，建议携带雨具")
-        elif rain_prob > 30:
-            tips.append("可能有降雨，备好雨伞")
+        rain = 1 if rain_prob > 70 else 2 if rain_prob > 30 else 0
         
         # 天气现象建议
-        if "雾" in weather or "霾" in weather:
-            tips.append("能见度较低，出行注意安全")
-        elif "晴" in weather:
-            tips.append("天气晴朗，适合户外活动")
-        elif "雪" in weather:
-            tips.append("有降雪，注意路面湿滑")
+        sky = SKY_TIP_CATEGORIES.get(weather)
+        if sky is None:
+            sky = sky_tip_category(weather)
         
-        return "，".join(tips) if tips else "天气适宜，祝您生活愉快"
+        return WEATHER_TIPS[temp][rain][sky]
+
+# 预报归并的锚点：只包含预定义城市，各 worker 和每次重启都相同，缓存键不依赖进程的查询历史
+location_index = NearestPointIndex(FORECAST_SNAP_RADIUS_KM)
+for _coordinates in CITY_COORDINATES.values():
+    location_index.add(*_coordinates)
 
-# 全局API实例
-amap_geocoder = AmapGeocoder()
-weather_api = WeatherAPI()
+gazetteer = Gazetteer(GAZETTEER_PATH) if GAZETTEER_PATH else None
+
+# 全局API实例（共享同一个连接池）
+amap_geocoder = AmapGeocoder(
+    shared_http,
+    create_geocode_backend(GEOCODE_CACHE_BACKEND, GEOCODE_STORE_PATH, GEOCODE_CACHE_MAX_ENTRIES, GEOCODE_STORE_TTL),
+    gazetteer,
+    CityNameResolver(CITY_COORDINATES, {**CITY_ALIASES, **CITY_LATIN_NAMES}, gazetteer)
+)
+weather_api = WeatherAPI(
+    shared_http,
+    quantizer=LocationQuantizer(
+        FORECAST_GRID_MODE, FORECAST_GRID_STEP, FORECAST_GEOHASH_PRECISION, location_index
+    )
+)
+cache_snapshot = CacheSnapshot(
+    CACHE_SNAPSHOT_PATH, weather_api.forecast_cache, amap_geocoder, geocode_ttl=GEOCODE_STORE_TTL
+) if CACHE_SNAPSHOT_PATH else None
+prefetcher = ForecastPrefetcher(
+    weather_api,
+    CITY_COORDINATES.values(),
+    top_n=PREFETCH_TOP_N,
+    lead_time=PREFETCH_LEAD_TIME,
+    interval=PREFETCH_INTERVAL,
+    rate=CAIYUN_QPS * PREFETCH_BUDGET_SHARE,
+    jitter=PREFETCH_JITTER,
+    bundle_parts=BUNDLE_PARTS
+)
 
 # ============= 工具处理函数 =============
 
+def output_format(arguments: dict) -> str:
+    """本次调用的输出格式（参数 format，未提供时使用 TOOL_OUTPUT_FORMAT）"""
+    return resolve_format(arguments.get("format"), TOOL_OUTPUT_FORMAT)
+
+def compact_days(data: DailyForecast, label: str, start_day: int, days: int, fmt: str) -> List[TextContent]:
+    """逐天预报的紧凑输出"""
+    payload = {**weather_api.compact_header(data, label), "days": weather_api.compact_daily(data, start_day, days)}
+    return [TextContent(type="text", text=render(payload, fmt))]
+
 async def handle_query_weather_today(arguments: dict) -> List[TextContent]:
     """查询今天的天气"""
     city = arguments.get("city", "北京")
+    fmt = output_format(arguments)
     try:
         data = await weather_api.get_daily_weather(city, days=1)
+        if fmt != "text":
+            return compact_days(data, city, 0, 1, fmt)
         result = weather_api.format_weather_data(data, city, target_day=0)
-        return [TextContent(type="text", text=result)]
+        return [TextContent(type="text", text=result + weather_api.stale_notice(data))]
     except Exception as e:
         logger.error(f"查询今天天气失败: {e}")
         return [TextContent(type="text", text=f"❌ 查询{city}今天天气失败: {str(e)}")]
@@ -330,11 +1203,14 @@ async def handle_query_weather_today(arguments: dict) -> List[TextContent]:
 async def handle_query_weather_tomorrow(arguments: dict) -> List[TextContent]:
     """查询明天的天气"""
     city = arguments.get("city", "北京")
+    fmt = output_format(arguments)
     try:
         data = await weather_api.get_daily_weather(city, days=2)
-        if len(data["result"]["daily"]["temperature"]) > 1:
+        if len(data) > 1:
+            if fmt != "text":
+                return compact_days(data, city, 1, 1, fmt)
             result = weather_api.format_weather_data(data, city, target_day=1)
-            return [TextContent(type="text", text=result)]
+            return [TextContent(type="text", text=result + weather_api.stale_notice(data))]
         else:
             return [TextContent(type="text", text=f"❌ 获取{city}明天天气数据不足")]
     except Exception as e:
@@ -345,33 +1221,198 @@ async def handle_query_weather_future_days(arguments: dict) -> List[TextContent]
     """查询未来几天的天气预报"""
     city = arguments.get("city", "北京")
     days = arguments.get("days", 3)
+    fmt = output_format(arguments)
     try:
         data = await weather_api.get_daily_weather(city, days=days)
+        if fmt != "text":
+            return compact_days(data, city, 0, days, fmt)
         
-        if data.get("status") != "ok":
-            return [TextContent(type="text", text=f"❌ 获取{city}天气失败")]
-        
-        daily = data["result"]["daily"]
         results = [f"📍 {city} 未来{days}天天气预报："]
+        results.extend(weather_api.format_daily_lines(data, 0, days))
         
-        for i in range(min(days, len(daily["temperature"]))):
-            date_info = daily["temperature"][i]
-            date = date_info["date"][:10]
-            
-            temp_max = int(date_info["max"])
-            temp_min = int(date_info["min"])
-            
-            skycon = daily["skycon"][i]["value"]
-            weather_desc = SKYCON_MAP.get(skycon, skycon)
-            
-            results.append(f"📅 {date}：{weather_desc}，{temp_min}°C ~ {temp_max}°C")
-        
-        return [TextContent(type="text", text="\n".join(results))]
+        return [TextContent(type="text", text="\n".join(results) + weather_api.stale_notice(data))]
         
     except Exception as e:
         logger.error(f"查询未来天气失败: {e}")
         return [TextContent(type="text", text=f"❌ 查询{city}未来{days}天天气失败: {str(e)}")]
 
+async def handle_query_weather_now(arguments: dict) -> List[TextContent]:
+    """查询实况天气"""
+    city = arguments.get("city", "北京")
+    fmt = output_format(arguments)
+    try:
+        data = await weather_api.get_realtime_weather(city)
+        if fmt != "text":
+            payload = {**weather_api.compact_header(data, city), **weather_api.compact_realtime(data)}
+            return [TextContent(type="text", text=render(payload, fmt))]
+        return [TextContent(type="text", text=weather_api.format_realtime(data, city) + weather_api.stale_notice(data))]
+    except Exception as e:
+        logger.error(f"查询实况天气失败: {e}")
+        return [TextContent(type="text", text=f"❌ 查询{city}实况天气失败: {str(e)}")]
+
+async def handle_query_weather_hourly(arguments: dict) -> List[TextContent]:
+    """查询逐小时天气预报"""
+    city = arguments.get("city", "北京")
+    fmt = output_format(arguments)
+    try:
+        hours = parse_int_argument(arguments, "hours", 12, 1, CAIYUN_HOURLY_STEPS)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"❌ {e}")]
+    try:
+        data = await weather_api.get_hourly_weather(city)
+        if fmt != "text":
+            payload = {**weather_api.compact_header(data, city), **weather_api.compact_hourly(data, hours)}
+            return [TextContent(type="text", text=render(payload, fmt))]
+        results = [f"📍 {city} 未来{hours}小时天气预报："]
+        results.extend(weather_api.format_hourly_lines(data, hours))
+        return [TextContent(type="text", text="\n".join(results) + weather_api.stale_notice(data))]
+    except Exception as e:
+        logger.error(f"查询逐小时天气失败: {e}")
+        return [TextContent(type="text", text=f"❌ 查询{city}逐小时天气失败: {str(e)}")]
+
+def parse_coordinates(arguments: dict) -> tuple[float, float]:
+    """解析并校验工具参数中的经纬度"""
+    try:
+        lat, lon = float(arguments["lat"]), float(arguments["lon"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("请提供有效的经纬度：lat（纬度）、lon（经度）")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"经纬度超出范围：{lat},{lon}")
+    return lat, lon
+
+def parse_int_argument(arguments: dict, name: str, default: int, minimum: int, maximum: int) -> int:
+    """解析并校验工具参数中的整数，超出 minimum~maximum 时报错"""
+    value = arguments.get(name, default)
+    try:
+        number = int(value)
+        if number != float(value):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"参数 {name} 必须是整数：{value!r}")
+    if not minimum <= number <= maximum:
+        raise ValueError(f"参数 {name} 超出范围{minimum}-{maximum}：{number}")
+    return number
+
+async def wait_place_name(task: asyncio.Task) -> Optional[str]:
+    """等待逆地理编码结果，超过 REVERSE_GEOCODE_WAIT 秒则放弃（任务继续执行并写入缓存）"""
+    try:
+        place = await asyncio.wait_for(asyncio.shield(task), REVERSE_GEOCODE_WAIT)
+    except asyncio.TimeoutError:
+        return None
+    return place["name"] if place else None
+
+async def handle_query_weather_by_location(arguments: dict) -> List[TextContent]:
+    """按经纬度查询天气，不经过地理编码"""
+    try:
+        lat, lon = parse_coordinates(arguments)
+        days = parse_int_argument(arguments, "days", 1, 1, CAIYUN_MAX_DAILY_STEPS)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"❌ {e}")]
+    
+    # 地名只用于展示，与预报并行查询
+    place_task = asyncio.create_task(amap_geocoder.reverse_geocode(lat, lon))
+    try:
+        data = await weather_api.get_daily_weather_at(lat, lon)
+    except Exception as e:
+        logger.error(f"按坐标查询天气失败: {e}")
+        return [TextContent(type="text", text=f"❌ 查询坐标{lat},{lon}天气失败: {str(e)}")]
+    
+    place = await wait_place_name(place_task)
+    fmt = output_format(arguments)
+    if fmt != "text":
+        return compact_days(data, place or f"{lat},{lon}", 0, days, fmt)
+    label = f"{place}（{lat},{lon}）" if place else f"{lat},{lon}"
+    if days == 1:
+        result = weather_api.format_weather_data(data, label, target_day=0)
+    else:
+        lines = [f"📍 {label} 未来{days}天天气预报："]
+        lines.extend(weather_api.format_daily_lines(data, 0, days))
+        result = "\n".join(lines)
+    return [TextContent(type="text", text=result + weather_api.stale_notice(data))]
+
+async def handle_reverse_geocode(arguments: dict) -> List[TextContent]:
+    """逆地理编码：经纬度转地名"""
+    try:
+        lat, lon = parse_coordinates(arguments)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"❌ {e}")]
+    
+    place = await amap_geocoder.reverse_geocode(lat, lon)
+    if not place:
+        return [TextContent(type="text", text=f"❌ 未找到坐标{lat},{lon}对应的地名")]
+    result = f"📍 坐标 {lat},{lon} 位于：{place['name']}"
+    if place["adcode"]:
+        result += f"\n行政区划代码：{place['adcode']}"
+    return [TextContent(type="text", text=result)]
+
+async def report_progress(progress: float, total: float, message: str):
+    """发送 MCP 进度通知，客户端未提供 progressToken 时忽略"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return
+    token = ctx.meta.progressToken if ctx.meta else None
+    if token is None:
+        return
+    await ctx.session.send_progress_notification(token, progress, total, message=message)
+
+async def handle_query_weather_multi_city(arguments: dict) -> List[TextContent]:
+    """并发查询多个城市的天气，每完成一个城市发送一次进度通知"""
+    cities = list(dict.fromkeys(c.strip() for c in arguments.get("cities", []) if isinstance(c, str) and c.strip()))
+    if not cities:
+        return [TextContent(type="text", text="❌ 请提供至少一个城市名称")]
+    
+    try:
+        start_day = parse_int_argument(arguments, "start_day", 0, 0, CAIYUN_MAX_DAILY_STEPS - 1)
+        # 起始天之后最多还有 CAIYUN_MAX_DAILY_STEPS - start_day 天的预报
+        days = parse_int_argument(arguments, "days", 1, 1, CAIYUN_MAX_DAILY_STEPS - start_day)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"❌ {e}")]
+    
+    semaphore = asyncio.Semaphore(MULTI_CITY_CONCURRENCY)
+    fmt = output_format(arguments)
+    compact: Dict[str, Dict[str, Any]] = {}
+    
+    async def query_city(city: str) -> tuple[str, str]:
+        async with semaphore:
+            try:
+                data = await weather_api.get_daily_weather(city, days=start_day + days)
+                if fmt != "text":
+                    compact[city] = {
+                        **weather_api.compact_header(data, city),
+                        "days": weather_api.compact_daily(data, start_day, days)
+                    }
+                    return city, render(compact[city], fmt)
+                if days == 1:
+                    text = weather_api.format_weather_data(data, city, target_day=start_day)
+                else:
+                    lines = [f"📍 {city} 第{start_day + 1}~{start_day + days}天天气预报："]
+                    lines.extend(weather_api.format_daily_lines(data, start_day, days))
+                    text = "\n".join(lines)
+                return city, text + weather_api.stale_notice(data)
+            except Exception as e:
+                logger.error(f"查询{city}天气失败: {e}")
+                if fmt != "text":
+                    compact[city] = {"c": city, "err": str(e)}
+                    return city, render(compact[city], fmt)
+                return city, f"❌ 查询{city}天气失败: {str(e)}"
+    
+    results: Dict[str, str] = {}
+    # 批量查询以 batch 优先级请求上游，不挤占单次查询的配额；子任务继承该优先级
+    with upstream_priority(BATCH):
+        # 先批量解析坐标，后续单城市查询直接命中缓存
+        await amap_geocoder.get_coordinates_many(cities)
+        tasks = [asyncio.create_task(query_city(city)) for city in cities]
+    for completed, next_done in enumerate(asyncio.as_completed(tasks), 1):
+        city, text = await next_done
+        results[city] = text
+        await report_progress(completed, len(cities), text)
+    
+    # 合并结果保持请求中的城市顺序
+    if fmt != "text":
+        return [TextContent(type="text", text=render({"cities": [compact[city] for city in cities]}, fmt))]
+    return [TextContent(type="text", text="\n\n".join(results[city] for city in cities))]
+
 async def handle_get_supported_cities(arguments: dict) -> List[TextContent]:
     """获取支持的城市列表"""
     cities = list(CITY_COORDINATES.keys())
@@ -393,14 +1434,58 @@ async def handle_get_city_coordinates(arguments: dict) -> List[TextContent]:
         logger.error(f"获取城市坐标失败: {e}")
         return [TextContent(type="text", text=f"❌ 获取{city}坐标失败: {str(e)}")]
 
+async def handle_get_cities_coordinates(arguments: dict) -> List[TextContent]:
+    """批量获取城市坐标"""
+    cities = [c for c in arguments.get("cities", []) if isinstance(c, str) and c.strip()]
+    if not cities:
+        return [TextContent(type="text", text="❌ 请提供至少一个城市名称")]
+    try:
+        coordinates = await amap_geocoder.get_coordinates_many(cities)
+        lines = [f"📍 共查询{len(coordinates)}个城市坐标："]
+        for city, coords in coordinates.items():
+            if coords:
+                lat, lon = coords
+                lines.append(f"{city}：{lat},{lon}")
+            else:
+                lines.append(f"{city}：❌ 未找到")
+        return [TextContent(type="text", text="\n".join(lines))]
+    except Exception as e:
+        logger.error(f"批量获取城市坐标失败: {e}")
+        return [TextContent(type="text", text=f"❌ 批量获取城市坐标失败: {str(e)}")]
+
+async def handle_get_server_stats(arguments: dict) -> List[TextContent]:
+    """获取服务器缓存、请求合并与限流统计"""
+    sections = {
+        "预报": weather_api.stats(),
+        "地理编码": amap_geocoder.stats(),
+        "彩云限流": {**weather_api.limiter.stats(), **weather_api.retry_policy.stats()},
+        "高德限流": {**amap_geocoder.limiter.stats(), **amap_geocoder.retry_policy.stats()},
+        "彩云熔断": weather_api.breaker.stats(),
+        "高德熔断": amap_geocoder.breaker.stats(),
+        "预取": prefetcher.stats(),
+    }
+    if cache_snapshot is not None:
+        sections["快照"] = cache_snapshot.stats()
+    lines = ["📊 服务器统计："]
+    for name, stats in sections.items():
+        lines.append(f"{name}：" + "，".join(f"{k}={v}" for k, v in stats.items()))
+    return [TextContent(type="text", text="\n".join(lines))]
+
 # ============= 工具映射表 =============
 
 TOOL_HANDLERS: Dict[str, Callable] = {
     "query_weather_today": handle_query_weather_today,
     "query_weather_tomorrow": handle_query_weather_tomorrow,
     "query_weather_future_days": handle_query_weather_future_days,
+    "query_weather_multi_city": handle_query_weather_multi_city,
+    "query_weather_now": handle_query_weather_now,
+    "query_weather_hourly": handle_query_weather_hourly,
+    "query_weather_by_location": handle_query_weather_by_location,
+    "reverse_geocode": handle_reverse_geocode,
     "get_supported_cities": handle_get_supported_cities,
     "get_city_coordinates": handle_get_city_coordinates,
+    "get_cities_coordinates": handle_get_cities_coordinates,
+    "get_server_stats": handle_get_server_stats,
 }
 
 @server.list_tools()
@@ -417,7 +1502,8 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "城市名称，如：北京、上海、广州等",
                         "default": "北京"
-                    }
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
                 },
                 "required": []
             }
@@ -432,7 +1518,8 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "城市名称，如：北京、上海、广州等",
                         "default": "北京"
-                    }
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
                 },
                 "required": []
             }
@@ -454,11 +1541,133 @@ async def list_tools() -> list[Tool]:
                         "minimum": 1,
                         "maximum": 15,
                         "default": 3
-                    }
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
+                },
+                "required": []
+            }
+        ),
+        Tool(
+            name="query_weather_multi_city",
+            description="同时查询多个城市的天气（一次调用返回所有城市结果）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cities": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "城市名称列表，如：[\"北京\", \"上海\", \"广州\"]"
+                    },
+                    "start_day": {
+                        "type": "integer",
+                        "description": "起始天，0表示今天，1表示明天",
+                        "minimum": 0,
+                        "maximum": 14,
+                        "default": 0
+                    },
+                    "days": {
+                        "type": "integer",
+                        "description": "查询天数，范围1-15天",
+                        "minimum": 1,
+                        "maximum": 15,
+                        "default": 1
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
+                },
+                "required": ["cities"]
+            }
+        ),
+        Tool(
+            name="query_weather_now",
+            description="查询当前实况天气（温度、体感、湿度、风力、空气质量）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "city": {
+                        "type": "string",
+                        "description": "城市名称，如：北京、上海、广州等",
+                        "default": "北京"
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
+                },
+                "required": []
+            }
+        ),
+        Tool(
+            name="query_weather_hourly",
+            description="查询未来几小时的逐小时天气预报",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "city": {
+                        "type": "string",
+                        "description": "城市名称，如：北京、上海、广州等",
+                        "default": "北京"
+                    },
+                    "hours": {
+                        "type": "integer",
+                        "description": "查询小时数，范围1-48小时",
+                        "minimum": 1,
+                        "maximum": 48,
+                        "default": 12
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
                 },
                 "required": []
             }
         ),
+        Tool(
+            name="query_weather_by_location",
+            description="按经纬度查询天气（适用于已知GPS坐标，无需城市名称）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "lat": {
+                        "type": "number",
+                        "description": "纬度，如：39.9042",
+                        "minimum": -90,
+                        "maximum": 90
+                    },
+                    "lon": {
+                        "type": "number",
+                        "description": "经度，如：116.4074",
+                        "minimum": -180,
+                        "maximum": 180
+                    },
+                    "days": {
+                        "type": "integer",
+                        "description": "查询天数，范围1-15天",
+                        "minimum": 1,
+                        "maximum": 15,
+                        "default": 1
+                    },
+                    "format": OUTPUT_FORMAT_SCHEMA
+                },
+                "required": ["lat", "lon"]
+            }
+        ),
+        Tool(
+            name="reverse_geocode",
+            description="逆地理编码：根据经纬度获取所在地名",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "lat": {
+                        "type": "number",
+                        "description": "纬度，如：39.9042",
+                        "minimum": -90,
+                        "maximum": 90
+                    },
+                    "lon": {
+                        "type": "number",
+                        "description": "经度，如：116.4074",
+                        "minimum": -180,
+                        "maximum": 180
+                    }
+                },
+                "required": ["lat", "lon"]
+            }
+        ),
         Tool(
             name="get_supported_cities",
             description="获取支持的城市列表",
@@ -482,6 +1691,30 @@ async def list_tools() -> list[Tool]:
                 },
                 "required": []
             }
+        ),
+        Tool(
+            name="get_cities_coordinates",
+            description="批量获取多个城市坐标（支持全国所有城市）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cities": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "城市名称列表，如：[\"北京\", \"三亚\", \"桂林\"]"
+                    }
+                },
+                "required": ["cities"]
+            }
+        ),
+        Tool(
+            name="get_server_stats",
+            description="获取服务器缓存命中、请求合并及上游限流统计",
+            inputSchema={
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
         )
     ]
 
@@ -501,18 +1734,89 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         logger.error(f"工具调用失败: {name}, 错误: {str(e)}")
         return [TextContent(type="text", text=f"工具执行失败: {str(e)}")]
 
-async def main():
-    """主函数"""
-    logger.info("启动彩云天气 MCP 服务器...")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数，默认值取自环境变量"""
+    parser = argparse.ArgumentParser(description="彩云天气 MCP 服务器")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=MCP_TRANSPORT,
+                        help="传输方式：stdio 或 http（Streamable HTTP，多个代理进程共享一个服务器）")
+    parser.add_argument("--host", default=MCP_HTTP_HOST, help="HTTP 监听地址")
+    parser.add_argument("--port", type=int, default=MCP_HTTP_PORT, help="HTTP 监听端口")
+    parser.add_argument("--workers", type=int, default=MCP_HTTP_WORKERS,
+                        help="HTTP worker 进程数（pre-fork，共享预报缓存）")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers 至少为 1")
+    if args.workers > 1 and args.transport != "http":
+        parser.error("多 worker 模式需要 --transport http")
+    return args
+
+async def main(transport: str = "stdio", host: str = MCP_HTTP_HOST, port: int = MCP_HTTP_PORT,
+               workers: int = 1, worker: int = 0, sock=None):
+    """主函数
+    
+    多 worker 模式下每个 worker 进程各自调用一次：所有 worker 共享监听套接字 sock 和跨进程预报缓存，
+    热门位置预取和定期写入快照只在 0 号 worker 中运行，避免重复请求上游。
+    """
+    primary = worker == 0
+    logger.info(f"启动彩云天气 MCP 服务器（{transport}）..." if workers == 1 else
+                f"启动彩云天气 MCP 服务器 worker {worker}/{workers}（进程 {os.getpid()}）...")
+    logger.info(f"🧩 JSON 解码器：{JSON_DECODER_NAME}")
+    # 启动时即创建共享连接池
+    shared_http.get()
+    forecast_backend = create_backend(
+        FORECAST_CACHE_BACKEND or ("sqlite" if workers > 1 or FORECAST_SHARED_CACHE_PATH else "none"),
+        FORECAST_SHARED_CACHE_PATH or DEFAULT_SHARED_CACHE_PATH, "forecast_cache", FORECAST_CACHE_MAX_ENTRIES * 10
+    )
+    if forecast_backend is not None:
+        if workers > 1 and isinstance(forecast_backend, MemoryBackend):
+            logger.warning("⚠️ memory 预报缓存后端不在 worker 之间共享")
+        weather_api.shared_cache = SharedForecastStore(forecast_backend, stale_ttl=FORECAST_STALE_TTL)
+    if cache_snapshot is not None:
+        if primary:
+            weather_api.warmup = cache_snapshot.start(CACHE_SNAPSHOT_INTERVAL)
+        else:
+            weather_api.warmup = asyncio.create_task(cache_snapshot.load())
+    if PREFETCH_ENABLED and primary:
+        logger.info(f"🔥 启动热门位置预取：内置城市 {len(prefetcher.pinned)} 个，热门位置前 {PREFETCH_TOP_N} 个")
+        prefetcher.start()
     try:
-        async with stdio_server() as streams:
-            await server.run(
-                streams[0], streams[1],
-                server.create_initialization_options()
+        if transport == "http":
+            # HTTP 传输模块只在使用时导入，stdio 模式不加载 uvicorn 服务器配置和 worker 管理代码
+            from mcp_server.http_transport import serve_http
+            await serve_http(
+                server, host, port, sock,
+                path=MCP_HTTP_PATH,
+                max_sessions=MCP_HTTP_MAX_SESSIONS or None,
+                session_idle_timeout=MCP_HTTP_SESSION_IDLE_TIMEOUT,
+                # 同一会话的请求可能落到不同 worker，多 worker 时不保存会话
+                stateless=MCP_HTTP_STATELESS or workers > 1,
             )
+        else:
+            async with stdio_server() as streams:
+                await server.run(
+                    streams[0], streams[1],
+                    server.create_initialization_options()
+                )
     finally:
+        await prefetcher.stop()
+        if cache_snapshot is not None:
+            if primary:
+                await cache_snapshot.stop()
+            elif weather_api.warmup is not None:
+                await asyncio.gather(weather_api.warmup, return_exceptions=True)
         await weather_api.close()
         await amap_geocoder.close()
 
+def run_workers(host: str, port: int, workers: int):
+    """pre-fork 多 worker 模式：父进程绑定端口后 fork 出 worker，各自运行一个事件循环"""
+    from mcp_server.http_transport import bind_socket, serve_workers
+    sock = bind_socket(host, port)
+    logger.info(f"👷 多 worker 模式：{workers} 个进程共享 http://{host}:{port}{MCP_HTTP_PATH}")
+    serve_workers(workers, lambda worker: asyncio.run(main("http", host, port, workers, worker, sock)))
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parse_args()
+    if args.workers > 1:
+        run_workers(args.host, args.port, args.workers)
+    else:
+        asyncio.run(main(args.transport, args.host, args.port))
@@ -0,0 +1,273 @@
+"""
+MCP 长连接会话池
+代理的工具调用复用常驻的 MCP 会话（stdio 时即常驻的服务器子进程，HTTP 时即到共享服务器的会话），
+不再每次调用都启动新进程；会话断开时自动重连，关闭时终止所有会话
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import anyio
+import httpx
+from autogen_core import CancellationToken
+from autogen_core.tools import BaseTool
+from autogen_ext.tools.mcp import (
+    McpServerParams, StdioMcpToolAdapter, StreamableHttpMcpToolAdapter, StreamableHttpServerParams,
+    create_mcp_server_session
+)
+from mcp import ClientSession
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED, Tool
+from pydantic import BaseModel
+
+try:
+    from builtins import BaseExceptionGroup
+except ImportError:  # Python 3.10，anyio 依赖的 exceptiongroup 提供向后兼容实现
+    from exceptiongroup import BaseExceptionGroup
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 会话已断开（服务器进程退出、管道关闭、HTTP 连接失败）时抛出的异常
+_DISCONNECT_ERRORS = (
+    anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError, EOFError,
+    httpx.TransportError,
+)
+
+# Streamable HTTP 客户端在服务器不认识会话（如服务器重启、会话空闲被回收）时返回的错误码
+SESSION_TERMINATED = 32600
+
+
+def is_disconnect(error: BaseException) -> bool:
+    """异常是否表示会话已断开（而不是工具本身出错）"""
+    if isinstance(error, McpError):
+        return error.error.code in (CONNECTION_CLOSED, SESSION_TERMINATED)
+    if isinstance(error, BaseExceptionGroup):
+        return any(is_disconnect(e) for e in error.exceptions)
+    return isinstance(error, _DISCONNECT_ERRORS)
+
+
+class _PooledSession:
+    """单个常驻会话
+
+    MCP 客户端的连接上下文必须在同一个任务中进入和退出，因此每个会话由一个专属任务持有，
+    直到 close() 或连接断开
+    """
+
+    def __init__(self, server_params: McpServerParams):
+        self.server_params = server_params
+        self.session: Optional[ClientSession] = None
+        self.active = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def open(self):
+        """启动会话并等待初始化完成"""
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._hold(ready))
+        # 连接失败时专属任务先结束，异常通过 ready 传出
+        self.session = await ready
+
+    async def _hold(self, ready: asyncio.Future):
+        try:
+            async with create_mcp_server_session(self.server_params) as session:
+                await session.initialize()
+                ready.set_result(session)
+                await self._closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                logger.warning(f"⚠️ MCP 会话异常结束：{e}")
+        finally:
+            self.session = None
+
+    def abandon(self):
+        """丢弃属于已结束事件循环的会话，不等待其任务"""
+        self._task = None
+        self.session = None
+
+    async def close(self):
+        """关闭会话（stdio 时终止服务器子进程），可重复调用"""
+        task, self._task = self._task, None
+        self.session = None
+        if task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+class McpSessionPool:
+    """MCP 会话池
+
+    - size 个常驻会话，首次使用时建立；每次调用选当前在途请求最少的会话
+    - 会话断开（服务器进程退出等）时关闭并重建，断开导致失败的调用在新会话上重试一次
+    - 工具本身返回的错误和超时不重试
+    """
+
+    def __init__(self, server_params: McpServerParams, size: int = 1):
+        self.server_params = server_params
+        self._slots = [_PooledSession(server_params) for _ in range(max(1, size))]
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tools: Optional[List[Tool]] = None
+        self.calls = 0
+        self.reconnects = 0
+
+    def _abandon(self):
+        """丢弃原事件循环中的会话，之后按需在当前循环中重建
+
+        会话的连接上下文由原循环中的专属任务持有，无法在其他循环中等待或关闭；原循环结束时
+        （asyncio.run 退出前会取消所有剩余任务）这些任务已退出连接上下文、终止了 stdio 子进程，
+        因此只需丢弃引用
+        """
+        for slot in self._slots:
+            slot.abandon()
+        self._slots = [_PooledSession(self.server_params) for _ in self._slots]
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 原事件循环已结束（如多次 asyncio.run），其中的会话随之失效，在当前循环中重建
+            if self._loop is not None:
+                self._abandon()
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _ensure(self, slot: _PooledSession) -> ClientSession:
+        """返回可用的会话，断开的会话先重建"""
+        if slot.alive:
+            return slot.session
+        async with self._get_lock():
+            if not slot.alive:
+                if slot._task is not None:
+                    # 会话在两次调用之间断开（如服务器进程退出）
+                    self.reconnects += 1
+                    logger.info("🔌 MCP 会话已断开，正在重连...")
+                await slot.close()
+                await slot.open()
+        return slot.session
+
+    async def start(self):
+        """建立所有会话"""
+        self._get_lock()
+        for slot in self._slots:
+            await self._ensure(slot)
+
+    async def run(self, fn: Callable[[ClientSession], Awaitable[T]]) -> T:
+        """在一个会话上执行 fn，会话断开时重连后重试一次"""
+        self._get_lock()
+        slot = min(self._slots, key=lambda s: (not s.alive, s.active))
+        self.calls += 1
+        for attempt in range(2):
+            session = await self._ensure(slot)
+            slot.active += 1
+            try:
+                return await fn(session)
+            except Exception as e:
+                if attempt or not is_disconnect(e):
+                    raise
+                logger.warning(f"⚠️ MCP 会话断开，重连后重试：{e}")
+                self.reconnects += 1
+                await slot.close()
+            finally:
+                slot.active -= 1
+
+    async def list_tools(self) -> List[Tool]:
+        """服务器提供的工具列表（只查询一次）"""
+        if self._tools is None:
+            self._tools = (await self.run(lambda session: session.list_tools())).tools
+        return self._tools
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None) -> Any:
+        """调用工具，返回 CallToolResult"""
+        return await self.run(lambda session: session.call_tool(name=name, arguments=arguments))
+
+    async def close(self):
+        """关闭所有会话"""
+        if self._loop is not None and self._loop is not asyncio.get_running_loop():
+            self._abandon()
+            self._loop = None
+            return
+        for slot in self._slots:
+            await slot.close()
+
+    def close_sync(self):
+        """在事件循环之外关闭会话池（如解释器退出时）：原循环未关闭时在其中关闭会话，否则丢弃"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and not loop.is_running():
+            loop.run_until_complete(self.close())
+        else:
+            self._abandon()
+            self._loop = None
+
+    def stats(self) -> dict:
+        """会话池统计：存活会话数、调用次数、重连次数"""
+        return {
+            "alive": sum(slot.alive for slot in self._slots),
+            "size": len(self._slots),
+            "calls": self.calls,
+            "reconnects": self.reconnects,
+        }
+
+
+class _PooledRunMixin:
+    """通过会话池调用工具
+
+    每个会话对应一个以 session= 绑定到该会话的 autogen 适配器，参数校验和结果转换都由其公开的 run() 完成；
+    会话重连后绑定旧会话的适配器被丢弃
+    """
+
+    # 绑定会话的适配器类型
+    adapter_class: type
+
+    def __init__(self, pool: McpSessionPool, tool: Tool):
+        super().__init__(server_params=pool.server_params, tool=tool)
+        self._pool = pool
+        self._bound: Dict[ClientSession, BaseTool] = {}
+
+    def _bind(self, session: ClientSession) -> BaseTool:
+        adapter = self._bound.get(session)
+        if adapter is None:
+            live = {slot.session for slot in self._pool._slots}
+            self._bound = {bound: a for bound, a in self._bound.items() if bound in live}
+            adapter = self._bound[session] = self.adapter_class(
+                server_params=self._pool.server_params, tool=self._tool, session=session
+            )
+        return adapter
+
+    async def run(self, args: BaseModel, cancellation_token: CancellationToken) -> Any:
+        return await self._pool.run(lambda session: self._bind(session).run(args, cancellation_token))
+
+
+class PooledMcpToolAdapter(_PooledRunMixin, StdioMcpToolAdapter):
+    """通过会话池调用的 stdio MCP 工具"""
+
+    adapter_class = StdioMcpToolAdapter
+
+
+class PooledStreamableHttpMcpToolAdapter(_PooledRunMixin, StreamableHttpMcpToolAdapter):
+    """通过会话池调用的 Streamable HTTP MCP 工具"""
+
+    adapter_class = StreamableHttpMcpToolAdapter
+
+
+async def pooled_mcp_tools(pool: McpSessionPool) -> List[_PooledRunMixin]:
+    """为会话池中的所有工具创建适配器"""
+    if isinstance(pool.server_params, StreamableHttpServerParams):
+        adapter = PooledStreamableHttpMcpToolAdapter
+    else:
+        adapter = PooledMcpToolAdapter
+    return [adapter(pool, tool) for tool in await pool.list_tools()]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+测试公共夹具 - 提供不访问网络的模拟彩云/高德响应，并隔离地理编码持久化缓存
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.geocode_store import GeocodeStore
+
+# 导入服务器模块时不创建仓库下的 .cache/geocode.sqlite3；每个测试的缓存由 isolated_geocode_store 提供
+os.environ["GEOCODE_STORE_PATH"] = ""
+
+
+@pytest.fixture(autouse=True)
+def isolated_geocode_store(tmp_path, monkeypatch):
+    """全局地理编码器改用 tmp_path 下的 SQLite 缓存，测试之间互不影响"""
+    module = sys.modules.get("mcp_server.weather_mcp_server")
+    if module is None:
+        yield None
+        return
+    store = GeocodeStore(str(tmp_path / "geocode.sqlite3"), module.GEOCODE_STORE_TTL, module.GEOCODE_CACHE_MAX_ENTRIES)
+    monkeypatch.setattr(module.amap_geocoder, "store", store)
+    yield store
+    store.close()
+
+
+def build_caiyun_daily(days: int = 15, start: str = None, skycon: str = "CLEAR_DAY") -> dict:
+    """构造彩云天气 /daily 接口的模拟响应（字段与 doc/caiyun_weather.md 一致）"""
+    start_date = datetime.strptime(start, "%Y-%m-%d") if start else datetime.now()
+    dates = [(start_date + timedelta(days=i)).strftime("%Y-%m-%dT00:00+08:00") for i in range(days)]
+
+    return {
+        "status": "ok",
+        "api_version": "v2.6",
+        "tzshift": 28800,
+        "timezone": "Asia/Shanghai",
+        "result": {
+            "daily": {
+                "status": "ok",
+                "temperature": [
+                    {"date": d, "max": 25 + i % 5, "min": 15 + i % 3, "avg": 20.5} for i, d in enumerate(dates)
+                ],
+                "skycon": [{"date": d, "value": skycon} for d in dates],
+                "precipitation": [
+                    {"date": d, "max": 0, "min": 0, "avg": 0, "probability": 0.1} for d in dates
+                ],
+                "humidity": [{"date": d, "max": 0.8, "min": 0.4, "avg": 0.6} for d in dates],
+                "wind": [
+                    {"date": d, "avg": {"speed": 3.5, "direction": 90}} for d in dates
+                ],
+            }
+        }
+    }
+
+
+def build_amap_geocode(lon: float, lat: float) -> dict:
+    """构造高德地理编码接口的模拟响应"""
+    return {
+        "status": "1",
+        "info": "OK",
+        "count": "1",
+        "geocodes": [{"location": f"{lon:.6f},{lat:.6f}"}]
+    }
+
+
+@pytest.fixture
+def caiyun_daily():
+    """彩云天气模拟响应构造函数"""
+    return build_caiyun_daily
+
+
+@pytest.fixture
+def amap_geocode():
+    """高德地理编码模拟响应构造函数"""
+    return build_amap_geocode
+
+
+def build_amap_regeo(province: str = "北京市", city="", district: str = "朝阳区",
+                     township: str = "三里屯街道", adcode: str = "110105") -> dict:
+    """构造高德逆地理编码接口的模拟响应（直辖市的 city 字段为空数组）"""
+    return {
+        "status": "1",
+        "info": "OK",
+        "regeocode": {
+            "formatted_address": f"{province}{city or ''}{district}{township}",
+            "addressComponent": {
+                "country": "中国",
+                "province": province,
+                "city": city or [],
+                "district": district,
+                "adcode": adcode,
+                "township": township,
+            }
+        }
+    }
+
+
+@pytest.fixture
+def amap_regeo():
+    """高德逆地理编码模拟响应构造函数"""
+    return build_amap_regeo
+
+
+def build_caiyun_weather(hours: int = 48, days: int = 15, start: float = None) -> dict:
+    """构造彩云天气 /weather 合并接口的模拟响应（realtime + hourly + daily），逐小时数据从当前整点开始"""
+    now = start if start is not None else time.time()
+    tz = timezone(timedelta(hours=8))
+    first_hour = datetime.fromtimestamp(now, tz).replace(minute=0, second=0, microsecond=0)
+    times = [(first_hour + timedelta(hours=i)).isoformat(timespec="minutes") for i in range(hours)]
+    daily = build_caiyun_daily(days, first_hour.strftime("%Y-%m-%d"))
+
+    return {
+        **{k: v for k, v in daily.items() if k != "result"},
+        "server_time": int(now),
+        "result": {
+            "realtime": {
+                "status": "ok",
+                "temperature": 21.6,
+                "humidity": 0.55,
+                "skycon": "PARTLY_CLOUDY_DAY",
+                "wind": {"speed": 5.4, "direction": 120},
+                "apparent_temperature": 20.8,
+                "precipitation": {"local": {"status": "ok", "datasource": "radar", "intensity": 0}},
+                "air_quality": {"pm25": 12, "aqi": {"chn": 28, "usa": 50}, "description": {"chn": "优", "usa": "良"}},
+            },
+            "hourly": {
+                "status": "ok",
+                "description": "多云",
+                "temperature": [{"datetime": t, "value": 20 + i % 6} for i, t in enumerate(times)],
+                "skycon": [{"datetime": t, "value": "CLOUDY"} for t in times],
+                "precipitation": [{"datetime": t, "value": 0, "probability": 10} for t in times],
+                "wind": [{"datetime": t, "speed": 6.0, "direction": 90} for t in times],
+                "humidity": [{"datetime": t, "value": 0.6} for t in times],
+            },
+            "daily": daily["result"]["daily"],
+            "primary": 0,
+            "forecast_keypoint": "未来两小时不会下雨，放心出门吧",
+        }
+    }
+
+
+@pytest.fixture
+def caiyun_weather():
+    """彩云天气 /weather 合并接口模拟响应构造函数"""
+    return build_caiyun_weather
+
+
+@pytest.fixture
+def mocked_server(request, monkeypatch):
+    """将服务器模块的全局彩云/高德客户端替换为模拟传输层，记录各接口的请求和进度通知
+
+    彩云 /weather 返回合并接口响应，其余彩云接口返回 /daily 响应；高德逆地理编码返回 build_amap_regeo，
+    正向地理编码返回 500（测试城市均由本地数据解析）。
+    可用 indirect 参数化传入 {"daily": {...}, "weather": {...}, "regeo": {...}} 作为对应构造函数的参数
+    """
+    import httpx
+    from mcp_server import weather_mcp_server as module
+    from mcp_server.circuit_breaker import CircuitBreaker
+    from mcp_server.forecast_cache import ForecastCache
+
+    options = getattr(request, "param", {})
+    requests = {"caiyun": [], "geo": [], "regeo": []}
+    progress = []
+
+    def handler(http_request: httpx.Request) -> httpx.Response:
+        path = http_request.url.path
+        if path.endswith("/regeo"):
+            requests["regeo"].append(http_request)
+            return httpx.Response(200, json=build_amap_regeo(**options.get("regeo", {})))
+        if path.endswith("/geo"):
+            requests["geo"].append(http_request)
+            return httpx.Response(500)
+        requests["caiyun"].append(http_request)
+        if path.endswith("/weather"):
+            return httpx.Response(200, json=build_caiyun_weather(**options.get("weather", {})))
+        return httpx.Response(200, json=build_caiyun_daily(**options.get("daily", {})))
+
+    async def fake_report_progress(done, total, message):
+        progress.append((done, total, message))
+
+    http = module.SharedHTTPClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(module.weather_api, "http", http)
+    monkeypatch.setattr(module.weather_api, "forecast_cache", ForecastCache())
+    monkeypatch.setattr(module.weather_api, "breaker", CircuitBreaker("彩云天气"))
+    monkeypatch.setattr(module.amap_geocoder, "http", http)
+    monkeypatch.setattr(module.amap_geocoder, "regeo_cache", {})
+    monkeypatch.setattr(module.amap_geocoder, "breaker", CircuitBreaker("高德地图"))
+    monkeypatch.setattr(module, "report_progress", fake_report_progress)
+    return SimpleNamespace(module=module, requests=requests, progress=progress)
@@ -3,6 +3,7 @@
 API层测试 - 测试高德地图API和彩云天气API的基础功能
 """
 
+import asyncio
 import pytest
 import pytest_asyncio
 import sys
@@ -11,7 +12,9 @@ import os
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from mcp_server.weather_mcp_server import AmapGeocoder, WeatherAPI
+import httpx
+
+from mcp_server.weather_mcp_server import AmapGeocoder, WeatherAPI, SharedHTTPClient
 
 class TestAmapAPI:
     """高德地图API测试"""
@@ -88,34 +91,26 @@ class TestCaiyunAPI:
         """测试彩云天气API连接"""
         # 使用北京测试API连接
         data = await weather_api.get_daily_weather("北京", days=1)
-        assert data.get("status") == "ok", "彩云天气API连接失败或API密钥无效"
+        assert len(data) > 0, "彩云天气API连接失败或API密钥无效"
     
     @pytest.mark.asyncio
     async def test_caiyun_data_structure(self, weather_api):
         """测试彩云天气API返回数据结构"""
         data = await weather_api.get_daily_weather("北京", days=1)
         
-        # 验证基础结构
-        assert "status" in data
-        assert "result" in data
-        assert "daily" in data["result"]
-        
-        daily = data["result"]["daily"]
-        required_fields = ["temperature", "skycon", "precipitation", "humidity", "wind"]
+        # 验证解码后的各字段序列长度一致
+        required_fields = ["temp_max", "temp_min", "skycon", "rain_prob", "humidity", "wind_speed"]
         
         for field in required_fields:
-            assert field in daily, f"缺少必要字段: {field}"
-            assert isinstance(daily[field], list), f"{field}应该是列表类型"
-            assert len(daily[field]) > 0, f"{field}不应为空"
+            assert len(getattr(data, field)) == len(data) > 0, f"{field}长度与天数不一致"
     
     @pytest.mark.asyncio
     async def test_caiyun_temperature_data(self, weather_api):
         """测试温度数据合理性"""
         data = await weather_api.get_daily_weather("北京", days=1)
         
-        temp_data = data["result"]["daily"]["temperature"][0]
-        temp_min = temp_data["min"]
-        temp_max = temp_data["max"]
+        temp_min = data.temp_min[0]
+        temp_max = data.temp_max[0]
         
         # 温度合理性检查
         assert isinstance(temp_min, (int, float)), "最低温度应为数字"
@@ -131,10 +126,7 @@ class TestCaiyunAPI:
         
         for days in days_to_test:
             data = await weather_api.get_daily_weather("北京", days=days)
-            assert data.get("status") == "ok", f"查询{days}天天气失败"
-            
-            temp_list = data["result"]["daily"]["temperature"]
-            assert len(temp_list) >= days, f"查询{days}天但只返回{len(temp_list)}天数据"
+            assert len(data) >= days, f"查询{days}天但只返回{len(data)}天数据"
     
     @pytest.mark.asyncio
     async def test_caiyun_different_cities(self, weather_api):
@@ -143,7 +135,7 @@ class TestCaiyunAPI:
         
         for city in cities:
             data = await weather_api.get_daily_weather(city, days=1)
-            assert data.get("status") == "ok", f"{city}天气查询失败"
+            assert len(data) > 0, f"{city}天气查询失败"
     
     @pytest.mark.asyncio 
     async def test_caiyun_invalid_city(self, weather_api):
@@ -151,6 +143,160 @@ class TestCaiyunAPI:
         with pytest.raises(ValueError, match="不支持的城市"):
             await weather_api.get_daily_weather("不存在的城市xxx", days=1)
 
+class TestSharedHTTPClient:
+    """共享连接池测试（使用模拟传输层，不访问网络）"""
+    
+    @pytest.mark.asyncio
+    async def test_clients_share_one_pool(self, caiyun_daily):
+        """测试高德与彩云客户端复用同一个连接池"""
+        seen_hosts = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen_hosts.append(request.url.host)
+            if "geocode" in request.url.path:
+                return httpx.Response(200, json={
+                    "status": "1", "count": "1",
+                    "geocodes": [{"location": "109.511909,18.252847"}]
+                })
+            return httpx.Response(200, json=caiyun_daily(1))
+        
+        http = SharedHTTPClient(transport=httpx.MockTransport(handler))
+        geocoder = AmapGeocoder(http)
+        weather_api = WeatherAPI(http)
+        
+        try:
+            client = http.get()
+            assert http.get() is client, "同一事件循环内应复用同一个客户端"
+            
+            assert await geocoder.get_coordinates("三亚") == (18.252847, 109.511909)
+            data = await weather_api.get_daily_weather("北京", days=1)
+            assert len(data) == 1
+            assert http.get() is client, "调用API后不应重建客户端"
+            assert len(seen_hosts) == 2
+        finally:
+            await geocoder.close()
+            await weather_api.close()
+        
+        assert client.is_closed, "close()应关闭共享连接池"
+
+class TestBatchGeocoding:
+    """高德批量地理编码测试（使用模拟传输层，不访问网络）"""
+    
+    @pytest.mark.asyncio
+    async def test_get_coordinates_many_chunks_misses(self):
+        """测试本地命中直接返回，其余按每批10个并发查询"""
+        batches = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params["batch"] == "true"
+            names = request.url.params["address"].split("|")
+            batches.append(names)
+            geocodes = [
+                {"location": []} if name == "不存在的地方" else {"location": f"{100 + i}.0,{20 + i}.0"}
+                for i, name in enumerate(names)
+            ]
+            return httpx.Response(200, json={"status": "1", "count": str(len(names)), "geocodes": geocodes})
+        
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        names = ["北京", "上海"] + [f"地点{i}" for i in range(20)] + ["不存在的地方", "地点0"]
+        try:
+            results = await geocoder.get_coordinates_many(names)
+        finally:
+            await geocoder.close()
+        
+        assert results["北京"] == (39.9042, 116.4074)
+        assert results["上海"] == (31.2304, 121.4737)
+        assert results["不存在的地方"] is None
+        assert results["地点0"] == (20.0, 100.0)
+        assert len(results) == 23, "重复的城市名只查询一次"
+        
+        assert [len(b) for b in batches] == [10, 10, 1]
+        assert all("北京" not in b for b in batches), "预定义城市不应发往高德"
+        assert geocoder.coord_cache["地点10"] == (20.0, 100.0)
+    
+    @pytest.mark.asyncio
+    async def test_get_coordinates_many_all_local(self):
+        """测试全部本地命中时不发起网络请求"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise AssertionError("不应调用高德API")
+        
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        try:
+            results = await geocoder.get_coordinates_many(["北京", "广州"])
+        finally:
+            await geocoder.close()
+        
+        assert all(results.values())
+    
+    @pytest.mark.asyncio
+    async def test_batch_shares_singleflight_with_single_lookups(self):
+        """测试批量查询与单个查询共用 singleflight：在途的名称不重复请求，批量期间的单个查询等待批次结果"""
+        requests = []
+        
+        async def handler(request: httpx.Request) -> httpx.Response:
+            names = request.url.params["address"].split("|")
+            requests.append(names)
+            await asyncio.sleep(0.02)
+            geocodes = [{"location": f"{100 + len(name)}.0,20.0"} for name in names]
+            return httpx.Response(200, json={"status": "1", "count": str(len(names)), "geocodes": geocodes})
+        
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        try:
+            single = asyncio.create_task(geocoder.get_coordinates("地点甲"))
+            await asyncio.sleep(0)
+            batch = asyncio.create_task(geocoder.get_coordinates_many(["地点甲", "地点乙", "地点丙"]))
+            await asyncio.sleep(0)
+            during = await geocoder.get_coordinates("地点乙")
+            results = await batch
+            assert await single == results["地点甲"]
+        finally:
+            await geocoder.close()
+        
+        assert sorted(requests) == [["地点乙", "地点丙"], ["地点甲"]]
+        assert during == results["地点乙"] == (20.0, 103.0)
+    
+    @pytest.mark.asyncio
+    async def test_batch_not_found_not_requested_again(self):
+        """测试批量查询报告无结果的名称，随后的单个查询和批量查询都不再请求"""
+        requests = []
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            names = request.url.params["address"].split("|")
+            requests.append(names)
+            geocodes = [{"location": []} if name == "不存在的地方" else {"location": "100.0,20.0"} for name in names]
+            return httpx.Response(200, json={"status": "1", "count": str(len(names)), "geocodes": geocodes})
+        
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        try:
+            results = await geocoder.get_coordinates_many(["不存在的地方", "地点甲"])
+            assert results["不存在的地方"] is None
+            assert await geocoder.get_coordinates("不存在的地方") is None
+            assert (await geocoder.get_coordinates_many(["不存在的地方"]))["不存在的地方"] is None
+            assert geocoder.stats()["not_found"] == 1
+        finally:
+            await geocoder.close()
+        
+        assert requests == [["不存在的地方", "地点甲"]]
+    
+    @pytest.mark.asyncio
+    async def test_failed_batch_not_treated_as_not_found(self):
+        """测试请求失败（而非无结果）时不记录，之后仍会重新请求"""
+        calls = 0
+        
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json={"status": "0", "info": "INVALID_USER_KEY"})
+        
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        try:
+            await geocoder.get_coordinates_many(["地点甲", "地点乙"])
+            assert await geocoder.get_coordinates("地点甲") is None
+        finally:
+            await geocoder.close()
+        
+        assert calls == 2 and geocoder.not_found == {}
+
 class TestAPIIntegration:
     """API集成测试 - 测试高德地图和彩云天气API的配合"""
     
@@ -168,7 +314,7 @@ class TestAPIIntegration:
             
             # 2. 使用坐标查询天气
             data = await weather_api.get_daily_weather(city, days=1)
-            assert data.get("status") == "ok", f"使用坐标查询{city}天气失败"
+            assert len(data) > 0, f"使用坐标查询{city}天气失败"
             
         finally:
             await geocoder.close()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+缓存后端测试 - memory / sqlite / redis 后端的批量读写、TTL、add 语义、故障降级，
+按配置创建后端，以及高德客户端通过后端批量查询和共享逆地理编码结果
+"""
+
+import pytest
+import socket
+import socketserver
+import sys
+import os
+import threading
+import time
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.cache_backends import MemoryBackend, SqliteBackend, RedisBackend, create_backend
+from mcp_server.weather_mcp_server import AmapGeocoder, SharedHTTPClient
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """最小的 RESP2 服务器，支持 PING、AUTH、SELECT、MGET、SET（PX / NX）、DEL，记录收到的命令"""
+
+    def __init__(self, password: str = None):
+        self.data = {}
+        self.commands = []
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = self.read_command()
+                    if command is None:
+                        return
+                    fake.commands.append(command)
+                    self.wfile.write(fake.execute(command))
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return [args[0].decode().upper()] + args[1:]
+
+        self.password = password
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/2"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _live(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and time.monotonic() >= expires_at:
+            self.data.pop(key)
+            return None
+        return value
+
+    def execute(self, command) -> bytes:
+        name, args = command[0], command[1:]
+        if name == "AUTH":
+            return b"+OK\r\n" if args[0].decode() == self.password else b"-WRONGPASS invalid password\r\n"
+        if name in ("PING", "SELECT"):
+            return b"+OK\r\n"
+        if name == "MGET":
+            reply = b"*%d\r\n" % len(args)
+            for key in args:
+                value = self._live(key)
+                reply += b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            return reply
+        if name == "SET":
+            key, value, options = args[0], args[1], [arg.decode().upper() for arg in args[2:]]
+            if "NX" in options and self._live(key) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if "PX" in options:
+                expires_at = time.monotonic() + int(options[options.index("PX") + 1]) / 1000
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if name == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        return b"-ERR unknown command\r\n"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_redis():
+    server = FakeRedis()
+    yield server
+    server.close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    """三种后端共用同一组语义测试（redis 连接本地模拟服务器）"""
+    if request.param == "memory":
+        yield MemoryBackend()
+    elif request.param == "sqlite":
+        store = SqliteBackend(str(tmp_path / "cache.sqlite3"), "test_cache")
+        yield store
+        store.close()
+    else:
+        server = FakeRedis()
+        store = RedisBackend(server.url, namespace="test")
+        yield store
+        store.close()
+        server.close()
+
+
+class TestBackendSemantics:
+    """各后端的公共语义"""
+
+    def test_get_many_set_many(self, backend):
+        backend.set_many({"北京": (39.9042, 116.4074), "上海": (31.2304, 121.4737)})
+        backend.set("regeo:1", {"name": "北京市朝阳区", "adcode": "110105"})
+
+        found = backend.get_many(["北京", "上海", "广州", "北京"])
+        assert found == {"北京": (39.9042, 116.4074), "上海": (31.2304, 121.4737)}
+        assert backend.get("regeo:1") == {"name": "北京市朝阳区", "adcode": "110105"}
+        assert backend.get_many([]) == {}
+        assert backend.stats()["store_hits"] == 3 and backend.stats()["store_misses"] == 1
+
+    def test_add_and_delete(self, backend):
+        assert backend.add("lease:k", "w0", ttl=10)
+        assert not backend.add("lease:k", "w1", ttl=10)
+        assert backend.get("lease:k") == "w0"
+        backend.delete("lease:k")
+        assert backend.get("lease:k") is None
+        assert backend.add("lease:k", "w1", ttl=10)
+
+    def test_overwrite(self, backend):
+        backend.set("k", [1])
+        backend.set("k", [2])
+        assert backend.get("k") == [2]
+
+
+class TestLocalBackends:
+    """memory / sqlite 后端的 TTL 和容量"""
+
+    @pytest.mark.parametrize("make", [
+        lambda path, clock: MemoryBackend(max_entries=3, ttl=60, clock=clock),
+        lambda path, clock: SqliteBackend(path, max_entries=3, ttl=60, clock=clock),
+    ], ids=["memory", "sqlite"])
+    def test_ttl_and_eviction(self, tmp_path, make):
+        clock = FakeClock()
+        backend = make(str(tmp_path / "cache.sqlite3"), clock)
+        backend.set("short", 1, ttl=5)
+        backend.set("default", 2)
+        clock.now += 6
+        assert backend.get_many(["short", "default"]) == {"default": 2}
+
+        # 过期的键可以再次 add
+        assert backend.add("short", 3)
+
+        for i in range(4):
+            clock.now += 1
+            backend.set(f"k{i}", i)
+        assert len(backend) == 3
+        assert backend.get("k3") == 3 and backend.get("default") is None
+        backend.close()
+
+    def test_memory_lru(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        assert backend.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+    def test_sqlite_rejects_bad_table(self, tmp_path):
+        with pytest.raises(ValueError):
+            SqliteBackend(str(tmp_path / "cache.sqlite3"), "cache; DROP TABLE x")
+
+
+class TestRedisBackend:
+    """Redis 后端：协议细节和故障降级"""
+
+    def test_batched_round_trips(self, fake_redis):
+        backend = RedisBackend(fake_redis.url, namespace="weather:geocode_cache", ttl=60)
+        backend.set_many({"北京": (39.9, 116.4), "上海": (31.2, 121.5)})
+        backend.get_many(["北京", "上海", "广州"])
+
+        names = [command[0] for command in fake_redis.commands]
+        assert names == ["SELECT", "SET", "SET", "MGET"], "库号只在连接时选择一次，读取一次往返"
+        assert fake_redis.commands[1][1] == "weather:geocode_cache:北京".encode()
+        assert fake_redis.commands[1][3:] == [b"PX", b"60000"]
+        backend.close()
+
+    def test_server_side_expiry(self, fake_redis):
+        backend = RedisBackend(fake_redis.url)
+        backend.set("k", "v", ttl=0.05)
+        assert backend.get("k") == "v"
+        time.sleep(0.1)
+        assert backend.get("k") is None
+        backend.close()
+
+    def test_auth(self):
+        server = FakeRedis(password="s3cret")
+        try:
+            good = RedisBackend(server.url.replace("redis://", "redis://:s3cret@"))
+            good.set("k", 1)
+            assert good.get("k") == 1 and server.commands[0] == ["AUTH", b"s3cret"]
+            good.close()
+
+            bad = RedisBackend(server.url.replace("redis://", "redis://:wrong@"))
+            assert bad.get("k") is None
+            assert bad.stats()["store_errors"] == 1
+        finally:
+            server.close()
+
+    def test_unavailable_degrades_to_miss(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", retry_interval=60)
+
+        assert backend.get("k") is None
+        backend.set("k", 1)
+        assert backend.add("lease:k", "w0"), "Redis 不可用时租约视为获得，各进程自行请求上游"
+        assert backend.stats()["store_errors"] == 1, "冷却期内不再尝试连接"
+
+
+class TestCreateBackend:
+    """按配置字符串创建后端"""
+
+    def test_specs(self, tmp_path):
+        path = str(tmp_path / "default.sqlite3")
+        assert create_backend("none", path, "t") is None
+        assert create_backend("", path, "t") is None
+        assert create_backend("sqlite", "", "t") is None, "未配置文件路径时不启用"
+        assert isinstance(create_backend("memory", path, "t"), MemoryBackend)
+
+        default = create_backend("sqlite", path, "t")
+        assert isinstance(default, SqliteBackend) and default.path == path
+        custom = create_backend(f"sqlite:///{tmp_path}/custom.sqlite3", path, "t")
+        assert custom.path == f"{tmp_path}/custom.sqlite3"
+
+        redis = create_backend("redis://cache.internal:6380/1", path, "forecast_cache", ttl=30)
+        assert (redis.host, redis.port, redis.db, redis.prefix, redis.ttl) == \
+            ("cache.internal", 6380, 1, "weather:forecast_cache:", 30)
+
+    @pytest.mark.parametrize("spec", ["rediss://cache:6379", "memcached://cache"])
+    def test_unsupported(self, spec):
+        with pytest.raises(ValueError):
+            create_backend(spec, "", "t")
+
+
+class TestGeocoderWithBackend:
+    """高德客户端通过二级缓存后端批量查询、共享逆地理编码结果"""
+
+    @pytest.mark.asyncio
+    async def test_batch_lookup_uses_backend(self):
+        backend = MemoryBackend()
+        backend.set("地点0", (20.0, 100.0))
+        batches = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            names = request.url.params["address"].split("|")
+            batches.append(names)
+            geocodes = [{"location": f"{110 + i}.0,{30 + i}.0"} for i, _ in enumerate(names)]
+            return httpx.Response(200, json={"status": "1", "count": str(len(names)), "geocodes": geocodes})
+
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)), backend)
+        try:
+            results = await geocoder.get_coordinates_many(["北京", "地点0", "地点1", "地点2"])
+        finally:
+            await geocoder.close()
+
+        assert results["地点0"] == (20.0, 100.0)
+        assert batches == [["地点1", "地点2"]]
+        assert backend.get_many(["地点1", "地点2"]) == {"地点1": (30.0, 110.0), "地点2": (31.0, 111.0)}
+
+    @pytest.mark.asyncio
+    async def test_regeo_shared_between_instances(self, amap_regeo):
+        backend = MemoryBackend()
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(200, json=amap_regeo())
+
+        transport = httpx.MockTransport(handler)
+        first = AmapGeocoder(SharedHTTPClient(transport=transport), backend)
+        second = AmapGeocoder(SharedHTTPClient(transport=transport), backend)
+        try:
+            place = await first.reverse_geocode(39.9361, 116.4552)
+            assert await second.reverse_geocode(39.9368, 116.4559) == place
+        finally:
+            await first.close()
+            await second.close()
+        assert len(calls) == 1
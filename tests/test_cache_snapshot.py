@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+缓存快照测试 - 导出/载入预报缓存、丢弃失效条目、地理编码恢复、拒绝不安全的快照、重启预热
+"""
+
+import pickle
+import zlib
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.cache_snapshot import CacheSnapshot, SNAPSHOT_VERSION
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.weather_mcp_server import WeatherAPI, AmapGeocoder, SharedHTTPClient, CITY_COORDINATES
+
+BEIJING = CITY_COORDINATES["北京"]
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestForecastCacheRestore:
+    """预报缓存导出与载入测试"""
+
+    def test_round_trip_keeps_order_and_expiry(self):
+        clock = FakeClock(1000.0)
+        cache = ForecastCache(ttl=60, max_entries=3, clock=clock)
+        for key in "abc":
+            cache.set(key, key.upper())
+            clock.now += 1
+        cache.get("a")
+
+        restored = ForecastCache(ttl=60, max_entries=3, clock=clock)
+        restored.set("d", "D")
+        assert restored.restore(cache.items()) == 3
+        assert restored.expires_at("c") == cache.expires_at("c")
+        # 载入的条目排在启动后写入的条目之前，并保持原 LRU 顺序；超出上限时先淘汰最旧的
+        assert [key for key, *_ in restored.items()] == ["c", "a", "d"]
+        assert restored.evictions == 1
+
+    def test_skips_existing_and_expired(self):
+        clock = FakeClock(1000.0)
+        cache = ForecastCache(ttl=60, stale_ttl=300, clock=clock)
+        cache.set("fresh", 1, ttl=600)
+        cache.set("stale", 2)
+        cache.set("gone", 3)
+        entries = [entry if entry[0] != "gone" else ("gone", 1060.0, 500.0, 0, 3) for entry in cache.items()]
+        clock.now += 120
+
+        restored = ForecastCache(ttl=60, stale_ttl=300, clock=clock)
+        restored.set("fresh", "new")
+        assert restored.restore(entries) == 1
+        assert restored.get("fresh") == "new", "已有的条目优先"
+        assert restored.get("stale") is None and restored.get_stale("stale")[0] == 2, "过期但仍可降级的条目保留"
+        assert "gone" not in [key for key, *_ in restored.items()]
+
+
+@pytest.fixture
+def setup(tmp_path, caiyun_daily, caiyun_weather):
+    # 当地时间上午，推进时钟不会跨过零点
+    clock = FakeClock(1_700_000_000.0 - 1_700_000_000.0 % 86400 + 3600)
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        if request.url.path.endswith("/weather"):
+            return httpx.Response(200, json=caiyun_weather(start=clock.now))
+        return httpx.Response(200, json=caiyun_daily())
+
+    def make_api() -> WeatherAPI:
+        api = WeatherAPI(
+            SharedHTTPClient(transport=httpx.MockTransport(handler)),
+            ForecastCache(ttl=1800, clock=clock)
+        )
+        api.breaker = CircuitBreaker("彩云天气")
+        return api
+
+    return make_api, clock, paths, str(tmp_path / "snapshot.bin")
+
+
+class TestCacheSnapshot:
+    """快照文件测试（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_restart_serves_from_snapshot(self, setup):
+        """测试重启后从快照载入的缓存直接命中，不请求上游"""
+        make_api, _, paths, path = setup
+        api = make_api()
+        await api.get_daily_weather_at(*BEIJING)
+        await api.get_weather_bundle("上海")
+        size = CacheSnapshot(path, api.forecast_cache).save()
+        assert 0 < size < 16 * 1024
+        await api.close()
+
+        restarted = make_api()
+        assert await CacheSnapshot(path, restarted.forecast_cache).load() == 4
+        paths.clear()
+        daily = await restarted.get_daily_weather_at(*BEIJING)
+        bundle = await restarted.get_weather_bundle("上海")
+        assert len(daily) == 15 and len(bundle["hourly"]) == 48
+        assert bundle["realtime"].temperature == pytest.approx(21.6)
+        assert paths == []
+        await restarted.close()
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_dropped(self, setup):
+        make_api, clock, paths, path = setup
+        api = make_api()
+        await api.get_daily_weather_at(*BEIJING)
+        CacheSnapshot(path, api.forecast_cache).save()
+
+        clock.now += 1801
+        restarted = make_api()
+        assert await CacheSnapshot(path, restarted.forecast_cache).load() == 0
+        assert len(restarted.forecast_cache) == 0
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_queries_wait_for_loading(self, setup):
+        """测试快照载入期间的查询等待载入完成，而不是请求上游"""
+        make_api, _, paths, path = setup
+        api = make_api()
+        await api.get_daily_weather_at(*BEIJING)
+        CacheSnapshot(path, api.forecast_cache).save()
+
+        restarted = make_api()
+        snapshot = CacheSnapshot(path, restarted.forecast_cache)
+        restarted.warmup = snapshot.start()
+        paths.clear()
+        await restarted.get_daily_weather_at(*BEIJING)
+        assert paths == []
+
+        await snapshot.stop()
+        assert snapshot.stats()["saved"] == 1
+        await api.close()
+        await restarted.close()
+
+    def test_geocodes_restored(self, setup):
+        """测试地名坐标和逆地理编码恢复，恢复的坐标不改变预报归并的锚点；超过有效期的不恢复"""
+        make_api, clock, _, path = setup
+        geocoder = AmapGeocoder()
+        geocoder.coord_cache["三亚"] = (18.2528, 109.512)
+        geocoder.regeo_cache["grid:0.01:1,2"] = {"name": "海南省三亚市", "adcode": "460200"}
+        CacheSnapshot(path, ForecastCache(clock=clock), geocoder, clock=clock).save()
+
+        restored = AmapGeocoder()
+        snapshot = CacheSnapshot(path, ForecastCache(clock=clock), restored, clock=clock)
+        snapshot.restore(snapshot.read())
+        assert restored.coord_cache["三亚"] == (18.2528, 109.512)
+        assert restored.regeo_cache["grid:0.01:1,2"]["adcode"] == "460200"
+
+        clock.now += 3601
+        expired = AmapGeocoder()
+        snapshot = CacheSnapshot(path, ForecastCache(clock=clock), expired, geocode_ttl=3600, clock=clock)
+        snapshot.restore(snapshot.read())
+        assert expired.coord_cache == {}
+
+    def test_rejects_unsafe_or_corrupt_files(self, tmp_path):
+        """测试快照只允许还原预报记录类型，损坏或版本不符的文件被忽略"""
+        path = tmp_path / "snapshot.bin"
+        snapshot = CacheSnapshot(str(path), ForecastCache())
+        assert snapshot.read() is None
+
+        path.write_bytes(zlib.compress(pickle.dumps({"version": SNAPSHOT_VERSION, "forecasts": [os.system]})))
+        assert snapshot.read() is None
+        path.write_bytes(b"not a snapshot")
+        assert snapshot.read() is None
+        path.write_bytes(zlib.compress(pickle.dumps({"version": SNAPSHOT_VERSION + 1})))
+        assert snapshot.read() is None
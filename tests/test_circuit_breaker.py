@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+熔断器测试 - 状态切换、慢调用，以及熔断期间返回旧数据并在后台刷新
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.cache_backends import MemoryBackend
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.forecast_records import DailyForecast
+from mcp_server.rate_limit import RetryPolicy
+from mcp_server.scheduler import PriorityScheduler, QueueFullError, INTERACTIVE
+from mcp_server.shared_cache import SharedForecastStore
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient, CITY_COORDINATES
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker:
+    """熔断器状态机测试"""
+
+    def test_opens_after_consecutive_failures(self):
+        """测试连续失败后打开，恢复期后半开探测"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=10, clock=clock)
+
+        for _ in range(3):
+            assert breaker.allow_request()
+            breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+        clock.now += 10
+        assert breaker.allow_request(), "恢复期后应放行一个探测请求"
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request(), "半开状态只放行一个探测请求"
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.stats()["rejected"] == 2
+
+    def test_failed_probe_reopens(self):
+        """测试探测失败重新打开"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_slow_calls_count_as_failures(self):
+        """测试慢调用按失败计"""
+        breaker = CircuitBreaker("test", failure_threshold=2, slow_call_threshold=1.0)
+        breaker.record_success(duration=1.5)
+        breaker.record_success(duration=2.0)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.stats()["slow_calls"] == 2
+
+    def test_release_probe(self):
+        """测试未使用的探测名额归还后可再次探测"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.release_probe()
+        assert breaker.allow_request()
+
+    def test_success_resets_failures(self):
+        """测试成功调用清零失败计数"""
+        breaker = CircuitBreaker("test", failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestStaleWhileRevalidate:
+    """熔断期间的降级与后台刷新（模拟传输层）"""
+
+    @pytest.fixture
+    def setup(self, caiyun_daily):
+        clock = FakeClock()
+        upstream = {"fail": False, "calls": 0}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            upstream["calls"] += 1
+            if upstream["fail"]:
+                return httpx.Response(503)
+            return httpx.Response(200, json=caiyun_daily())
+
+        api = WeatherAPI(
+            SharedHTTPClient(transport=httpx.MockTransport(handler)),
+            ForecastCache(ttl=60, stale_ttl=86400, clock=clock)
+        )
+        api.retry_policy = RetryPolicy(max_retries=0)
+        api.breaker = CircuitBreaker("彩云天气", failure_threshold=2, recovery_timeout=30, clock=clock)
+        return api, clock, upstream
+
+    @pytest.mark.asyncio
+    async def test_serves_stale_when_upstream_fails(self, setup):
+        """测试上游失败时返回标记为旧数据的缓存"""
+        api, clock, upstream = setup
+        fresh = await api.get_daily_weather("北京")
+        assert fresh.stale_seconds is None
+
+        clock.now += 120
+        upstream["fail"] = True
+        stale = await api.get_daily_weather("北京")
+
+        assert stale.stale_seconds == 120
+        assert "分钟前的缓存数据" in api.stale_notice(stale)
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_answers_immediately(self, setup):
+        """测试熔断打开后不再访问上游"""
+        api, clock, upstream = setup
+        await api.get_daily_weather("北京")
+        clock.now += 120
+        upstream["fail"] = True
+
+        await api.get_daily_weather("北京")
+        await api.get_daily_weather("北京")
+        assert api.breaker.state == CircuitBreaker.OPEN
+        calls = upstream["calls"]
+
+        data = await api.get_daily_weather("北京")
+        assert upstream["calls"] == calls, "熔断期间不应访问上游"
+        assert data.stale_seconds is not None
+
+        # 没有旧数据的城市快速失败
+        with pytest.raises(Exception, match="暂时不可用"):
+            await api.get_daily_weather("上海")
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_background_refresh_after_recovery(self, setup):
+        """测试恢复期后先返回旧数据，再在后台刷新缓存"""
+        api, clock, upstream = setup
+        await api.get_daily_weather("北京")
+        clock.now += 120
+        upstream["fail"] = True
+        await api.get_daily_weather("北京")
+        await api.get_daily_weather("北京")
+        assert api.breaker.state == CircuitBreaker.OPEN
+
+        upstream["fail"] = False
+        clock.now += 30
+        data = await api.get_daily_weather("北京")
+        assert data.stale_seconds is not None, "探测期间仍先返回旧数据"
+
+        await asyncio.gather(*api._background)
+        assert api.breaker.state == CircuitBreaker.CLOSED
+        refreshed = await api.get_daily_weather("北京")
+        assert refreshed.stale_seconds is None
+        await api.close()
+
+    def test_stale_data_shifted_after_midnight(self, setup, caiyun_daily):
+        """测试跨天后旧数据前移，第0天仍是今天"""
+        api, clock, _ = setup
+        data = DailyForecast(caiyun_daily(days=15, start="2024-05-01"))
+        tzshift = data.tzshift
+        stored_at = clock.now
+        # 两个当地日期之后
+        clock.now = ((stored_at + tzshift) // 86400 + 2) * 86400 - tzshift + 60
+
+        stale = api._as_stale(data, stored_at)
+        assert len(stale) == 13
+        assert stale.date(0) == data.date(2) == "2024-05-03"
+        assert list(stale.temp_max) == list(data.temp_max[2:])
+        assert len(data) == 15 and data.stale_seconds is None, "不应修改缓存中的原始数据"
+
+
+class TestBreakerAccounting:
+    """熔断器只统计上游本身：本地排队时间、本地拒绝、未请求上游的探测不影响熔断"""
+
+    @pytest.mark.asyncio
+    async def test_scheduler_queueing_is_not_slow_call(self, caiyun_daily):
+        """测试大量排队时（排队远超慢调用阈值）熔断器不会打开"""
+        api = WeatherAPI(
+            SharedHTTPClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=caiyun_daily()))),
+            ForecastCache(ttl=1800)
+        )
+        api.limiter = PriorityScheduler(rate=20, burst=1)
+        api.breaker = CircuitBreaker("彩云天气", failure_threshold=2, slow_call_threshold=0.2)
+
+        await asyncio.gather(*(api.get_daily_weather_at(20.0 + i, 100.0 + i) for i in range(12)))
+        assert api.breaker.stats()["slow_calls"] == 0
+        assert api.breaker.state == CircuitBreaker.CLOSED
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_queue_full_is_not_failure(self, caiyun_daily):
+        """测试本地排队已满的拒绝不计为上游失败"""
+        api = WeatherAPI(
+            SharedHTTPClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=caiyun_daily()))),
+            ForecastCache(ttl=1800)
+        )
+        api.limiter = PriorityScheduler(rate=20, burst=1, max_queue={INTERACTIVE: 1})
+        api.breaker = CircuitBreaker("彩云天气", failure_threshold=1)
+
+        results = await asyncio.gather(*(api.get_daily_weather_at(20.0 + i, 100.0 + i) for i in range(4)),
+                                       return_exceptions=True)
+        assert any(isinstance(result, Exception) for result in results)
+        assert api.breaker.stats()["opened"] == 0
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_released_on_shared_hit(self, caiyun_daily):
+        """测试半开探测请求由其他 worker 的共享缓存应答时归还探测名额"""
+        backend = MemoryBackend()
+        calls = {"w0": 0, "w1": 0}
+
+        def make_api(owner: str, delay: float) -> WeatherAPI:
+            async def handler(request: httpx.Request) -> httpx.Response:
+                calls[owner] += 1
+                await asyncio.sleep(delay)
+                return httpx.Response(200, json=caiyun_daily())
+
+            api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache(ttl=1800))
+            api.shared_cache = SharedForecastStore(backend, owner=owner)
+            return api
+
+        clock = FakeClock()
+        probing, other = make_api("w0", 0), make_api("w1", 0.2)
+        probing.breaker = CircuitBreaker("彩云天气", failure_threshold=1, recovery_timeout=30, clock=clock)
+        probing.breaker.record_failure()
+        clock.now += 30
+
+        beijing = CITY_COORDINATES["北京"]
+        fetching = asyncio.create_task(other.get_daily_weather_at(*beijing))
+        await asyncio.sleep(0.05)
+        await probing.get_daily_weather_at(*beijing)
+        await fetching
+
+        assert calls == {"w0": 0, "w1": 1}
+        assert probing.breaker.state == CircuitBreaker.HALF_OPEN
+        assert probing.breaker.allow_request(), "未请求上游的探测应归还名额"
+        await probing.close()
+        await other.close()
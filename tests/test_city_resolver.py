@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+城市名称规范化测试 - 别称、拼音、全角、去后缀、错别字
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.city_resolver import (
+    CityNameResolver, TypoIndex, CITY_ALIASES, CITY_LATIN_NAMES, edit_distance, looks_like_poi, normalize_name
+)
+from mcp_server.gazetteer import Gazetteer
+from mcp_server.weather_mcp_server import AmapGeocoder, SharedHTTPClient, CITY_COORDINATES
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    gazetteer = Gazetteer()
+    yield CityNameResolver(CITY_COORDINATES, {**CITY_ALIASES, **CITY_LATIN_NAMES}, gazetteer)
+    gazetteer.close()
+
+
+class TestHelpers:
+    """工具函数测试"""
+
+    def test_normalize(self):
+        assert normalize_name("ＢＥＩＪＩＮＧ") == "beijing"
+        assert normalize_name(" 上 海 ") == "上海"
+        assert normalize_name("Xi'an") == "xian"
+
+    def test_edit_distance(self):
+        assert edit_distance("哈尔宾", "哈尔滨") == 1
+        assert edit_distance("shangahi", "shanghai") == 2
+        assert edit_distance("", "abc") == 3
+
+    def test_typo_index(self):
+        index = TypoIndex(["shanghai", "shenyang", "乌鲁木齐"])
+        assert index.search("shanghia", 2)[0] == ("shanghai", 2)
+        assert index.search("乌鲁木其", 1) == [("乌鲁木齐", 1)]
+        assert index.search("xiamen", 1) == []
+
+
+class TestCityNameResolver:
+    """名称解析测试"""
+
+    @pytest.mark.parametrize("name, expected", [
+        ("北京市", "北京"),
+        ("beijing", "北京"),
+        ("Shanghai", "上海"),
+        ("沪", "上海"),
+        ("魔都", "上海"),
+        ("ＢＥＩＪＩＮＧ", "北京"),
+        ("Hong Kong", "香港"),
+        ("哈尔宾市", "哈尔滨市"),
+        ("shangahi", "上海"),
+        ("石家装市", "石家庄市"),
+        ("呼和浩忒", "呼和浩特"),
+    ])
+    def test_variants(self, resolver, name, expected):
+        assert resolver.resolve(name) == expected
+
+    def test_gazetteer_names_kept(self, resolver):
+        """测试地名库能解析的名称保持原样"""
+        assert resolver.resolve("北京朝阳") == "北京朝阳"
+        assert resolver.resolve("三亚市") == "三亚市"
+
+    def test_ambiguous_typo_not_corrected(self, resolver):
+        """测试多个同样接近的候选时不纠正（杭州市/株洲市）"""
+        assert resolver.resolve("杭洲市") == "杭洲市"
+
+    @pytest.mark.parametrize("name", ["东京", "武当山", "五台山", "哈尔宾", "石家装"])
+    def test_short_names_not_corrected(self, resolver, name):
+        """测试不足4个字的名称不做模糊匹配（武当山≠武夷山，五台山≠五指山）"""
+        assert resolver.resolve(name) == name
+
+    @pytest.mark.parametrize("name", ["天安门", "徐家汇", "丽江古城", "外滩", "颐和园"])
+    def test_landmarks_not_corrected(self, resolver, name):
+        """测试地标不按删字纠正成相近的城市（天安门≠天门市，徐家汇≠徐汇区）"""
+        assert resolver.resolve(name) == name
+
+    def test_looks_like_poi(self):
+        assert looks_like_poi("天安门") and looks_like_poi("丽江古城") and looks_like_poi("浦东机场")
+        assert not looks_like_poi("古城区") and not looks_like_poi("黄山") and not looks_like_poi("乌鲁木其")
+
+    def test_stats(self):
+        resolver = CityNameResolver(CITY_COORDINATES, CITY_ALIASES)
+        resolver.resolve("沪")
+        resolver.resolve("上海市")
+        resolver.resolve("乌鲁木其")
+        assert resolver.stats() == {"aliased": 1, "suffix_stripped": 1, "corrected": 1}
+
+
+class TestGeocoderResolution:
+    """地理编码前先规范化名称（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_variants_share_local_data(self, amap_geocode):
+        """测试各种写法都命中预定义坐标，不调用高德API"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.params["address"])
+            return httpx.Response(200, json=amap_geocode(116.0, 40.0))
+
+        geocoder = AmapGeocoder(
+            SharedHTTPClient(transport=httpx.MockTransport(handler)),
+            resolver=CityNameResolver(CITY_COORDINATES, {**CITY_ALIASES, **CITY_LATIN_NAMES})
+        )
+        try:
+            assert await geocoder.get_coordinates("Shanghai") == CITY_COORDINATES["上海"]
+            results = await geocoder.get_coordinates_many(["魔都", "北京市", "beijing", "某个小镇"])
+        finally:
+            await geocoder.close()
+
+        assert requests == ["某个小镇"]
+        assert list(results) == ["魔都", "北京市", "beijing", "某个小镇"], "结果以传入的名称为键"
+        assert results["北京市"] == results["beijing"] == CITY_COORDINATES["北京"]
+
+
+class TestLandmarkGeocoding:
+    """地标不被离线地名库拆分匹配到行政区划，交给高德地理编码"""
+
+    @pytest.mark.asyncio
+    async def test_landmarks_go_online(self, resolver, amap_geocode):
+        requested = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requested.append(request.url.params["address"])
+            return httpx.Response(200, json=amap_geocode(116.397128, 39.916527))
+
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)),
+                                gazetteer=resolver.gazetteer, resolver=resolver)
+        try:
+            for name in ["天安门", "丽江古城"]:
+                assert await geocoder.get_coordinates(name) == (39.916527, 116.397128)
+            assert await geocoder.get_coordinates("黄山") is not None
+        finally:
+            await geocoder.close()
+        assert requested == ["天安门", "丽江古城"]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+紧凑结构化输出测试 - JSON / key=value 渲染、工具 format 参数、与文本输出的 token 数对比
+"""
+
+import json
+import re
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.compact_output import render, render_kv, resolve_format
+
+
+def count_tokens(text: str) -> int:
+    """LLM 输入 token 数：优先用 tiktoken 的 cl100k_base 编码，编码文件不可用时按字符类别估算
+
+    估算规则与 cl100k_base 对中文的切分接近：每个汉字/全角标点 1 个，emoji 等其他非 ASCII 字符 2 个，
+    ASCII 部分每个单词、每 3 位数字、每个换行或每 3 个连续符号（如 JSON 的 `":"`）1 个
+    """
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        pass
+    tokens = 0
+    for piece in re.findall(r"[A-Za-z]+|\d{1,3}|\n|[!-/:-@\[-`{-~]{1,3}|[^\x00-\x7f]", text):
+        if piece.isascii():
+            tokens += 1
+        elif "　" <= piece <= "鿿" or "＀" <= piece <= "￯":
+            tokens += 1
+        else:
+            tokens += 2
+    return tokens
+
+
+class TestRender:
+    """渲染测试"""
+
+    def test_json_is_compact(self):
+        payload = {"c": "北京", "stale": None, "days": [{"d": "2024-05-01", "w": "晴天", "lo": 15, "hi": 25}]}
+        assert render(payload, "json") == '{"c":"北京","days":[{"d":"2024-05-01","w":"晴天","lo":15,"hi":25}]}'
+
+    def test_json_table(self):
+        """测试字段相同的多条记录输出为表格"""
+        payload = {"c": "北京", "days": [{"d": "05-01", "lo": 15}, {"d": "05-02", "lo": 16}]}
+        assert render(payload, "json") == '{"c":"北京","days":[["d","lo"],["05-01",15],["05-02",16]]}'
+
+    def test_kv_lines(self):
+        payload = {"c": "北京", "days": [{"d": "2024-05-01", "lo": 15}, {"d": "2024-05-02", "lo": 16}]}
+        assert render_kv(payload) == "c=北京\nd=2024-05-01 lo=15\nd=2024-05-02 lo=16"
+
+    def test_kv_quotes_spaces(self):
+        assert render_kv({"c": "Hong Kong", "pi": 1.5, "aqi": None}) == 'c="Hong Kong" pi=1.5'
+
+    def test_resolve_format(self):
+        assert resolve_format("JSON") == "json"
+        assert resolve_format(None, "kv") == "kv"
+        assert resolve_format("xml", "json") == "text", "无效值回退为文本"
+
+
+@pytest.mark.parametrize("mocked_server", [{"daily": {"skycon": "LIGHT_RAIN"}}], indirect=True)
+class TestCompactTools:
+    """工具 format 参数测试（模拟传输层）"""
+
+    @pytest.fixture
+    def module(self, mocked_server):
+        return mocked_server.module
+
+    @pytest.mark.asyncio
+    async def test_today_json(self, module):
+        result = await module.handle_query_weather_today({"city": "上海", "format": "json"})
+        payload = json.loads(result[0].text)
+        assert payload["c"] == "上海"
+        day = payload["days"][0]
+        assert (day["w"], day["lo"], day["hi"], day["p"], day["h"], day["wl"]) == ("小雨", 15, 25, 10, 60, 3)
+
+    @pytest.mark.asyncio
+    async def test_server_default(self, module, monkeypatch):
+        """测试未传 format 时使用服务器配置，调用参数可覆盖"""
+        monkeypatch.setattr(module, "TOOL_OUTPUT_FORMAT", "kv")
+        kv = await module.handle_query_weather_future_days({"city": "上海", "days": 3})
+        assert kv[0].text.splitlines()[0] == "c=上海"
+        assert len(kv[0].text.splitlines()) == 4
+
+        text = await module.handle_query_weather_future_days({"city": "上海", "days": 3, "format": "text"})
+        assert text[0].text.startswith("📍 上海 未来3天天气预报")
+
+    @pytest.mark.asyncio
+    async def test_now_and_hourly_json(self, module):
+        now = json.loads((await module.handle_query_weather_now({"city": "北京", "format": "json"}))[0].text)
+        assert now == {"c": "北京", "w": "多云", "t": 22, "at": 21, "h": 55, "wl": 3, "aqi": 28}
+
+        hourly = json.loads((await module.handle_query_weather_hourly({"city": "北京", "hours": 3, "format": "json"}))[0].text)
+        assert hourly["kp"] == "未来两小时不会下雨，放心出门吧"
+        assert hourly["hours"][0] == ["tm", "w", "t", "p"] and len(hourly["hours"]) == 4
+
+    @pytest.mark.asyncio
+    async def test_multi_city_json(self, module):
+        result = await module.handle_query_weather_multi_city(
+            {"cities": ["北京", "上海"], "days": 2, "format": "json"}
+        )
+        header, *rows = json.loads(result[0].text)["cities"]
+        assert header == ["c", "days"]
+        assert [row[0] for row in rows] == ["北京", "上海"]
+        assert all(row[1][0] == ["d", "w", "lo", "hi"] and len(row[1]) == 3 for row in rows)
+
+    @pytest.mark.asyncio
+    async def test_token_savings(self, module):
+        """测试紧凑输出的 token 数：单天详情不超过文本的一半，多天列表不超过四分之三"""
+        cities = ["北京", "上海", "广州", "深圳", "杭州"]
+        cases = [
+            (module.handle_query_weather_today, {"city": "北京"}, 0.5),
+            (module.handle_query_weather_now, {"city": "北京"}, 0.5),
+            (module.handle_query_weather_multi_city, {"cities": cities}, 0.5),
+            (module.handle_query_weather_future_days, {"city": "北京", "days": 15}, 0.75),
+            (module.handle_query_weather_multi_city, {"cities": cities, "days": 3}, 0.75),
+        ]
+        for handler, arguments, ratio in cases:
+            text = count_tokens((await handler(arguments))[0].text)
+            for fmt in ("json", "kv"):
+                compact = count_tokens((await handler({**arguments, "format": fmt}))[0].text)
+                assert compact <= text * ratio, f"{handler.__name__} {fmt}: {compact} vs {text}"
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+JSON 解码器测试 - 可选解码器选择与回退、文档示例响应解码
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_json_decode import sample_bytes
+from mcp_server.fast_json import available_decoders, select_decoder
+from mcp_server.forecast_records import DailyForecast
+
+
+class TestSelectDecoder:
+    """解码器选择测试"""
+
+    def test_stdlib_always_available(self):
+        assert available_decoders()[-1] == "json"
+        name, loads = select_decoder("json")
+        assert name == "json"
+        assert loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+    def test_auto_prefers_first_available(self):
+        assert select_decoder("auto")[0] == available_decoders()[0]
+        assert select_decoder("")[0] == available_decoders()[0]
+
+    def test_missing_or_unknown_falls_back(self, monkeypatch):
+        """测试指定的解码器未安装或名称无效时回退到 auto"""
+        from mcp_server import fast_json
+        monkeypatch.setattr(fast_json, "available_decoders", lambda: ("json",))
+        assert fast_json.select_decoder("orjson")[0] == "json"
+        assert fast_json.select_decoder("simdjson")[0] == "json"
+
+
+class TestSampleDecoding:
+    """文档示例响应解码测试"""
+
+    @pytest.mark.parametrize("name", available_decoders())
+    def test_decoders_agree(self, name):
+        """测试各解码器得到相同的记录"""
+        content = sample_bytes()
+        _, loads = select_decoder(name)
+        _, stdlib_loads = select_decoder("json")
+        assert loads(content) == stdlib_loads(content)
+
+        record = DailyForecast(loads(content))
+        assert len(record) == 15
+        assert record.date(0) == "2022-05-26"
+        assert (record.temp_min[0], record.temp_max[0]) == (18, 27)
+        assert record.skycon[0] == "PARTLY_CLOUDY_DAY"
+        assert record.humidity[0] == 9
+        assert record.wind_speed[0] == pytest.approx(21.61)
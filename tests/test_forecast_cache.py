@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+预报缓存测试 - TTL、LRU、内存上限、当地零点失效，以及 15 天预报复用
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.forecast_cache import ForecastCache, next_local_midnight
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient, CAIYUN_MAX_DAILY_STEPS
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestForecastCache:
+    """预报缓存单元测试"""
+
+    def test_ttl_expiry(self):
+        """测试TTL过期"""
+        clock = FakeClock()
+        cache = ForecastCache(ttl=60, clock=clock)
+        cache.set("a", {"v": 1})
+
+        assert cache.get("a") == {"v": 1}
+        clock.now += 61
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """测试超过条目上限时淘汰最久未使用的条目"""
+        cache = ForecastCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # a 变为最近使用
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert "a" in cache and "c" in cache
+        assert cache.stats()["evictions"] == 1
+
+    def test_memory_cap(self):
+        """测试内存上限"""
+        cache = ForecastCache(max_bytes=100)
+        cache.set("a", 1, size=60)
+        cache.set("b", 2, size=60)
+
+        assert "a" not in cache
+        assert cache.total_bytes == 60
+
+        # 单个超大条目不缓存
+        cache.set("huge", 3, size=1000)
+        assert "huge" not in cache
+
+    def test_local_midnight_invalidation(self):
+        """测试条目在当地零点失效"""
+        tzshift = 8 * 3600
+        # 北京时间 23:59:00
+        local_2359 = 19_000 * 86400 + 23 * 3600 + 59 * 60
+        clock = FakeClock(local_2359 - tzshift)
+        cache = ForecastCache(ttl=3600, clock=clock)
+
+        cache.set("beijing", "today", tzshift=tzshift)
+        assert cache.get("beijing") == "today"
+
+        clock.now += 61  # 跨过零点
+        assert cache.get("beijing") is None
+
+    def test_next_local_midnight(self):
+        """测试当地零点计算"""
+        tzshift = 8 * 3600
+        now = 19_000 * 86400 + 3600  # UTC 01:00 = 北京时间 09:00
+        midnight = next_local_midnight(now, tzshift)
+        assert (midnight + tzshift) % 86400 == 0
+        assert 0 < midnight - now <= 86400
+
+
+class TestWeatherAPICache:
+    """天气API缓存集成测试（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_today_and_tomorrow_share_one_fetch(self, caiyun_daily):
+        """测试今天、明天、未来几天的查询只调用一次上游"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, json=caiyun_daily(CAIYUN_MAX_DAILY_STEPS))
+
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache())
+        try:
+            today = await api.get_daily_weather("上海", days=1)
+            tomorrow = await api.get_daily_weather("上海", days=2)
+            future = await api.get_daily_weather("上海", days=7)
+        finally:
+            await api.close()
+
+        assert len(requests) == 1
+        assert requests[0].url.params["dailysteps"] == str(CAIYUN_MAX_DAILY_STEPS)
+        assert today is tomorrow is future
+        assert "上海" in api.format_weather_data(tomorrow, "上海", target_day=1)
+
+    @pytest.mark.asyncio
+    async def test_failed_response_not_cached(self):
+        """测试失败响应不写入缓存"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={"status": "failed"})
+
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache())
+        try:
+            with pytest.raises(Exception, match="天气API返回错误"):
+                await api.get_daily_weather("北京")
+        finally:
+            await api.close()
+
+        assert len(api.forecast_cache) == 0
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+紧凑预报记录测试 - 解码、按天前移、内存占用
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.forecast_records import DailyForecast, HourlyForecast, RealtimeWeather, PART_RECORDS
+
+
+def resident_size(obj, seen=None) -> int:
+    """递归计算 dict/list 结构的常驻内存"""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(resident_size(k, seen) + resident_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(resident_size(v, seen) for v in obj)
+    return size
+
+
+class TestDailyForecast:
+    """逐天预报记录测试"""
+
+    def test_decode_fields(self, caiyun_daily):
+        record = DailyForecast(caiyun_daily(days=3, start="2024-05-01", skycon="LIGHT_RAIN"))
+        assert len(record) == 3
+        assert record.tzshift == 28800
+        assert [record.date(i) for i in range(3)] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+        assert list(record.temp_max) == [25, 26, 27]
+        assert list(record.temp_min) == [15, 16, 17]
+        assert record.skycon == ("LIGHT_RAIN",) * 3
+        assert list(record.rain_prob) == [10] * 3
+        assert list(record.humidity) == [60] * 3
+        assert record.wind_speed[0] == pytest.approx(3.5)
+        assert record.stale_seconds is None
+
+    def test_shifted_copy(self, caiyun_daily):
+        """测试前移返回新记录，原记录不变"""
+        record = DailyForecast(caiyun_daily(days=15, start="2024-05-01"))
+        shifted = record.shifted(2)
+        shifted.stale_seconds = 60
+
+        assert len(shifted) == 13 and shifted.date(0) == "2024-05-03"
+        assert list(shifted.temp_min) == list(record.temp_min[2:])
+        assert len(record) == 15 and record.stale_seconds is None
+
+    def test_no_instance_dict(self, caiyun_daily):
+        """测试记录使用 __slots__，不为每个实例分配 __dict__"""
+        record = DailyForecast(caiyun_daily())
+        assert not hasattr(record, "__dict__")
+        with pytest.raises(AttributeError):
+            record.astro = []
+
+
+class TestBundleRecords:
+    """合并接口各部分记录测试"""
+
+    def test_decode_parts(self, caiyun_weather):
+        data = caiyun_weather(hours=24, start=1_700_000_000)
+        realtime = RealtimeWeather(data)
+        hourly = HourlyForecast(data)
+
+        assert realtime.server_time == 1_700_000_000
+        assert realtime.aqi == 28 and realtime.aqi_description == "优"
+        assert realtime.precipitation_intensity == 0
+        assert len(hourly) == 24
+        assert hourly.times[1] - hourly.times[0] == 3600
+        assert hourly.keypoint == "未来两小时不会下雨，放心出门吧"
+        assert list(hourly.rain_prob[:2]) == [10, 10]
+
+    def test_resident_size(self, caiyun_weather):
+        """测试每部分记录的常驻内存远小于解析后的原始 JSON"""
+        data = caiyun_weather()
+        for part, record_type in PART_RECORDS.items():
+            record = record_type(data)
+            assert record.nbytes() * 5 < resident_size(data["result"][part]), part
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+离线行政区划地名库测试 - 二进制文件读写、简称与上级限定查询、地理编码优先本地解析
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.gazetteer import Gazetteer, build_gazetteer, read_adcode_csv, short_name, PREFECTURE, COUNTY
+from mcp_server.weather_mcp_server import AmapGeocoder, SharedHTTPClient
+
+ROWS = [
+    (110000, "北京市", 39.904211, 116.407394),
+    (110105, "朝阳区", 39.921506, 116.443205),
+    (220000, "吉林省", 43.897016, 125.32568),
+    (220100, "长春市", 43.817072, 125.323544),
+    (220104, "朝阳区", 43.833762, 125.288254),
+    (220200, "吉林市", 43.837883, 126.549572),
+    (422800, "恩施土家族苗族自治州", 30.272156, 109.488172),
+    (460200, "三亚市", 18.253135, 109.511772),
+    (650000, "新疆维吾尔自治区", 43.793026, 87.627704),
+]
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = str(tmp_path / "gazetteer.bin")
+    build_gazetteer(ROWS, path)
+    gazetteer = Gazetteer(path)
+    yield gazetteer
+    gazetteer.close()
+
+
+class TestShortName:
+    """去后缀测试"""
+
+    def test_region_suffixes(self):
+        assert short_name("北京市") == "北京"
+        assert short_name("喀什地区") == "喀什"
+        assert short_name("阿拉善盟") == "阿拉善"
+        assert short_name("杭州") == "杭州", "简称至少保留2个字"
+
+    def test_autonomous_regions(self):
+        assert short_name("新疆维吾尔自治区") == "新疆"
+        assert short_name("恩施土家族苗族自治州") == "恩施"
+        assert short_name("巴音郭楞蒙古自治州") == "巴音郭楞"
+        assert short_name("内蒙古自治区") == "内蒙古"
+        assert short_name("东乡族自治县") == "东乡"
+
+
+class TestGazetteer:
+    """地名库查询测试"""
+
+    def test_lazy_load(self, gazetteer):
+        """测试首次查询前不加载数据文件"""
+        assert gazetteer.stats()["gazetteer_entries"] == 0
+        assert gazetteer.lookup("三亚") is not None
+        assert gazetteer.stats()["gazetteer_entries"] == len(ROWS)
+
+    def test_exact_and_short_names(self, gazetteer):
+        """测试全称和简称"""
+        sanya = gazetteer.lookup("三亚市")
+        assert sanya.adcode == 460200 and sanya.level == PREFECTURE
+        assert sanya.lat == pytest.approx(18.253135)
+        assert gazetteer.lookup("三亚") == sanya
+        assert gazetteer.lookup("恩施州").adcode == 422800
+        assert gazetteer.lookup("新疆").adcode == 650000
+
+    def test_higher_level_wins(self, gazetteer):
+        """测试简称相同时全称优先，其次级别高者优先"""
+        assert gazetteer.lookup("吉林").adcode == 220000
+        assert gazetteer.lookup("吉林市").adcode == 220200
+
+    def test_ambiguous_name_returns_none(self, gazetteer):
+        """测试同名区县视为歧义"""
+        assert gazetteer.lookup("朝阳区") is None
+
+    def test_qualified_names(self, gazetteer):
+        """测试上级限定"""
+        assert gazetteer.lookup("北京市朝阳区").adcode == 110105
+        assert gazetteer.lookup("北京朝阳").adcode == 110105
+        chaoyang = gazetteer.lookup("吉林长春朝阳区")
+        assert chaoyang.adcode == 220104 and chaoyang.level == COUNTY
+
+    def test_street_address_not_resolved(self, gazetteer):
+        """测试详细地址不会被截断成区县"""
+        assert gazetteer.lookup("北京市朝阳区三里屯") is None
+
+    def test_prefix_search(self, gazetteer):
+        """测试前缀查询"""
+        assert [d.name for d in gazetteer.search("吉林")] == ["吉林省", "吉林市"]
+        assert gazetteer.search("上海") == []
+
+    def test_divisions(self, gazetteer):
+        """测试列出所有行政区划"""
+        divisions = gazetteer.divisions()
+        assert len(divisions) == len(ROWS)
+        assert gazetteer.lookup("三亚市") in divisions
+
+    def test_missing_file(self, tmp_path):
+        """测试数据文件缺失时不影响使用"""
+        gazetteer = Gazetteer(str(tmp_path / "missing.bin"))
+        assert gazetteer.lookup("北京") is None
+
+    def test_read_adcode_csv(self, tmp_path):
+        """测试读取12位代码的CSV并跳过占位条目"""
+        path = tmp_path / "adcodes.csv"
+        path.write_text(
+            "adcode,name,longitude,latitude\n"
+            "110000000000,北京市,116.407394,39.904211\n"
+            "110100000000,市辖区,116.407394,39.904211\n"
+            "520301000000,市辖区,,\n",
+            encoding="utf-8"
+        )
+        assert read_adcode_csv(str(path)) == [(110000, "北京市", 39.904211, 116.407394)]
+
+    def test_bundled_data(self):
+        """测试随包附带的全国地名库"""
+        gazetteer = Gazetteer()
+        try:
+            assert len(gazetteer) > 3000
+            assert gazetteer.lookup("义乌").adcode == 330782
+            assert gazetteer.lookup("浙江杭州西湖区").adcode == 330106
+        finally:
+            gazetteer.close()
+
+
+class TestOfflineGeocoding:
+    """地理编码优先使用地名库（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_no_network_for_known_divisions(self, gazetteer, amap_geocode):
+        """测试地名库命中时不调用高德API，未命中时才调用"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.params["address"])
+            return httpx.Response(200, json=amap_geocode(116.443108, 39.921470))
+
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)), gazetteer=gazetteer)
+        try:
+            assert await geocoder.get_coordinates("三亚市") == (18.253135, 109.511772)
+            results = await geocoder.get_coordinates_many(["北京市", "恩施州", "朝阳区"])
+        finally:
+            await geocoder.close()
+
+        assert requests == ["朝阳区"]
+        assert results["恩施州"] == (30.272156, 109.488172)
+        assert geocoder.stats()["gazetteer_hits"] == 3
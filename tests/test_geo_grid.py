@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+坐标量化测试 - geohash、最近锚点索引，以及相邻地点共享预报
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.geo_grid import (
+    NearestPointIndex, LocationQuantizer, geohash_encode, geohash_center, haversine_km
+)
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.weather_mcp_server import AmapGeocoder, WeatherAPI, SharedHTTPClient, CITY_COORDINATES
+
+
+class TestGeoHelpers:
+    """几何工具函数测试"""
+
+    def test_geohash_known_value(self):
+        """测试geohash编码（维基百科示例）"""
+        assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+    def test_geohash_center_roundtrip(self):
+        """测试geohash单元中心落在原单元内"""
+        cell = geohash_encode(39.9042, 116.4074, 5)
+        lat, lon = geohash_center(cell)
+        assert geohash_encode(lat, lon, 5) == cell
+        assert haversine_km(lat, lon, 39.9042, 116.4074) < 5
+
+    def test_haversine(self):
+        """测试北京到上海距离约1070公里"""
+        assert 1000 < haversine_km(*CITY_COORDINATES["北京"], *CITY_COORDINATES["上海"]) < 1100
+
+
+class TestNearestPointIndex:
+    """最近锚点索引测试"""
+
+    def test_nearby_points_share_anchor(self):
+        """测试半径内的地点归并到已有锚点"""
+        index = NearestPointIndex(radius_km=10)
+        beijing = index.add(39.9042, 116.4074)
+        chaoyang = index.add(39.9215, 116.4431)   # 朝阳区，约3.5公里
+
+        assert chaoyang == beijing
+        assert len(index) == 1
+
+        tianjin = index.add(39.3434, 117.3616)
+        assert tianjin == (39.3434, 117.3616)
+        assert len(index) == 2
+
+    def test_high_latitude_neighbors(self):
+        """测试高纬度地区经度方向的邻近查找"""
+        index = NearestPointIndex(radius_km=10)
+        index.add(60.0, 100.0)
+        # 纬度60度时经度0.15度约8.3公里
+        assert index.nearest(60.0, 100.15) == (60.0, 100.0)
+        assert index.nearest(60.0, 100.3) is None
+
+    def test_disabled(self):
+        """测试半径为0时不归并"""
+        index = NearestPointIndex(radius_km=0)
+        index.add(39.9, 116.4)
+        assert index.nearest(39.9, 116.4) is None
+
+
+class TestLocationQuantizer:
+    """坐标量化测试"""
+
+    def test_grid_cells(self):
+        """测试同一网格单元内的坐标得到相同的键"""
+        quantizer = LocationQuantizer("grid", step=0.05)
+        key1, center1 = quantizer.quantize(30.01, 120.01)
+        key2, center2 = quantizer.quantize(30.04, 120.04)
+        key3, _ = quantizer.quantize(30.06, 120.01)
+
+        assert key1 == key2 != key3
+        assert center1 == center2 == (30.025, 120.025)
+
+    def test_geohash_mode(self):
+        """测试geohash模式"""
+        quantizer = LocationQuantizer("geohash", precision=5)
+        key, _ = quantizer.quantize(39.9042, 116.4074)
+        assert key == "gh:" + geohash_encode(39.9042, 116.4074, 5)
+
+    def test_anchor_takes_priority(self):
+        """测试半径内的已知地点优先于网格"""
+        index = NearestPointIndex(radius_km=10)
+        index.add(*CITY_COORDINATES["北京"])
+        quantizer = LocationQuantizer("grid", step=0.05, index=index)
+
+        key, point = quantizer.quantize(39.9215, 116.4431)
+        assert point == CITY_COORDINATES["北京"]
+        assert quantizer.snapped == 1
+
+    @pytest.mark.asyncio
+    async def test_keys_independent_of_geocoding_history(self, amap_geocode):
+        """测试地理编码结果不成为锚点：同一坐标在任何进程、任何查询顺序下得到相同的缓存键"""
+        def build():
+            index = NearestPointIndex(radius_km=5)
+            for coordinates in CITY_COORDINATES.values():
+                index.add(*coordinates)
+            return index, LocationQuantizer("grid", step=0.05, index=index)
+
+        index, warmed = build()
+        http = SharedHTTPClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, json=amap_geocode(120.0123, 30.0123))
+        ))
+        geocoder = AmapGeocoder(http)
+        try:
+            await geocoder.get_coordinates("某个小镇")
+        finally:
+            await geocoder.close()
+
+        _, fresh = build()
+        assert warmed.quantize(30.0150, 120.0150) == fresh.quantize(30.0150, 120.0150)
+        assert warmed.quantize(30.0150, 120.0150)[0].startswith("grid:")
+
+    def test_default_radius_within_grid_step(self):
+        """测试默认归并半径不超过网格步长"""
+        from mcp_server.geo_grid import KM_PER_DEGREE
+        from mcp_server.weather_mcp_server import FORECAST_GRID_STEP, FORECAST_SNAP_RADIUS_KM
+        assert FORECAST_SNAP_RADIUS_KM <= FORECAST_GRID_STEP * KM_PER_DEGREE
+
+    def test_invalid_mode(self):
+        """测试不支持的模式"""
+        with pytest.raises(ValueError):
+            LocationQuantizer("hexagon")
+
+
+class TestSharedForecasts:
+    """相邻地点共享预报（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_district_and_city_share_one_fetch(self, caiyun_daily, amap_geocode):
+        """测试"朝阳区"、"北京市"、"北京"只请求一次彩云API"""
+        caiyun_urls = []
+        district = {"朝阳区": (116.443108, 39.921470), "北京市": (116.407387, 39.904179)}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if "geocode" in request.url.path:
+                return httpx.Response(200, json=amap_geocode(*district[request.url.params["address"]]))
+            caiyun_urls.append(str(request.url))
+            return httpx.Response(200, json=caiyun_daily())
+
+        http = SharedHTTPClient(transport=httpx.MockTransport(handler))
+        index = NearestPointIndex(radius_km=10)
+        for coordinates in CITY_COORDINATES.values():
+            index.add(*coordinates)
+        geocoder = AmapGeocoder(http)
+        api = WeatherAPI(http, ForecastCache(), LocationQuantizer("grid", index=index))
+        api.get_coordinates = geocoder.get_coordinates
+
+        try:
+            for city in ("朝阳区", "北京市", "北京"):
+                await api.get_daily_weather(city)
+        finally:
+            await api.close()
+
+        assert len(caiyun_urls) == 1
+        assert "116.4074,39.9042" in caiyun_urls[0], "应使用锚点坐标请求"
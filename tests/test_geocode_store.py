@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+持久化地理编码缓存测试 - SQLite 存储、TTL、淘汰、旧版表迁移以及与高德客户端的集成
+"""
+
+import pytest
+import sqlite3
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.cache_backends import MemoryBackend
+from mcp_server.geocode_store import GeocodeStore, create_geocode_backend
+from mcp_server.weather_mcp_server import AmapGeocoder, SharedHTTPClient
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestGeocodeStore:
+    """GeocodeStore 单元测试"""
+
+    def test_survives_restart(self, tmp_path):
+        """测试关闭后重新打开仍能读取（模拟进程重启）"""
+        path = str(tmp_path / "geo.sqlite3")
+        store = GeocodeStore(path)
+        store.set("三亚", (18.252847, 109.511909))
+        store.close()
+
+        reopened = GeocodeStore(path)
+        assert reopened.get("三亚") == (18.252847, 109.511909)
+        assert reopened.get("桂林") is None
+        assert reopened.stats() == {"store_hits": 1, "store_misses": 1}
+        reopened.close()
+
+    def test_lazy_open(self, tmp_path):
+        """测试数据库在首次使用时才创建"""
+        path = tmp_path / "sub" / "geo.sqlite3"
+        store = GeocodeStore(str(path))
+        assert not path.exists()
+        store.get("三亚")
+        assert path.exists()
+        store.close()
+
+    def test_ttl(self, tmp_path):
+        """测试过期条目视为未命中"""
+        clock = FakeClock()
+        store = GeocodeStore(str(tmp_path / "geo.sqlite3"), ttl=3600, clock=clock)
+        store.set("三亚", (18.25, 109.51))
+
+        clock.now += 3599
+        assert store.get("三亚") is not None
+        clock.now += 2
+        assert store.get("三亚") is None
+        store.close()
+
+    def test_size_bounded_eviction(self, tmp_path):
+        """测试超过条目上限时淘汰最旧的条目"""
+        clock = FakeClock()
+        store = GeocodeStore(str(tmp_path / "geo.sqlite3"), max_entries=3, clock=clock)
+        for i, name in enumerate(["a", "b", "c", "d", "e"]):
+            clock.now += 1
+            store.set(name, (float(i), float(i)))
+
+        assert len(store) == 3
+        assert store.get("a") is None and store.get("b") is None
+        assert store.get("e") == (4.0, 4.0)
+        store.close()
+
+    def test_shared_between_instances(self, tmp_path):
+        """测试多个实例（多个进程）共享同一个数据库文件"""
+        path = str(tmp_path / "geo.sqlite3")
+        writer = GeocodeStore(path)
+        reader = GeocodeStore(path)
+
+        reader.get("桂林")  # 先打开连接
+        writer.set("桂林", (25.27, 110.29))
+        assert reader.get("桂林") == (25.27, 110.29)
+
+        writer.close()
+        reader.close()
+
+
+    def test_ttl_change_applies_to_existing_entries(self, tmp_path):
+        """测试 TTL 按写入时间计算，修改 TTL 后重新打开对已有条目同样生效"""
+        path = str(tmp_path / "geo.sqlite3")
+        clock = FakeClock()
+        store = GeocodeStore(path, clock=clock)
+        store.set("三亚", (18.25, 109.51))
+        store.close()
+
+        clock.now += 7200
+        shorter = GeocodeStore(path, ttl=3600, clock=clock)
+        assert shorter.get("三亚") is None
+        shorter.close()
+
+        unlimited = GeocodeStore(path, clock=clock)
+        assert unlimited.get("三亚") == (18.25, 109.51)
+        unlimited.close()
+
+
+class TestLegacyMigration:
+    """旧版 geocodes(name, lat, lon, updated_at) 表的迁移"""
+
+    @staticmethod
+    def _write_legacy(path, rows):
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE geocodes (name TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.executemany("INSERT INTO geocodes VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    def test_imports_and_drops_legacy_table(self, tmp_path):
+        path = str(tmp_path / "geo.sqlite3")
+        clock = FakeClock()
+        self._write_legacy(path, [
+            ("三亚", 18.252847, 109.511909, clock.now - 100),
+            ("桂林", 25.273566, 110.290195, clock.now - 7200),
+        ])
+
+        store = GeocodeStore(path, ttl=3600, clock=clock)
+        assert store.get("三亚") == (18.252847, 109.511909)
+        assert store.get("桂林") is None, "按旧表的写入时间计算过期"
+        store.close()
+
+        conn = sqlite3.connect(path)
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        assert tables == {"geocode_cache"}
+
+    def test_existing_entries_win(self, tmp_path):
+        """新表中已有的条目不被旧表覆盖"""
+        path = str(tmp_path / "geo.sqlite3")
+        store = GeocodeStore(path)
+        store.set("三亚", (18.3, 109.5))
+        store.close()
+        self._write_legacy(path, [("三亚", 0.0, 0.0, 0.0)])
+
+        reopened = GeocodeStore(path)
+        assert reopened.get("三亚") == (18.3, 109.5)
+        reopened.close()
+
+
+class TestCreateGeocodeBackend:
+    """按 GEOCODE_CACHE_BACKEND 创建地理编码缓存"""
+
+    def test_sqlite_uses_geocode_store(self, tmp_path):
+        path = str(tmp_path / "geo.sqlite3")
+        assert isinstance(create_geocode_backend("sqlite", path), GeocodeStore)
+        custom = create_geocode_backend(f"sqlite:///{tmp_path}/custom.sqlite3", path, ttl=60)
+        assert isinstance(custom, GeocodeStore) and custom.path == f"{tmp_path}/custom.sqlite3" and custom.ttl == 60
+        assert create_geocode_backend("sqlite", "") is None
+        assert isinstance(create_geocode_backend("memory", path), MemoryBackend)
+        assert create_geocode_backend("none", path) is None
+
+
+class TestGeocoderWithStore:
+    """高德客户端与持久化缓存集成测试"""
+
+    @pytest.mark.asyncio
+    async def test_store_checked_before_network(self, tmp_path, amap_geocode):
+        """测试重启后直接命中持久化缓存，不再调用高德API"""
+        path = str(tmp_path / "geo.sqlite3")
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json=amap_geocode(110.290195, 25.273566))
+
+        transport = httpx.MockTransport(handler)
+
+        first = AmapGeocoder(SharedHTTPClient(transport=transport), GeocodeStore(path))
+        assert await first.get_coordinates("桂林") == (25.273566, 110.290195)
+        await first.close()
+
+        # 新实例内存缓存为空，相当于服务器重启
+        second = AmapGeocoder(SharedHTTPClient(transport=transport), GeocodeStore(path))
+        assert await second.get_coordinates("桂林") == (25.273566, 110.290195)
+        assert "桂林" in second.coord_cache
+        await second.close()
+
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_predefined_cities_skip_store(self, tmp_path):
+        """测试预定义城市不读写持久化缓存"""
+        store = GeocodeStore(str(tmp_path / "geo.sqlite3"))
+        geocoder = AmapGeocoder(SharedHTTPClient(), store)
+
+        assert await geocoder.get_coordinates("北京") == (39.9042, 116.4074)
+        assert store.stats() == {"store_hits": 0, "store_misses": 0}
+        await geocoder.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Streamable HTTP 传输测试 - 多个会话共享同一个服务器实例、会话上限、服务器重启后重连、命令行参数
+"""
+
+import pytest
+import asyncio
+import socket
+import sys
+import os
+
+import httpx
+import uvicorn
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from autogen_core import CancellationToken
+from autogen_ext.tools.mcp import StreamableHttpServerParams
+from mcp_server.http_transport import create_http_app
+from mcp_server.weather_mcp_server import server, parse_args
+from mcp_session import McpSessionPool, PooledStreamableHttpMcpToolAdapter, pooled_mcp_tools
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RunningServer:
+    """在当前事件循环中运行的 HTTP 服务器"""
+
+    def __init__(self, port: int, **kwargs):
+        self.port = port
+        self.kwargs = kwargs
+        self.url = f"http://127.0.0.1:{port}/mcp"
+        self._server = None
+        self._task = None
+
+    async def start(self):
+        config = uvicorn.Config(create_http_app(server, **self.kwargs), host="127.0.0.1", port=self.port,
+                                log_level="warning", lifespan="on")
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        self._server.should_exit = True
+        await self._task
+
+
+@pytest.fixture
+async def http_server():
+    running = RunningServer(free_port())
+    await running.start()
+    yield running
+    await running.stop()
+
+
+def make_pool(url: str, size: int = 1) -> McpSessionPool:
+    return McpSessionPool(StreamableHttpServerParams(url=url, timeout=5), size=size)
+
+
+class TestStreamableHttpTransport:
+    """HTTP 传输测试（本机回环地址，工具不访问上游）"""
+
+    @pytest.mark.asyncio
+    async def test_many_sessions_share_server(self, http_server):
+        """测试多个代理会话并发调用同一个服务器"""
+        pools = [make_pool(http_server.url) for _ in range(10)]
+        try:
+            results = await asyncio.gather(*(pool.call_tool("get_supported_cities") for pool in pools))
+            assert all("北京" in result.content[0].text for result in results)
+            tools = await pools[0].list_tools()
+            assert "query_weather_today" in [tool.name for tool in tools]
+        finally:
+            for pool in pools:
+                await pool.close()
+
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"http://127.0.0.1:{http_server.port}/healthz")
+        assert response.text == "ok"
+
+    @pytest.mark.asyncio
+    async def test_tool_adapters_over_http(self, http_server):
+        """测试代理工具适配器通过 HTTP 会话调用"""
+        pool = make_pool(http_server.url)
+        try:
+            tools = {tool.name: tool for tool in await pooled_mcp_tools(pool)}
+            cities = tools["get_supported_cities"]
+            assert isinstance(cities, PooledStreamableHttpMcpToolAdapter)
+            result = await cities.run_json({}, CancellationToken())
+            assert "上海" in result[0].text
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_session_limit(self):
+        """测试并发会话数达到上限后新会话被拒绝，已有会话不受影响"""
+        running = RunningServer(free_port(), max_sessions=1)
+        await running.start()
+        first, second = make_pool(running.url), make_pool(running.url)
+        try:
+            await first.call_tool("get_supported_cities")
+            with pytest.raises(Exception):
+                await second.call_tool("get_supported_cities")
+            assert not (await first.call_tool("get_supported_cities")).isError
+        finally:
+            await first.close()
+            await second.close()
+            await running.stop()
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_server_restart(self):
+        """测试服务器重启后旧会话失效，会话池重新初始化并重试"""
+        port = free_port()
+        running = RunningServer(port)
+        await running.start()
+        pool = make_pool(running.url)
+        try:
+            await pool.call_tool("get_supported_cities")
+            await running.stop()
+            running = RunningServer(port)
+            await running.start()
+
+            result = await pool.call_tool("get_supported_cities")
+            assert "北京" in result.content[0].text
+            assert pool.stats()["reconnects"] == 1
+        finally:
+            await pool.close()
+            await running.stop()
+
+
+class TestCommandLine:
+    """命令行参数测试"""
+
+    def test_transport_flag(self):
+        args = parse_args(["--transport", "http", "--port", "9000"])
+        assert (args.transport, args.port) == ("http", 9000)
+        assert parse_args([]).transport == "stdio"
+        with pytest.raises(SystemExit):
+            parse_args(["--transport", "tcp"])
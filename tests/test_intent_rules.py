@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+规则意图解析测试 - 准确率语料、置信度与回退、命中率统计、先规则后 LLM 的意图解析代理
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import TextMessage
+from autogen_core import CancellationToken
+
+from intent_rules import RuleIntentParser, RuleFirstIntentAgent
+from mcp_server.city_resolver import CITY_ALIASES, CITY_LATIN_NAMES
+from mcp_server.gazetteer import Gazetteer
+from weather_agents import create_rule_intent_parser
+
+# 常见句式语料：(查询, 城市, 时间)
+CORPUS = [
+    ("今天天气怎么样？", "北京", "today"),
+    ("上海明天天气", "上海", "tomorrow"),
+    ("明天深圳天气", "深圳", "tomorrow"),
+    ("帮我查一下南京明天的天气", "南京", "tomorrow"),
+    ("请问广州今天会下雨吗", "广州", "today"),
+    ("北京市今天多少度", "北京", "today"),
+    ("魔都明天会下雨吗", "上海", "tomorrow"),
+    ("羊城今天热不热", "广州", "today"),
+    ("成都后天冷不冷", "成都", "future"),
+    ("广州未来5天天气", "广州", "future"),
+    ("三亚未来三天天气怎么样", "三亚", "future"),
+    ("武汉最近几天天气", "武汉", "future"),
+    ("杭州这周末天气如何", "杭州", "future"),
+    ("天津明后天天气", "天津", "future"),
+    ("重庆下周天气预报", "重庆", "future"),
+    ("西安一周天气", "西安", "future"),
+    ("东莞现在气温", "东莞", "today"),
+    ("桂林今晚会下雨吗", "桂林", "today"),
+    ("明天要带伞吗", "北京", "tomorrow"),
+    ("上海天气", "上海", "today"),
+    ("苏州市明天天气", "苏州", "tomorrow"),
+    ("恩施州明天天气", "恩施", "tomorrow"),
+    ("明天北京天气怎么样，要穿什么", "北京", "tomorrow"),
+    ("哈尔滨明天冷吗？", "哈尔滨", "tomorrow"),
+    ("乌鲁木齐今天的气温", "乌鲁木齐", "today"),
+    ("看看厦门明天的天气预报", "厦门", "tomorrow"),
+    ("ＳＨＡＮＧＨＡＩ 明天 天气", "上海", "tomorrow"),
+    ("beijing weather tomorrow", "北京", "tomorrow"),
+    ("大理明天下雪吗", "大理", "tomorrow"),
+    ("青岛明天风大不大", "青岛", "tomorrow"),
+    ("东方市明天天气", "东方市", "tomorrow"),
+    ("海南省今天天气", "海南省", "today"),
+]
+
+# 应交给 LLM 的查询：多个城市、时间冲突、有歧义的地名、省和区县的简称、无法解释的内容、与天气无关
+FALLBACK = [
+    "北京和上海明天天气",
+    "今天和后天的天气",
+    "朝阳区明天天气",
+    "北京昨天天气",
+    "黄山风景区明天天气",
+    "江南明天下雨吗",
+    "东方明天天气",
+    "海南明天天气",
+    "北京明天适合跑步吗",
+    "下周三去苏州出差，天气如何",
+    "写一首诗",
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    gazetteer = Gazetteer()
+    yield gazetteer
+    gazetteer.close()
+
+
+@pytest.fixture
+def parser(gazetteer):
+    return RuleIntentParser(CITY_LATIN_NAMES.values(), {**CITY_ALIASES, **CITY_LATIN_NAMES}, gazetteer)
+
+
+class TestRuleIntentParser:
+    """规则解析准确率与回退"""
+
+    def test_corpus_accuracy(self, parser):
+        """常见句式全部在本地解析，且城市和时间与预期一致"""
+        wrong = []
+        for query, city, time in CORPUS:
+            intent = parser.try_parse(query)
+            if intent is None or (intent.city, intent.time) != (city, time):
+                wrong.append((query, intent))
+        assert wrong == []
+        assert parser.stats() == {"rule_hits": len(CORPUS), "rule_fallbacks": 0, "rule_hit_rate": 1.0}
+
+    @pytest.mark.parametrize("query", FALLBACK)
+    def test_low_confidence_falls_back(self, parser, query):
+        assert parser.try_parse(query) is None
+        assert parser.stats()["rule_fallbacks"] == 1
+
+    def test_output_format(self, parser):
+        """输出与意图解析代理的格式一致，查询描述保留原时间表达"""
+        assert parser.try_parse("上海明天天气").format() == "城市：上海\n时间：tomorrow\n查询：查询上海明天的天气"
+        assert parser.try_parse("广州未来5天天气").query == "查询广州未来5天的天气"
+        assert parser.try_parse("东莞现在气温").query == "查询东莞现在的天气"
+
+    def test_confidence_threshold(self, gazetteer):
+        """阈值调低后，少量无法解释的字符也在本地解析"""
+        strict = RuleIntentParser(["北京"], gazetteer=gazetteer)
+        loose = RuleIntentParser(["北京"], gazetteer=gazetteer, min_confidence=0.8)
+        query = "下周三去苏州出差，天气如何"
+        assert 0.8 <= strict.parse(query).confidence < 0.9
+        assert strict.try_parse(query) is None
+        assert loose.try_parse(query).city == "苏州"
+
+    def test_without_gazetteer(self):
+        """未配置地名库时只识别内置城市和别称"""
+        parser = RuleIntentParser(["北京", "上海"], {"魔都": "上海"})
+        assert parser.try_parse("魔都明天天气").city == "上海"
+        assert parser.try_parse("桂林明天天气") is None
+
+    def test_default_factory(self):
+        parser = create_rule_intent_parser()
+        assert parser.try_parse("上海明天天气").city == "上海"
+
+
+class FakeIntentAgent(BaseChatAgent):
+    """模拟 LLM 意图解析代理，记录调用次数"""
+
+    def __init__(self):
+        super().__init__("intent_parser", "解析用户的天气查询意图")
+        self.calls = 0
+
+    @property
+    def produced_message_types(self):
+        return (TextMessage,)
+
+    async def on_messages(self, messages, cancellation_token):
+        self.calls += 1
+        return Response(chat_message=TextMessage(content="城市：北京\n时间：today\n查询：LLM", source=self.name))
+
+    async def on_reset(self, cancellation_token):
+        pass
+
+
+class TestRuleFirstIntentAgent:
+    """先规则后 LLM 的意图解析代理"""
+
+    @pytest.mark.asyncio
+    async def test_rules_skip_llm(self, parser):
+        fallback = FakeIntentAgent()
+        agent = RuleFirstIntentAgent(parser, fallback)
+        assert agent.name == "intent_parser"
+
+        response = await agent.on_messages(
+            [TextMessage(content="上海明天天气", source="user")], CancellationToken()
+        )
+        assert response.chat_message.content.startswith("城市：上海\n时间：tomorrow")
+        assert response.chat_message.source == "intent_parser"
+        assert fallback.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_low_confidence_uses_llm(self, parser):
+        fallback = FakeIntentAgent()
+        agent = RuleFirstIntentAgent(parser, fallback)
+
+        items = [item async for item in agent.on_messages_stream(
+            [TextMessage(content="北京和上海明天天气", source="user")], CancellationToken()
+        )]
+        assert items[-1].chat_message.content.endswith("LLM")
+        assert fallback.calls == 1
+        assert parser.stats()["rule_fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_only_user_messages_parsed(self, parser):
+        """非用户消息（如其他代理的输出）交给 LLM 代理处理"""
+        fallback = FakeIntentAgent()
+        agent = RuleFirstIntentAgent(parser, fallback)
+        await agent.on_messages([TextMessage(content="上海明天天气", source="formatter")], CancellationToken())
+        assert fallback.calls == 1
@@ -18,6 +18,7 @@ from mcp_server.weather_mcp_server import (
     handle_query_weather_future_days,
     handle_get_supported_cities,
     handle_get_city_coordinates,
+    handle_get_cities_coordinates,
     server
 )
 
@@ -131,6 +132,20 @@ class TestMCPWeatherTools:
         else:  # 如果API调用失败
             assert "未找到城市" in content or "获取" in content and "坐标失败" in content
     
+    @pytest.mark.asyncio
+    async def test_get_cities_coordinates_tool(self):
+        """测试批量获取城市坐标工具"""
+        result = await handle_get_cities_coordinates({"cities": ["北京", "上海"]})
+        assert len(result) == 1
+        content = result[0].text
+        
+        assert "北京：39.9042,116.4074" in content
+        assert "上海：31.2304,121.4737" in content
+        
+        # 空列表应返回错误提示
+        result = await handle_get_cities_coordinates({"cities": []})
+        assert "❌" in result[0].text
+    
     @pytest.mark.asyncio
     async def test_invalid_city_handling(self):
         """测试无效城市处理"""
@@ -301,4 +316,112 @@ async def test_mcp_tools_integration():
     
     # 所有工具都应该能正常工作
     assert "❌" not in cities_content
-    # 坐标和天气查询可能因为网络问题失败，所以不强制要求无错误
\ No newline at end of file
+    # 坐标和天气查询可能因为网络问题失败，所以不强制要求无错误
+
+
+class TestMultiCityWeather:
+    """多城市天气查询测试（使用模拟传输层，不访问网络）"""
+    
+    @pytest.mark.asyncio
+    async def test_multi_city_tomorrow(self, mocked_server):
+        """测试一次调用返回多个城市明天的天气，并逐个发送进度"""
+        module, progress = mocked_server.module, mocked_server.progress
+        
+        result = await module.handle_query_weather_multi_city(
+            {"cities": ["北京", "上海", "广州", "北京"], "start_day": 1}
+        )
+        content = result[0].text
+        
+        assert len(mocked_server.requests["caiyun"]) == 3, "重复城市只查询一次"
+        blocks = content.split("\n\n")
+        assert [b.split()[1] for b in blocks] == ["北京", "上海", "广州"], "结果应保持请求顺序"
+        assert all("🌤️" in b for b in blocks)
+        
+        assert [p[0] for p in progress] == [1, 2, 3]
+        assert all(p[1] == 3 for p in progress)
+    
+    @pytest.mark.asyncio
+    async def test_multi_city_day_range(self, mocked_server):
+        """测试多天范围输出"""
+        module = mocked_server.module
+        
+        result = await module.handle_query_weather_multi_city({"cities": ["北京", "上海"], "days": 3})
+        content = result[0].text
+        
+        assert "📍 北京 第1~3天天气预报" in content
+        assert content.count("📅") == 6
+    
+    @pytest.mark.asyncio
+    async def test_multi_city_empty(self, mocked_server):
+        """测试空城市列表"""
+        module = mocked_server.module
+        result = await module.handle_query_weather_multi_city({"cities": []})
+        assert "❌" in result[0].text
+    
+    @pytest.mark.parametrize("arguments", [
+        {"start_day": "abc"}, {"start_day": -1}, {"start_day": 15},
+        {"days": None}, {"days": 0}, {"days": 16}, {"start_day": 10, "days": 6},
+    ])
+    @pytest.mark.asyncio
+    async def test_invalid_day_range(self, mocked_server, arguments):
+        """测试起始天或天数不是整数、超出预报范围时返回错误信息，不请求上游"""
+        module = mocked_server.module
+        result = await module.handle_query_weather_multi_city({"cities": ["北京", "上海"], **arguments})
+        assert result[0].text.startswith("❌ 参数")
+        assert mocked_server.requests["caiyun"] == []
+
+
+class TestLocationWeather:
+    """按坐标查询天气与逆地理编码测试（使用模拟传输层，不访问网络）"""
+    
+    @pytest.mark.asyncio
+    async def test_weather_by_location_skips_geocoding(self, mocked_server):
+        """测试按坐标查询不调用地理编码，并显示逆地理编码得到的地名"""
+        module, requests = mocked_server.module, mocked_server.requests
+        
+        result = await module.handle_query_weather_by_location({"lat": 39.9365, "lon": 116.4551})
+        content = result[0].text
+        
+        assert "📍 北京市朝阳区三里屯街道（39.9365,116.4551）" in content
+        assert "🌤️" in content
+        assert requests["geo"] == [], "不应调用正向地理编码"
+        assert len(requests["caiyun"]) == 1
+    
+    @pytest.mark.asyncio
+    async def test_weather_by_location_days(self, mocked_server):
+        """测试多天输出"""
+        module = mocked_server.module
+        result = await module.handle_query_weather_by_location({"lat": 39.9365, "lon": 116.4551, "days": 3})
+        assert "未来3天天气预报" in result[0].text
+        assert result[0].text.count("📅") == 3
+    
+    @pytest.mark.asyncio
+    async def test_reverse_geocode_cached_by_grid_cell(self, mocked_server):
+        """测试同一网格单元内的坐标共用逆地理编码结果"""
+        module, requests = mocked_server.module, mocked_server.requests
+        
+        first = await module.handle_reverse_geocode({"lat": 39.9361, "lon": 116.4552})
+        second = await module.handle_reverse_geocode({"lat": 39.9368, "lon": 116.4559})
+        
+        assert "北京市朝阳区三里屯街道" in first[0].text
+        assert "110105" in first[0].text
+        assert second[0].text.split("位于：")[1] == first[0].text.split("位于：")[1]
+        assert len(requests["regeo"]) == 1
+        assert requests["regeo"][0].url.params["location"] == "116.455200,39.936100"
+    
+    @pytest.mark.asyncio
+    async def test_invalid_coordinates(self, mocked_server):
+        """测试缺失或超出范围的坐标"""
+        module, requests = mocked_server.module, mocked_server.requests
+        assert "❌" in (await module.handle_query_weather_by_location({"lat": 39.9}))[0].text
+        assert "❌" in (await module.handle_reverse_geocode({"lat": 91, "lon": 116.4}))[0].text
+        assert requests["caiyun"] == [] and requests["regeo"] == []
+    
+    @pytest.mark.parametrize("days", ["abc", None, 2.5, 0, 16])
+    @pytest.mark.asyncio
+    async def test_invalid_days(self, mocked_server, days):
+        """测试天数不是整数或超出范围时返回错误信息，不请求上游"""
+        module, requests = mocked_server.module, mocked_server.requests
+        result = await module.handle_query_weather_by_location({"lat": 39.9365, "lon": 116.4551, "days": days})
+        assert result[0].text.startswith("❌ 参数 days")
+        assert requests["caiyun"] == [] and requests["regeo"] == []
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+MCP 会话池测试 - 常驻服务器进程、断开后重连、关闭时终止进程、工具适配器
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+import textwrap
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from autogen_core import CancellationToken
+from autogen_ext.tools.mcp import StdioServerParams
+from mcp_session import McpSessionPool, pooled_mcp_tools
+
+# 最小 MCP 服务器：pid 返回进程号，crash 直接退出进程，fail 返回工具错误
+FAKE_SERVER = textwrap.dedent('''
+    import asyncio, os
+    from mcp.server import Server
+    from mcp.server.stdio import stdio_server
+    from mcp.types import Tool, TextContent
+
+    server = Server("fake")
+
+    @server.list_tools()
+    async def list_tools():
+        schema = {"type": "object", "properties": {}}
+        return [Tool(name=name, description=name, inputSchema=schema) for name in ("pid", "crash", "fail")]
+
+    @server.call_tool()
+    async def call_tool(name, arguments):
+        if name == "crash":
+            os._exit(1)
+        if name == "fail":
+            raise ValueError("tool failed")
+        return [TextContent(type="text", text=str(os.getpid()))]
+
+    async def main():
+        async with stdio_server() as streams:
+            await server.run(streams[0], streams[1], server.create_initialization_options())
+
+    asyncio.run(main())
+''')
+
+
+@pytest.fixture
+def server_params(tmp_path):
+    script = tmp_path / "fake_server.py"
+    script.write_text(FAKE_SERVER, encoding="utf-8")
+    return StdioServerParams(command=sys.executable, args=[str(script)], read_timeout_seconds=10)
+
+
+async def call_pid(pool: McpSessionPool) -> str:
+    return (await pool.call_tool("pid")).content[0].text
+
+
+class TestMcpSessionPool:
+    """会话池测试（本地 stdio 服务器）"""
+
+    @pytest.mark.asyncio
+    async def test_calls_share_one_process(self, server_params):
+        """测试多次调用复用同一个服务器进程"""
+        pool = McpSessionPool(server_params)
+        try:
+            pids = {await call_pid(pool) for _ in range(5)}
+            concurrent = set(await asyncio.gather(*(call_pid(pool) for _ in range(5))))
+            assert len(pids) == 1 and concurrent == pids
+            assert pool.stats() == {"alive": 1, "size": 1, "calls": 10, "reconnects": 0}
+        finally:
+            await pool.close()
+        assert pool.stats()["alive"] == 0
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_process_exit(self, server_params):
+        """测试服务器进程退出后自动重连，断开导致失败的调用重试一次"""
+        pool = McpSessionPool(server_params)
+        try:
+            first = await call_pid(pool)
+            with pytest.raises(Exception):
+                # crash 本身在重试时仍会让新进程退出，第二次失败后抛出
+                await pool.call_tool("crash")
+            assert pool.stats()["reconnects"] >= 1
+
+            second = await call_pid(pool)
+            assert second != first
+            assert await call_pid(pool) == second
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_tool_errors_not_retried(self, server_params):
+        pool = McpSessionPool(server_params)
+        try:
+            pid = await call_pid(pool)
+            result = await pool.call_tool("fail")
+            assert result.isError
+            assert await call_pid(pool) == pid
+            assert pool.stats()["reconnects"] == 0
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_pool_spreads_sessions(self, server_params):
+        """测试多个会话时并发调用分散到不同进程"""
+        pool = McpSessionPool(server_params, size=2)
+        try:
+            await pool.start()
+            assert pool.stats()["alive"] == 2
+            pids = set(await asyncio.gather(*(call_pid(pool) for _ in range(4))))
+            assert len(pids) == 2
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_tool_adapters(self, server_params):
+        """测试 autogen 工具适配器经由会话池调用"""
+        pool = McpSessionPool(server_params)
+        try:
+            tools = {tool.name: tool for tool in await pooled_mcp_tools(pool)}
+            assert set(tools) == {"pid", "crash", "fail"}
+            pid = tools["pid"]
+            first = await pid.run_json({}, CancellationToken())
+            second = await pid.run_json({}, CancellationToken())
+            assert first[0].text == second[0].text
+            with pytest.raises(Exception, match="tool failed"):
+                await tools["fail"].run_json({}, CancellationToken())
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_adapters_bind_sessions(self, server_params):
+        """测试工具适配器为每个会话绑定一个 session= 适配器，重连后换用新会话"""
+        pool = McpSessionPool(server_params)
+        try:
+            tools = {tool.name: tool for tool in await pooled_mcp_tools(pool)}
+            first = (await tools["pid"].run_json({}, CancellationToken()))[0].text
+            with pytest.raises(Exception):
+                await tools["crash"].run_json({}, CancellationToken())
+            second = (await tools["pid"].run_json({}, CancellationToken()))[0].text
+            assert second != first
+            bound = list(tools["pid"]._bound.values())
+            assert bound and all(adapter._session is pool._slots[0].session for adapter in bound)
+        finally:
+            await pool.close()
+
+
+class TestEventLoopChange:
+    """会话池跨事件循环使用（多次 asyncio.run）"""
+
+    def test_new_loop_rebuilds_sessions(self, server_params):
+        pool = McpSessionPool(server_params)
+        first = asyncio.run(call_pid(pool))
+        old_slots = list(pool._slots)
+
+        async def second_run():
+            try:
+                return await call_pid(pool)
+            finally:
+                await pool.close()
+
+        second = asyncio.run(second_run())
+        assert second != first
+        assert all(slot.session is None and slot._task is None for slot in old_slots), "原循环中的会话被显式丢弃"
+
+    def test_close_sync(self, server_params):
+        """测试在事件循环之外关闭：原循环已结束时丢弃会话，未关闭时在其中关闭"""
+        pool = McpSessionPool(server_params)
+        asyncio.run(call_pid(pool))
+        pool.close_sync()
+        assert pool.stats()["alive"] == 0
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(call_pid(pool))
+            assert pool.stats()["alive"] == 1
+            pool.close_sync()
+            assert pool.stats()["alive"] == 0
+        finally:
+            loop.close()
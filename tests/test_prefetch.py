@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+热门位置预取测试 - 衰减计数排序、到期前刷新、零点失效、每轮刷新上限、熔断暂停
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.prefetch import DecayingCounter, ForecastPrefetcher
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient, CITY_COORDINATES
+
+BEIJING = CITY_COORDINATES["北京"]
+SHANGHAI = CITY_COORDINATES["上海"]
+TZSHIFT = 28800
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDecayingCounter:
+    """衰减计数测试"""
+
+    def test_recent_accesses_rank_higher(self):
+        """测试计数按半衰期衰减，近期访问排在前面"""
+        clock = FakeClock()
+        counter = DecayingCounter(half_life=3600, clock=clock)
+        for _ in range(3):
+            counter.touch("a", "A")
+        clock.now += 7200
+        for _ in range(2):
+            counter.touch("b", "B")
+
+        assert counter.score("a") == pytest.approx(0.75)
+        assert counter.score("b") == pytest.approx(2)
+        assert counter.top(2) == [("b", "B"), ("a", "A")]
+        assert counter.top(0) == []
+
+    def test_value_kept_when_not_given(self):
+        counter = DecayingCounter(clock=FakeClock())
+        counter.touch("a", "A")
+        counter.touch("a")
+        assert counter.get("a") == "A"
+        assert counter.get("missing") is None
+
+    def test_rescale_keeps_order(self):
+        """测试放大倍数超过上限时整体缩小，排序和衰减后的计数不变"""
+        clock = FakeClock()
+        counter = DecayingCounter(half_life=1, clock=clock)
+        counter.touch("a")
+        counter.touch("a")
+        clock.now += DecayingCounter.MAX_EXPONENT + 1
+        counter.touch("b")
+
+        assert counter.score("b") == pytest.approx(1)
+        assert counter.score("a") < 1e-100
+        assert [key for key, _ in counter.top(2)] == ["b", "a"]
+
+    def test_trim_drops_least_popular(self):
+        counter = DecayingCounter(max_keys=10, clock=FakeClock())
+        for i in range(10):
+            for _ in range(i + 1):
+                counter.touch(i)
+        counter.touch("new")
+        counter.touch("new")
+
+        assert len(counter) == 10
+        assert 0 not in counter and "new" in counter
+
+
+@pytest.fixture
+def setup(caiyun_weather, caiyun_daily):
+    # 当地时间 09:00，推进半小时不会跨过零点
+    clock = FakeClock(1_700_000_000.0 - 1_700_000_000.0 % 86400 + 3600)
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        if request.url.path.endswith("/weather"):
+            return httpx.Response(200, json=caiyun_weather(start=clock.now))
+        return httpx.Response(200, json=caiyun_daily())
+
+    api = WeatherAPI(
+        SharedHTTPClient(transport=httpx.MockTransport(handler)),
+        ForecastCache(ttl=1800, clock=clock)
+    )
+    api.breaker = CircuitBreaker("彩云天气")
+    return api, clock, paths
+
+
+class TestForecastPrefetcher:
+    """预取测试（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_warms_pinned_cities(self, setup):
+        """测试内置城市缓存缺失时预取，已缓存的不重复请求"""
+        api, _, paths = setup
+        prefetcher = ForecastPrefetcher(api, [BEIJING, SHANGHAI, BEIJING])
+
+        assert len(prefetcher.pinned) == 2
+        assert await prefetcher.run_once() == 2
+        assert paths == ["daily", "daily"]
+        assert api.limiter.stats()["background_acquired"] == 2, "预取以后台优先级请求上游"
+        assert await prefetcher.run_once() == 0
+
+        await api.get_daily_weather_at(*BEIJING)
+        assert paths == ["daily", "daily"], "用户请求命中预取的缓存"
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_refresh_before_expiry(self, setup):
+        """测试只在距失效不足提前量时刷新，刷新后有效期延长"""
+        api, clock, paths = setup
+        prefetcher = ForecastPrefetcher(api, [BEIJING], lead_time=120, jitter=0.5)
+        cache_key = next(iter(prefetcher.pinned))
+        await prefetcher.run_once()
+        expires_at = api.forecast_cache.expires_at(cache_key)
+
+        assert 60 <= prefetcher.lead(cache_key) <= 120
+        clock.now = expires_at - 121
+        assert await prefetcher.run_once() == 0
+
+        clock.now = expires_at - 59
+        assert await prefetcher.run_once() == 1
+        assert api.forecast_cache.expires_at(cache_key) > expires_at
+        assert api.forecast_cache.get(cache_key) is not None
+        assert paths == ["daily", "daily"]
+        await api.close()
+
+    def test_jitter_spreads_leads(self, setup):
+        api, _, _ = setup
+        prefetcher = ForecastPrefetcher(api, CITY_COORDINATES.values(), lead_time=120, jitter=0.5)
+        leads = {prefetcher.lead(cache_key) for cache_key in prefetcher.pinned}
+        assert len(leads) == len(prefetcher.pinned)
+        assert all(60 <= lead <= 120 for lead in leads)
+
+    @pytest.mark.asyncio
+    async def test_waits_for_local_midnight(self, setup):
+        """测试零点失效的条目在零点前不刷新，零点后再刷新"""
+        api, clock, paths = setup
+        midnight = clock.now - (clock.now + TZSHIFT) % 86400 + 86400
+        clock.now = midnight - 600
+        prefetcher = ForecastPrefetcher(api, [BEIJING], lead_time=900, jitter=0)
+        cache_key = next(iter(prefetcher.pinned))
+        await prefetcher.run_once()
+        assert api.forecast_cache.expires_at(cache_key) == midnight
+
+        clock.now = midnight - 60
+        assert await prefetcher.run_once() == 0
+        clock.now = midnight
+        assert await prefetcher.run_once() == 1
+        assert api.forecast_cache.expires_at(cache_key) == midnight + 1800
+        assert paths == ["daily", "daily"]
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_popular_bundle_locations(self, setup):
+        """测试查询过实况的热门位置按合并接口刷新，并排在内置城市之前"""
+        api, clock, paths = setup
+        await api.get_realtime_weather("上海")
+        await api.get_daily_weather_at(*BEIJING)
+        await api.get_daily_weather_at(*BEIJING)
+        paths.clear()
+
+        prefetcher = ForecastPrefetcher(api, [SHANGHAI], top_n=10)
+        candidates = prefetcher.candidates()
+        assert [bundle for _, _, bundle in candidates] == [False, True]
+
+        clock.now += 1800
+        assert await prefetcher.run_once() == 2
+        assert sorted(paths) == ["daily", "weather"]
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_budget_defers_to_next_round(self, setup):
+        """测试每轮刷新数不超过预取预算，其余顺延到下一轮"""
+        api, _, paths = setup
+        prefetcher = ForecastPrefetcher(api, [BEIJING, SHANGHAI], interval=10, rate=0.1)
+
+        assert prefetcher.budget == 1
+        assert await prefetcher.run_once() == 1
+        assert await prefetcher.run_once() == 1
+        assert await prefetcher.run_once() == 0
+        assert prefetcher.stats()["deferred"] == 1
+        assert len(paths) == 2
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_paused_while_circuit_open(self, setup):
+        api, _, paths = setup
+        prefetcher = ForecastPrefetcher(api, [BEIJING])
+        for _ in range(api.breaker.failure_threshold):
+            api.breaker.record_failure()
+
+        assert await prefetcher.run_once() == 0
+        assert paths == []
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self, setup):
+        api, _, _ = setup
+        prefetcher = ForecastPrefetcher(api, [], interval=3600)
+        prefetcher.start()
+        await prefetcher.stop()
+        assert prefetcher._task is None
+        await api.close()
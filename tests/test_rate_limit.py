@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+上游限流与重试测试 - Retry-After、指数退避
+"""
+
+import pytest
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.rate_limit import RetryPolicy, parse_retry_after, get_with_retry
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.scheduler import PriorityScheduler
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient
+
+
+class TestRetry:
+    """重试策略测试"""
+
+    def test_parse_retry_after(self):
+        """测试解析秒数和HTTP日期格式"""
+        assert parse_retry_after("2") == 2.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("garbage") is None
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:05 GMT", now=1445412480.0) == pytest.approx(5.0)
+
+    def test_backoff_is_bounded(self):
+        """测试退避时间不超过上限"""
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+        assert all(0 <= policy.delay(attempt) <= 2.0 for attempt in range(10))
+        assert policy.delay(0, retry_after=1.0) >= 1.0
+
+    @pytest.mark.asyncio
+    async def test_retries_429_then_succeeds(self):
+        """测试429后遵循Retry-After重试成功"""
+        statuses = iter([429, 503, 200])
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            status = next(statuses)
+            return httpx.Response(status, headers={"Retry-After": "0"}, json={"ok": status == 200})
+
+        policy = RetryPolicy(max_retries=3, base_delay=0.001)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            response = await get_with_retry(client, PriorityScheduler(0), policy, "https://example.com/")
+
+        assert response.json() == {"ok": True}
+        assert policy.stats() == {"retries": 2, "gave_up": 0}
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """测试超过最大重试次数后抛出状态码错误"""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(500)
+
+        policy = RetryPolicy(max_retries=2, base_delay=0.001)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await get_with_retry(client, PriorityScheduler(0), policy, "https://example.com/")
+
+        assert calls == 3
+        assert policy.gave_up == 1
+
+    @pytest.mark.asyncio
+    async def test_long_retry_after_not_retried(self):
+        """测试Retry-After超过退避上限时直接失败"""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(429, headers={"Retry-After": "120"})
+
+        policy = RetryPolicy(max_retries=3, max_delay=8.0)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await get_with_retry(client, PriorityScheduler(0), policy, "https://example.com/")
+
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_status(self):
+        """测试4xx（非429）不重试"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(401)
+
+        policy = RetryPolicy(max_retries=3)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await get_with_retry(client, PriorityScheduler(0), policy, "https://example.com/")
+
+        assert policy.retries == 0
+
+
+class TestWeatherAPIErrors:
+    """天气API错误处理测试"""
+
+    @pytest.mark.asyncio
+    async def test_timeout_error_message(self):
+        """测试超时错误不再因缺少 response 属性而报错"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache())
+        try:
+            with pytest.raises(Exception, match="天气API请求失败"):
+                await api.get_daily_weather("北京")
+        finally:
+            await api.close()
+
+    @pytest.mark.asyncio
+    async def test_persistent_429_message(self):
+        """测试持续429时返回频率限制提示"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache())
+        api.retry_policy = RetryPolicy(max_retries=1, base_delay=0.001)
+        try:
+            with pytest.raises(Exception, match="API调用频率过高"):
+                await api.get_daily_weather("北京")
+        finally:
+            await api.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+上游请求优先级调度测试 - 加权公平队列、交互式预留速率、分级排队上限、优先级上下文
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.singleflight import SingleFlight
+from mcp_server.scheduler import (
+    PriorityScheduler, QueueFullError, upstream_priority, current_priority, parse_class_values,
+    INTERACTIVE, BATCH, BACKGROUND
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def drain(scheduler: PriorityScheduler, priority: str = INTERACTIVE):
+    """用掉突发容量，后续请求都需要排队"""
+    while scheduler._bucket.tokens >= 1:
+        await scheduler.acquire(priority)
+
+
+async def grant_order(scheduler: PriorityScheduler, priorities):
+    """所有请求同时排队，返回放行顺序"""
+    order = []
+
+    async def worker(priority):
+        await scheduler.acquire(priority)
+        order.append(priority)
+
+    await asyncio.gather(*(worker(priority) for priority in priorities))
+    return order
+
+
+class TestPriorityScheduler:
+    """优先级调度单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_rate_is_enforced(self):
+        scheduler = PriorityScheduler(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await scheduler.acquire()
+        assert time.monotonic() - start >= 0.09
+        stats = scheduler.stats()
+        assert stats["acquired"] == stats["interactive_acquired"] == 6
+        assert stats["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled(self):
+        scheduler = PriorityScheduler(rate=0)
+        assert await scheduler.acquire(BACKGROUND) == 0.0
+        assert scheduler.stats()["background_acquired"] == 1
+
+    @pytest.mark.asyncio
+    async def test_interactive_overtakes_background(self):
+        """测试后台请求先排队时，交互式请求仍先放行"""
+        scheduler = PriorityScheduler(rate=200, burst=1)
+        await drain(scheduler)
+        order = await grant_order(scheduler, [BACKGROUND] * 4 + [INTERACTIVE] * 4)
+        assert order == [INTERACTIVE] * 4 + [BACKGROUND] * 4
+
+    @pytest.mark.asyncio
+    async def test_weighted_share(self):
+        """测试同时积压时按权重分配：batch 与 background 为 2:1"""
+        scheduler = PriorityScheduler(rate=200, burst=1, interactive_reserve=0)
+        await drain(scheduler)
+        order = await grant_order(scheduler, [BACKGROUND] * 6 + [BATCH] * 6)
+        assert order[:6].count(BATCH) == 4
+        assert order[:6].count(BACKGROUND) == 2
+
+    @pytest.mark.asyncio
+    async def test_fifo_within_class(self):
+        scheduler = PriorityScheduler(rate=200, burst=1)
+        await drain(scheduler)
+        order = []
+
+        async def worker(i):
+            await scheduler.acquire(BATCH)
+            order.append(i)
+
+        await asyncio.gather(*(worker(i) for i in range(5)))
+        assert order == list(range(5))
+
+    @pytest.mark.asyncio
+    async def test_reserve_for_interactive(self):
+        """测试批量和后台请求只能用到非预留部分，剩余令牌留给交互式请求"""
+        scheduler = PriorityScheduler(rate=4, burst=4, interactive_reserve=0.5, clock=FakeClock())
+        await scheduler.acquire(BACKGROUND)
+        await scheduler.acquire(BATCH)
+
+        blocked = asyncio.create_task(scheduler.acquire(BACKGROUND))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        assert scheduler.stats()["background_queued"] == 1
+
+        # 后台请求被预留挡住时，交互式请求不用等待
+        assert await asyncio.wait_for(scheduler.acquire(INTERACTIVE), 1) == 0.0
+        assert scheduler.stats()["interactive_acquired"] == 1
+
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+        assert scheduler.stats()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_limit_per_class(self):
+        """测试排队数达到上限时拒绝该优先级的新请求，其他优先级不受影响"""
+        scheduler = PriorityScheduler(rate=1, burst=1, max_queue={BACKGROUND: 1}, clock=FakeClock())
+        await scheduler.acquire()
+        queued = asyncio.create_task(scheduler.acquire(BACKGROUND))
+        await asyncio.sleep(0)
+
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire(BACKGROUND)
+        interactive = asyncio.create_task(scheduler.acquire(INTERACTIVE))
+        await asyncio.sleep(0)
+
+        stats = scheduler.stats()
+        assert stats["background_rejected"] == 1
+        assert stats["background_queued"] == 1 and stats["interactive_queued"] == 1
+        for task in (queued, interactive):
+            task.cancel()
+        await asyncio.gather(queued, interactive, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_priority_context_inherited(self):
+        """测试优先级随上下文传递到子任务"""
+        scheduler = PriorityScheduler(rate=0)
+        with upstream_priority(BATCH):
+            assert current_priority.get() == BATCH
+            await asyncio.create_task(scheduler.acquire())
+        assert current_priority.get() == INTERACTIVE
+        await scheduler.acquire()
+
+        stats = scheduler.stats()
+        assert (stats["batch_acquired"], stats["interactive_acquired"]) == (1, 1)
+        with pytest.raises(ValueError):
+            with upstream_priority("urgent"):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_coalesced_caller_raises_priority(self):
+        """测试交互式调用合并到后台预取的请求上时，请求提升为交互式，不再排在其他交互式请求之后"""
+        scheduler = PriorityScheduler(rate=200, burst=1)
+        flight = SingleFlight()
+        await drain(scheduler)
+        order = []
+
+        async def fetch():
+            await scheduler.acquire()
+            order.append("flight")
+            return "result"
+
+        with upstream_priority(BACKGROUND):
+            prefetch = asyncio.create_task(flight.do("key", fetch))
+            for _ in range(2):
+                await asyncio.sleep(0)
+        assert scheduler.stats()["background_queued"] == 1
+
+        joined = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        stats = scheduler.stats()
+        assert (stats["background_queued"], stats["interactive_queued"]) == (0, 1)
+
+        async def worker():
+            await scheduler.acquire()
+            order.append(INTERACTIVE)
+
+        await asyncio.gather(*(worker() for _ in range(8)))
+        assert await joined == await prefetch == "result"
+        assert order[0] == "flight"
+        # drain 用掉的 1 个 + 8 个交互式请求 + 提升后的合并请求
+        assert scheduler.stats()["interactive_acquired"] == 10
+
+    @pytest.mark.asyncio
+    async def test_explicit_priority_overrides_flight(self):
+        """测试合并请求内部显式指定的优先级不受共享优先级影响"""
+        scheduler = PriorityScheduler(rate=0)
+        flight = SingleFlight()
+
+        async def fetch():
+            with upstream_priority(BATCH):
+                await scheduler.acquire()
+
+        await flight.do("key", fetch)
+        assert scheduler.stats()["batch_acquired"] == 1
+
+
+class TestParseClassValues:
+    """配置解析测试"""
+
+    def test_parse(self):
+        assert parse_class_values("batch=4, background=0.5", {INTERACTIVE: 8, BATCH: 2, BACKGROUND: 1}) == \
+            {INTERACTIVE: 8, BATCH: 4.0, BACKGROUND: 0.5}
+        assert parse_class_values(None, {BATCH: 2}) == {BATCH: 2}
+        with pytest.raises(ValueError):
+            parse_class_values("urgent=1", {})
+
+
+class TestToolPriorities:
+    """工具调用的优先级测试（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_multi_city_is_batch(self, monkeypatch, mocked_server):
+        """测试多城市查询以 batch 优先级请求上游，单城市查询为 interactive"""
+        module = mocked_server.module
+        monkeypatch.setattr(module.weather_api, "limiter", PriorityScheduler(rate=100))
+
+        await module.handle_query_weather_multi_city({"cities": ["北京", "上海", "广州"]})
+        await module.handle_query_weather_today({"city": "深圳"})
+
+        stats = module.weather_api.limiter.stats()
+        assert (stats["batch_acquired"], stats["interactive_acquired"]) == (3, 1)
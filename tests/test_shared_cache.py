@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+跨进程共享预报缓存测试 - 条目读写、上游请求租约、多个 WeatherAPI（模拟多个 worker）共享预报、多 worker 启动
+"""
+
+import pytest
+import asyncio
+import signal
+import socket
+import subprocess
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from autogen_ext.tools.mcp import StreamableHttpServerParams
+from mcp_server.cache_backends import SqliteBackend
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.shared_cache import SharedForecastStore
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient, CITY_COORDINATES
+from mcp_session import McpSessionPool
+
+BEIJING = CITY_COORDINATES["北京"]
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSharedForecastStore:
+    """共享缓存测试（SQLite 后端）"""
+
+    def test_round_trip_and_expiry(self, tmp_path):
+        clock = FakeClock(1000.0)
+        backend = SqliteBackend(str(tmp_path / "forecast.sqlite3"), "forecast_cache", clock=clock)
+        store = SharedForecastStore(backend, stale_ttl=300, clock=clock)
+        store.set("a", 1060.0, 1000.0, 8, [1, 2, 3])
+        assert store.get("a") == (1060.0, 1000.0, 8, [1, 2, 3])
+
+        # 较旧的写入不覆盖较新的条目
+        store.set("a", 1030.0, 990.0, 8, "old")
+        assert store.get("a")[3] == [1, 2, 3]
+
+        clock.now = 1200.0
+        assert store.get("a") is not None, "过期但仍在降级保留期内"
+        clock.now = 1300.0
+        assert store.get("a") is None
+        assert store.stats()["shared_hits"] == 3
+        store.close()
+
+    def test_leases(self, tmp_path):
+        path = str(tmp_path / "forecast.sqlite3")
+        clock = FakeClock(1000.0)
+        first = SharedForecastStore(SqliteBackend(path, clock=clock), owner="w0", clock=clock)
+        second = SharedForecastStore(SqliteBackend(path, clock=clock), owner="w1", clock=clock)
+
+        assert first.acquire("k", 10)
+        assert first.acquire("k", 10), "同一进程可重复获取"
+        assert not second.acquire("k", 10)
+        first.release("k")
+        assert second.acquire("k", 10)
+
+        # 持有者崩溃未释放时，租约到期后可被其他进程获取
+        clock.now += 11
+        assert first.acquire("k", 10)
+        assert second.stats()["shared_lease_waits"] == 1
+
+
+@pytest.fixture
+def workers(tmp_path, caiyun_daily):
+    """共享同一个缓存文件的多个 WeatherAPI，模拟多个 worker 进程"""
+    upstream = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        upstream.append(request.url.path)
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json=caiyun_daily())
+
+    def make_api(owner: str) -> WeatherAPI:
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache(ttl=1800))
+        api.breaker = CircuitBreaker("彩云天气")
+        api.shared_cache = SharedForecastStore(SqliteBackend(str(tmp_path / "forecast.sqlite3")), owner=owner)
+        return api
+
+    apis = [make_api(f"w{i}") for i in range(3)]
+    yield apis, upstream
+    for api in apis:
+        api.shared_cache.close()
+
+
+class TestWorkersShareForecasts:
+    """多个 worker 共享预报（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_fetch_benefits_other_workers(self, workers):
+        apis, upstream = workers
+        first = await apis[0].get_daily_weather_at(*BEIJING)
+        second = await apis[1].get_daily_weather_at(*BEIJING)
+        assert len(upstream) == 1
+        assert second.temp_max == first.temp_max and second.dates() == first.dates()
+
+        # 其他 worker 读到的条目保留原过期时间，之后直接命中本进程缓存
+        key = apis[0].quantizer.quantize(*BEIJING)[0]
+        assert apis[1].forecast_cache.expires_at(key) == apis[0].forecast_cache.expires_at(key)
+        await apis[1].get_daily_weather_at(*BEIJING)
+        assert apis[1].stats()["shared_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_fetch_once(self, workers):
+        """测试多个 worker 同时未命中同一位置时只有一个请求上游"""
+        apis, upstream = workers
+        results = await asyncio.gather(*(api.get_daily_weather_at(*BEIJING) for api in apis for _ in range(3)))
+        assert len(results) == 9 and len(upstream) == 1
+        assert sum(api.stats()["shared_lease_waits"] for api in apis) >= 1
+
+    @pytest.mark.asyncio
+    async def test_bundle_parts_shared(self, workers, caiyun_weather):
+        apis, upstream = workers
+        for api in apis:
+            api.http = SharedHTTPClient(transport=httpx.MockTransport(
+                lambda request: upstream.append(request.url.path) or httpx.Response(200, json=caiyun_weather())
+            ))
+        await apis[0].get_weather_bundle("上海")
+        bundle = await apis[1].get_weather_bundle("上海")
+        assert len(bundle["hourly"]) == 48 and len(upstream) == 1
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestMultiWorkerServer:
+    """pre-fork 多 worker 服务器测试"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork 仅支持 POSIX")
+    async def test_workers_serve_and_stop(self, tmp_path):
+        port = free_port()
+        env = dict(os.environ, CAIYUN_API_KEY=os.getenv("CAIYUN_API_KEY", "test"),
+                   AMAP_API_KEY=os.getenv("AMAP_API_KEY", "test"), PREFETCH_ENABLED="false",
+                   CACHE_SNAPSHOT_PATH="", GEOCODE_STORE_PATH="",
+                   FORECAST_SHARED_CACHE_PATH=str(tmp_path / "forecast.sqlite3"))
+        script = os.path.join(os.path.dirname(__file__), "..", "mcp_server", "weather_mcp_server.py")
+        process = subprocess.Popen([sys.executable, script, "--transport", "http", "--port", str(port),
+                                    "--workers", "2"], env=env, stderr=subprocess.DEVNULL)
+        pools = []
+        try:
+            url = f"http://127.0.0.1:{port}/mcp"
+            for _ in range(100):
+                try:
+                    async with httpx.AsyncClient() as client:
+                        await client.get(f"http://127.0.0.1:{port}/healthz")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            pools = [McpSessionPool(StreamableHttpServerParams(url=url, timeout=5)) for _ in range(4)]
+            results = await asyncio.gather(*(pool.call_tool("get_supported_cities") for pool in pools * 3))
+            assert all("北京" in result.content[0].text for result in results)
+        finally:
+            for pool in pools:
+                await pool.close()
+            process.send_signal(signal.SIGTERM)
+            assert process.wait(timeout=30) == 0
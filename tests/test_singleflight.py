@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+请求合并测试 - 并发相同请求只发起一次上游调用
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.singleflight import SingleFlight
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.weather_mcp_server import AmapGeocoder, WeatherAPI, SharedHTTPClient
+
+
+class TestSingleFlight:
+    """SingleFlight 单元测试"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_coalesced(self):
+        """测试并发相同键只执行一次"""
+        sf = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(sf.do("k", fetch) for _ in range(10)))
+
+        assert results == ["result"] * 10
+        assert calls == 1
+        assert sf.stats() == {"inflight": 0, "executed": 1, "coalesced": 9}
+
+    @pytest.mark.asyncio
+    async def test_error_propagates_to_all_waiters(self):
+        """测试异常传递给所有等待者"""
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(sf.do("k", fetch) for _ in range(5)), return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(sf) == 0, "失败后应清理在途请求，允许重试"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """测试单个调用者取消不影响其他等待者"""
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 42
+
+        first = asyncio.ensure_future(sf.do("k", fetch))
+        second = asyncio.ensure_future(sf.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == 42
+
+    @pytest.mark.asyncio
+    async def test_different_keys_not_coalesced(self):
+        """测试不同键分别执行"""
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return True
+
+        await asyncio.gather(sf.do("a", fetch), sf.do("b", fetch))
+        assert sf.executed == 2
+        assert sf.coalesced == 0
+
+
+    @pytest.mark.asyncio
+    async def test_start_registers_without_waiting(self):
+        """测试 start 立即登记请求，在途期间同键的 do 合并到同一任务"""
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return 1
+
+        task = sf.start("k", fetch)
+        assert "k" in sf and "other" not in sf
+        assert await sf.do("k", fetch) == 1 and await task == 1
+        assert sf.stats() == {"inflight": 0, "executed": 1, "coalesced": 1}
+
+
+class TestCoalescedUpstreamCalls:
+    """API客户端请求合并测试（模拟传输层）"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_geocode_misses(self, amap_geocode):
+        """测试并发地理编码未命中只调用一次高德API"""
+        calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=amap_geocode(109.511909, 18.252847))
+
+        geocoder = AmapGeocoder(SharedHTTPClient(transport=httpx.MockTransport(handler)))
+        try:
+            results = await asyncio.gather(*(geocoder.get_coordinates("三亚") for _ in range(8)))
+            assert await geocoder.get_coordinates("三亚") == (18.252847, 109.511909)
+        finally:
+            await geocoder.close()
+
+        assert calls == 1
+        assert len(set(results)) == 1
+        stats = geocoder.stats()
+        assert stats["coalesced"] == 7
+        assert stats["hits"] == 1
+        assert stats["misses"] == 8
+
+    @pytest.mark.asyncio
+    async def test_concurrent_forecast_fetches(self, caiyun_daily):
+        """测试并发预报请求只调用一次彩云API"""
+        calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=caiyun_daily())
+
+        api = WeatherAPI(SharedHTTPClient(transport=httpx.MockTransport(handler)), ForecastCache())
+        try:
+            await asyncio.gather(*(api.get_daily_weather("北京", days=d) for d in (1, 2, 3, 7)))
+        finally:
+            await api.close()
+
+        assert calls == 1
+        assert api.stats()["coalesced"] == 3
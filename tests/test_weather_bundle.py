@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+合并接口测试 - /weather 一次拉取实况、逐小时、逐天数据，分部分按各自 TTL 缓存
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.circuit_breaker import CircuitBreaker
+from mcp_server.forecast_cache import ForecastCache
+from mcp_server.forecast_records import DailyForecast, HourlyForecast, RealtimeWeather
+from mcp_server.weather_mcp_server import WeatherAPI, SharedHTTPClient, REALTIME_CACHE_TTL
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def setup(caiyun_weather, caiyun_daily):
+    # 当地时间上午，避免推进时钟时跨过零点
+    clock = FakeClock(1_700_000_000.0 - 1_700_000_000.0 % 86400 + 3600)
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        if request.url.path.endswith("/weather"):
+            return httpx.Response(200, json=caiyun_weather(start=clock.now))
+        return httpx.Response(200, json=caiyun_daily())
+
+    api = WeatherAPI(
+        SharedHTTPClient(transport=httpx.MockTransport(handler)),
+        ForecastCache(clock=clock)
+    )
+    api.breaker = CircuitBreaker("彩云天气")
+    return api, clock, paths
+
+
+class TestWeatherBundle:
+    """合并接口缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_one_request_fills_all_parts(self, setup):
+        """测试一次 /weather 请求填充三部分缓存，/daily 查询也直接命中"""
+        api, _, paths = setup
+        bundle = await api.get_weather_bundle("北京")
+
+        assert set(bundle) == {"realtime", "hourly", "daily"}
+        assert isinstance(bundle["daily"], DailyForecast), "daily 部分与 /daily 解码后的记录一致"
+        assert isinstance(bundle["hourly"], HourlyForecast) and len(bundle["hourly"]) == 48
+        assert isinstance(bundle["realtime"], RealtimeWeather)
+        assert bundle["realtime"].tzshift == 28800
+
+        await api.get_realtime_weather("北京")
+        await api.get_hourly_weather("北京")
+        daily = await api.get_daily_weather("北京")
+        assert len(daily) == 15
+        assert paths == ["weather"]
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_parts_share_request(self, setup):
+        """测试并发读取实况和逐小时只请求一次"""
+        api, _, paths = setup
+        await asyncio.gather(api.get_realtime_weather("上海"), api.get_hourly_weather("上海"))
+        assert paths == ["weather"]
+        await api.close()
+
+    @pytest.mark.asyncio
+    async def test_parts_expire_independently(self, setup):
+        """测试实况过期后重新拉取，逐天数据仍在缓存中"""
+        api, clock, paths = setup
+        await api.get_weather_bundle("北京")
+
+        clock.now += REALTIME_CACHE_TTL + 1
+        await api.get_daily_weather("北京")
+        assert paths == ["weather"], "逐天数据尚未过期"
+
+        await api.get_realtime_weather("北京")
+        assert paths == ["weather", "weather"]
+        await api.close()
+
+
+class TestBundleFormatting:
+    """实况与逐小时格式化测试"""
+
+    @pytest.mark.asyncio
+    async def test_format_realtime(self, setup):
+        api, _, _ = setup
+        text = api.format_realtime(await api.get_realtime_weather("北京"), "北京")
+        await api.close()
+
+        assert text.startswith("📍 北京 实况")
+        assert "🌡️ 温度：22°C（体感21°C）" in text
+        assert "💧 湿度：55%" in text
+        assert "空气质量：优（AQI 28）" in text
+
+    @pytest.mark.asyncio
+    async def test_hourly_skips_past_hours(self, setup):
+        """测试逐小时预报从当前小时开始"""
+        api, clock, _ = setup
+        data = await api.get_hourly_weather("北京")
+        first = api.format_hourly_lines(data, 6)
+        assert first[0] == "💬 未来两小时不会下雨，放心出门吧"
+        assert len(first) == 7
+
+        clock.now += 3 * 3600
+        later = api.format_hourly_lines(data, 3)
+        assert later[1:] == first[4:7]
+        await api.close()
+
+
+class TestBundleTools:
+    """query_weather_now / query_weather_hourly 工具测试"""
+
+    @pytest.mark.asyncio
+    async def test_now_and_hourly_tools(self, mocked_server):
+        module = mocked_server.module
+
+        now = await module.handle_query_weather_now({"city": "北京"})
+        hourly = await module.handle_query_weather_hourly({"city": "北京", "hours": 6})
+        paths = [request.url.path.rsplit("/", 1)[-1] for request in mocked_server.requests["caiyun"]]
+
+        assert "📍 北京 实况" in now[0].text
+        assert "📍 北京 未来6小时天气预报" in hourly[0].text
+        assert hourly[0].text.count("🕐") == 6
+        assert paths == ["weather"], "两个工具共用一次上游请求"
+
+    @pytest.mark.parametrize("hours", ["abc", None, 0, 49])
+    @pytest.mark.asyncio
+    async def test_invalid_hours(self, mocked_server, hours):
+        """测试小时数不是整数或超出范围时返回错误信息，不请求上游"""
+        hourly = await mocked_server.module.handle_query_weather_hourly({"city": "北京", "hours": hours})
+        assert hourly[0].text.startswith("❌ 参数 hours")
+        assert mocked_server.requests["caiyun"] == []
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+天气渲染测试 - 风力等级二分查找、生活建议查表、多天按列渲染
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mcp_server.forecast_records import DailyForecast
+from mcp_server.weather_mcp_server import WeatherAPI, SKYCON_MAP
+
+
+def reference_tips(weather: str, temp_max: int, temp_min: int, rain_prob: int) -> str:
+    """逐条拼接的生活建议，作为查表结果的对照"""
+    tips = []
+    if temp_max >= 30:
+        tips.append("天气炎热，注意防暑降温")
+    elif temp_min <= 5:
+        tips.append("天气寒冷，注意保暖添衣")
+    elif temp_max - temp_min > 15:
+        tips.append("昼夜温差大，适时增减衣物")
+    if rain_prob > 70:
+        tips.append("降雨概率高，建议携带雨具")
+    elif rain_prob > 30:
+        tips.append("可能有降雨，备好雨伞")
+    if "雾" in weather or "霾" in weather:
+        tips.append("能见度较低，出行注意安全")
+    elif "晴" in weather:
+        tips.append("天气晴朗，适合户外活动")
+    elif "雪" in weather:
+        tips.append("有降雪，注意路面湿滑")
+    return "，".join(tips) if tips else "天气适宜，祝您生活愉快"
+
+
+@pytest.fixture(scope="module")
+def api():
+    return WeatherAPI()
+
+
+class TestWindLevel:
+    """风力等级测试"""
+
+    @pytest.mark.parametrize("speed_kmh, level", [
+        (0, 0), (0.9, 0), (1.1, 1), (5.9, 1), (6.1, 2), (19.9, 3), (20.1, 4),
+        (61.9, 7), (62.1, 8), (117.9, 11), (118.1, 12), (300, 12),
+    ])
+    def test_beaufort_boundaries(self, api, speed_kmh, level):
+        assert api.wind_speed_to_level(speed_kmh / 3.6) == level
+
+
+class TestWeatherTips:
+    """生活建议查表测试"""
+
+    def test_table_matches_rules(self, api):
+        """测试所有温度、降水、天气现象组合与逐条规则一致"""
+        weathers = list(SKYCON_MAP.values()) + ["冻雨"]
+        for weather in weathers:
+            for temp_max, temp_min in ((35, 25), (3, -5), (28, 10), (22, 15)):
+                for rain_prob in (0, 30, 31, 70, 71, 100):
+                    assert api._get_weather_tips(weather, temp_max, temp_min, rain_prob) == \
+                        reference_tips(weather, temp_max, temp_min, rain_prob)
+
+
+class TestDailyLines:
+    """多天按列渲染测试"""
+
+    def test_render_range(self, api, caiyun_daily):
+        data = DailyForecast(caiyun_daily(days=15, start="2024-05-01", skycon="LIGHT_SNOW"))
+        lines = api.format_daily_lines(data, 13, 5)
+        assert lines == [
+            "📅 2024-05-14：小雪，16°C ~ 28°C",
+            "📅 2024-05-15：小雪，17°C ~ 29°C",
+        ]
+
+    def test_all_days(self, api, caiyun_daily):
+        data = DailyForecast(caiyun_daily(days=15, start="2024-05-01"))
+        lines = api.format_daily_lines(data, 0, 15)
+        assert len(lines) == 15
+        assert lines[0] == "📅 2024-05-01：晴天，15°C ~ 25°C"
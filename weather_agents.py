@@ -5,28 +5,81 @@
 """
 
 import asyncio
+import atexit
+import os
+from typing import Optional
 from autogen_agentchat.agents import AssistantAgent
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_ext.tools.mcp import StdioServerParams, mcp_server_tools
-
-# 全局 MCP 工具缓存
+from autogen_ext.tools.mcp import McpServerParams, StdioServerParams, StreamableHttpServerParams
+from intent_rules import RuleFirstIntentAgent, RuleIntentParser
+from mcp_server.city_resolver import CITY_ALIASES, CITY_LATIN_NAMES
+from mcp_server.gazetteer import DEFAULT_PATH as DEFAULT_GAZETTEER_PATH, Gazetteer
+from mcp_session import McpSessionPool, pooled_mcp_tools
+
+# 天气 MCP 服务器参数
+WEATHER_MCP_SERVER = StdioServerParams(
+    command="python",
+    args=["mcp_server/weather_mcp_server.py"]
+)
+
+# 共享天气 MCP 服务器的地址（如 http://127.0.0.1:8765/mcp），设置后按 URL 连接，不再启动子进程
+WEATHER_MCP_URL = os.getenv("WEATHER_MCP_URL")
+
+# 常驻 MCP 会话数（stdio 时每个会话对应一个服务器子进程）
+MCP_SESSION_POOL_SIZE = int(os.getenv("MCP_SESSION_POOL_SIZE", "1"))
+
+# 规则意图解析：常见句式在本地解析，置信度（可解释字符比例）低于阈值时才调用 LLM 意图解析代理
+INTENT_RULES_ENABLED = os.getenv("INTENT_RULES_ENABLED", "true").lower() in ("1", "true", "yes")
+INTENT_RULES_MIN_CONFIDENCE = float(os.getenv("INTENT_RULES_MIN_CONFIDENCE", "0.9"))
+# 规则解析使用的离线地名库（与服务器相同），置空时只识别内置城市和别称
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+
+# 未指定会话池时使用的全局会话池和工具缓存（由 close_weather_mcp_pool 关闭，退出时兜底关闭）
+_mcp_pool: Optional[McpSessionPool] = None
 _mcp_tools = None
 
-async def get_weather_mcp_tools():
-    """获取天气 MCP 工具"""
-    global _mcp_tools
+
+def weather_mcp_server_params(url: Optional[str] = None) -> McpServerParams:
+    """天气 MCP 服务器的连接参数：提供 URL（或设置 WEATHER_MCP_URL）时通过 Streamable HTTP 连接，否则启动 stdio 子进程"""
+    url = url or WEATHER_MCP_URL
+    if url:
+        return StreamableHttpServerParams(url=url)
+    return WEATHER_MCP_SERVER
+
+
+def create_weather_mcp_pool(size: int = MCP_SESSION_POOL_SIZE, url: Optional[str] = None) -> McpSessionPool:
+    """创建天气 MCP 会话池，工具调用复用常驻会话；使用方负责 close()"""
+    return McpSessionPool(weather_mcp_server_params(url), size=size)
+
+
+async def get_weather_mcp_tools(pool: Optional[McpSessionPool] = None):
+    """获取天气 MCP 工具，工具调用经由会话池（未指定时使用全局会话池）"""
+    global _mcp_pool, _mcp_tools
+    if pool is not None:
+        return await pooled_mcp_tools(pool)
     if _mcp_tools is None:
-        # 配置 MCP 服务器参数
-        weather_mcp_server = StdioServerParams(
-            command="python",
-            args=["mcp_server/weather_mcp_server.py"]
-        )
-        
-        # 获取 MCP 工具
-        _mcp_tools = await mcp_server_tools(weather_mcp_server)
-    
+        if _mcp_pool is None:
+            _mcp_pool = create_weather_mcp_pool()
+        _mcp_tools = await pooled_mcp_tools(_mcp_pool)
     return _mcp_tools
 
+
+async def close_weather_mcp_pool():
+    """关闭全局会话池（stdio 时终止服务器子进程），之后再次使用会重新创建"""
+    global _mcp_pool, _mcp_tools
+    pool, _mcp_pool, _mcp_tools = _mcp_pool, None, None
+    if pool is not None:
+        await pool.close()
+
+
+@atexit.register
+def _close_weather_mcp_pool_at_exit():
+    """解释器退出时关闭使用方未关闭的全局会话池"""
+    global _mcp_pool, _mcp_tools
+    pool, _mcp_pool, _mcp_tools = _mcp_pool, None, None
+    if pool is not None:
+        pool.close_sync()
+
 def create_intent_parser_agent(model_client: OpenAIChatCompletionClient) -> AssistantAgent:
     """创建意图解析代理 - 多代理协作的第一步"""
     return AssistantAgent(
@@ -60,9 +113,26 @@ def create_intent_parser_agent(model_client: OpenAIChatCompletionClient) -> Assi
     )
 
 
-async def create_weather_query_agent(model_client: OpenAIChatCompletionClient) -> AssistantAgent:
-    """创建天气查询代理 - 执行具体查询（使用 MCP 工具）"""
-    mcp_tools = await get_weather_mcp_tools()
+def create_rule_intent_parser(min_confidence: float = INTENT_RULES_MIN_CONFIDENCE) -> RuleIntentParser:
+    """创建规则意图解析器（城市索引：内置城市、别称、拼音和离线地名库）"""
+    return RuleIntentParser(
+        CITY_LATIN_NAMES.values(),
+        {**CITY_ALIASES, **CITY_LATIN_NAMES},
+        Gazetteer(GAZETTEER_PATH) if GAZETTEER_PATH else None,
+        min_confidence=min_confidence
+    )
+
+
+def create_fast_intent_parser_agent(model_client: OpenAIChatCompletionClient,
+                                    parser: Optional[RuleIntentParser] = None) -> RuleFirstIntentAgent:
+    """创建先走规则解析的意图解析代理，规则置信度不足时才调用 LLM 意图解析代理"""
+    return RuleFirstIntentAgent(parser or create_rule_intent_parser(), create_intent_parser_agent(model_client))
+
+
+async def create_weather_query_agent(model_client: OpenAIChatCompletionClient,
+                                     pool: Optional[McpSessionPool] = None) -> AssistantAgent:
+    """创建天气查询代理 - 执行具体查询（使用 MCP 工具，pool 为常驻会话池）"""
+    mcp_tools = await get_weather_mcp_tools(pool)
     
     return AssistantAgent(
         name="weather_agent",
@@ -75,6 +145,10 @@ async def create_weather_query_agent(model_client: OpenAIChatCompletionClient) -
 - 时间是"today"：使用 query_weather_today(city)
 - 时间是"tomorrow"：使用 query_weather_tomorrow(city)
 - 时间是"future"：使用 query_weather_future_days(city, days=3)
+- 同时查询多个城市：使用 query_weather_multi_city(cities, start_day, days)，一次调用返回所有城市结果
+- 询问"现在"的天气：使用 query_weather_now(city)
+- 询问接下来几小时的天气：使用 query_weather_hourly(city, hours)
+- 已知经纬度（如GPS坐标）：使用 query_weather_by_location(lat, lon, days)，无需城市名称
 
 重要：
 1. 严格按照解析结果选择工具
@@ -105,6 +179,10 @@ def create_response_formatter_agent(model_client: OpenAIChatCompletionClient) ->
 
 回复风格：
 - 保持emoji和数据格式
+- 如果查询结果是紧凑结构（JSON 或 key=value），按字段含义组织成自然语言：
+  c=地点 d=日期(月-日) tm=时刻 w=天气 lo/hi=最低/最高气温 t=气温 at=体感 h=湿度% wl=风力等级
+  p=降水概率% pi=降水强度mm/h aqi=空气质量指数 kp=降水提示 stale=缓存数据的分钟数 err=错误；
+  JSON 中的表格首行为字段名
 - 语言温馨友好
 - 建议实用贴心
 - 简洁明了
@@ -117,9 +195,10 @@ def create_response_formatter_agent(model_client: OpenAIChatCompletionClient) ->
     )
 
 
-async def create_simple_weather_agent(model_client: OpenAIChatCompletionClient) -> AssistantAgent:
-    """创建简单的一体化天气代理（单代理模式，使用 MCP 工具）"""
-    mcp_tools = await get_weather_mcp_tools()
+async def create_simple_weather_agent(model_client: OpenAIChatCompletionClient,
+                                      pool: Optional[McpSessionPool] = None) -> AssistantAgent:
+    """创建简单的一体化天气代理（单代理模式，使用 MCP 工具，pool 为常驻会话池）"""
+    mcp_tools = await get_weather_mcp_tools(pool)
     
     return AssistantAgent(
         name="weather_bot",
@@ -137,6 +216,11 @@ async def create_simple_weather_agent(model_client: OpenAIChatCompletionClient)
 - query_weather_today：查询今天天气
 - query_weather_tomorrow：查询明天天气
 - query_weather_future_days：查询未来几天天气（默认3天）
+- query_weather_multi_city：一次查询多个城市的天气（如"北京、上海、广州明天天气"）
+- query_weather_now：查询当前实况天气
+- query_weather_hourly：查询逐小时天气预报
+- query_weather_by_location：按经纬度查询天气
+- reverse_geocode：根据经纬度获取所在地名
 
 处理流程：
 1. 分析用户查询，提取城市和时间信息
@@ -13,9 +13,12 @@ from autogen_agentchat.ui import Console
 from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from weather_agents import (
+    INTENT_RULES_ENABLED,
+    create_fast_intent_parser_agent,
     create_intent_parser_agent,
     create_weather_query_agent,
-    create_response_formatter_agent
+    create_response_formatter_agent,
+    create_weather_mcp_pool
 )
 
 # 加载环境变量 - 按优先级加载
@@ -44,6 +47,8 @@ class WeatherAgentTeam:
         self.weather_agent = None
         self.formatter = None
         self.team = None
+        # 常驻 MCP 会话池，与群组同生命周期
+        self.mcp_pool = None
         self.verbose = verbose
         
     async def initialize(self):
@@ -51,9 +56,13 @@ class WeatherAgentTeam:
         if self.verbose:
             print("🤖 正在初始化智能体群组...")
         
-        # 创建三个专门的代理（weather_agent 使用 MCP 工具）
-        self.intent_parser = create_intent_parser_agent(self.model_client)
-        self.weather_agent = await create_weather_query_agent(self.model_client)
+        # 创建三个专门的代理（weather_agent 使用 MCP 工具；intent_parser 先走规则解析）
+        if INTENT_RULES_ENABLED:
+            self.intent_parser = create_fast_intent_parser_agent(self.model_client)
+        else:
+            self.intent_parser = create_intent_parser_agent(self.model_client)
+        self.mcp_pool = create_weather_mcp_pool()
+        self.weather_agent = await create_weather_query_agent(self.model_client, self.mcp_pool)
         self.formatter = create_response_formatter_agent(self.model_client)
         
         if self.verbose:
@@ -153,8 +162,20 @@ class WeatherAgentTeam:
         print("\n🎉 多代理协作演示完成！")
         print("💡 每个查询都经过了：意图解析 → 天气查询 → 响应美化 的完整协作流程")
     
+    def intent_stats(self) -> dict:
+        """规则意图解析的命中率（未启用规则解析时为空）"""
+        parser = getattr(self.intent_parser, "parser", None)
+        return parser.stats() if parser is not None else {}
+    
     async def close(self):
         """关闭资源"""
+        stats = self.intent_stats()
+        if self.verbose and stats:
+            print(f"📊 规则意图解析：命中 {stats['rule_hits']} 次，交给 LLM {stats['rule_fallbacks']} 次，"
+                  f"命中率 {stats['rule_hit_rate']:.0%}")
+        if self.mcp_pool:
+            await self.mcp_pool.close()
+            self.mcp_pool = None
         if self.model_client:
             await self.model_client.close()
             print("🔒 智能体群组资源已释放")